@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Compare the memory usage of the default and the compact reader modes.
+
+Usage: python benchmarks/compact.py [RECORDS]
+"""
+import random
+import struct
+import sys
+import time
+import tracemalloc
+
+from bin_parser import BinReader
+
+
+structure = [
+    {'name': 'number_of_records', 'type': 'int'},
+    {'name': 'records', 'for': 'number_of_records', 'structure': [
+        {'name': 'name', 'type': 'label'},
+        {'name': 'code', 'type': 'level'},
+        {'name': 'flags', 'type': 'bits'},
+        {'name': 'value', 'type': 'short'}]}]
+
+types = {'types': {
+    'int': {'size': 4, 'function': {'name': 'struct', 'args': {'fmt': '<i'}}},
+    'label': {'size': 25, 'delimiter': [0x00], 'function': {'name': 'text'}},
+    'level': {'function': {'name': 'struct', 'args': {
+        'fmt': 'B', 'annotation': {0x00: 'none', 0x01: 'low', 0x02: 'high'}}}},
+    'bits': {'function': {'name': 'flags', 'args': {
+        'annotation': {0x01: 'valid', 0x02: 'checked'}}}},
+    'short': {'size': 2, 'function': {
+        'name': 'struct', 'args': {'fmt': '<h'}}}}}
+
+
+def make_data(records, seed=0):
+    """Make a binary file with repeated names and codes.
+
+    :arg int records: Number of records.
+    :arg int seed: Random seed.
+
+    :returns bytes: Content of a binary file.
+    """
+    generator = random.Random(seed)
+    names = ['name_{:04d}'.format(index).encode() for index in range(100)]
+    data = [struct.pack('<i', records)]
+
+    for _ in range(records):
+        data.append(generator.choice(names).ljust(25, b'\x00'))
+        data.append(struct.pack(
+            '<BBh', generator.randrange(3), generator.randrange(4),
+            generator.randrange(-0x8000, 0x8000)))
+
+    return b''.join(data)
+
+
+def measure(data, compact):
+    """Parse data and measure memory usage.
+
+    :arg bytes data: Content of a binary file.
+    :arg bool compact: Use the compact reader mode.
+
+    :returns tuple: (`peak`, `retained`, `seconds`).
+    """
+    tracemalloc.start()
+    start = time.time()
+    parsed = BinReader(data, structure, types, compact=compact).parsed
+    seconds = time.time() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del parsed
+
+    return peak, retained, seconds
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    data = make_data(records)
+
+    print('{:10} {:>12} {:>12} {:>9}'.format(
+        'mode', 'peak (MiB)', 'kept (MiB)', 'time (s)'))
+    for compact in (False, True):
+        peak, retained, seconds = measure(data, compact)
+        print('{:10} {:12.1f} {:12.1f} {:9.2f}'.format(
+            'compact' if compact else 'default', peak / 2.0 ** 20,
+            retained / 2.0 ** 20, seconds))
+
+
+if __name__ == '__main__':
+    main()
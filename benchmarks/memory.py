@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+"""Memory footprint benchmarks.
+
+Every construct (loop type, nested structure, etc.) is parsed, encoded and
+converted via the command line interface on a generated input with a given
+number of records. Every case runs in a separate process, for which the peak
+traced memory, the resident set size and the number of memory blocks that are
+held by the result are recorded.
+
+Results can be stored as a baseline and later runs can be compared to it:
+
+    python benchmarks/memory.py -o benchmarks/baselines/memory.json
+    python benchmarks/memory.py -c benchmarks/baselines/memory.json
+"""
+import argparse
+import io
+import json
+import random
+import resource
+import struct
+import subprocess
+import sys
+import tracemalloc
+
+import yaml
+
+from bin_parser import BinReader, BinWriter
+from bin_parser.cli import bin_reader, bin_writer
+
+
+_int = {'size': 4, 'function': {'name': 'struct', 'args': {'fmt': '<i'}}}
+_short = {'size': 2, 'function': {'name': 'struct', 'args': {'fmt': '<h'}}}
+_text = {'delimiter': [0x00], 'function': {'name': 'text'}}
+_flags = {'function': {'name': 'flags', 'args': {'annotation': {
+    0x01: 'valid', 0x02: 'checked'}}}}
+
+
+def _names(generator):
+    return generator.choice(['name_{:03d}'.format(x) for x in range(100)])
+
+
+def _for(records, generator):
+    structure = [
+        {'name': 'size', 'type': 'int'},
+        {'name': 'records', 'for': 'size', 'structure': [
+            {'name': 'name', 'type': 'text'},
+            {'name': 'value', 'type': 'short'}]}]
+    data = [struct.pack('<i', records)]
+    for _ in range(records):
+        data.append(_names(generator).encode() + b'\x00')
+        data.append(struct.pack('<h', generator.randrange(0x8000)))
+
+    return structure, {
+        'types': {'int': _int, 'short': _short, 'text': _text}}, data
+
+
+def _do_while(records, generator):
+    structure = [{
+        'name': 'records',
+        'do_while': {'operator': 'eq', 'operands': ['more', 1]},
+        'structure': [
+            {'name': 'more', 'type': 'byte'},
+            {'name': 'value', 'type': 'short'}]}]
+    data = []
+    for index in range(records):
+        data.append(struct.pack(
+            '<Bh', int(index < records - 1), generator.randrange(0x8000)))
+
+    return structure, {'types': {
+        'byte': {'function': {'name': 'struct', 'args': {'fmt': 'B'}}},
+        'short': _short}}, data
+
+
+def _while(records, generator):
+    structure = [{
+        'name': 'records',
+        'while': {
+            'operator': 'ne', 'operands': ['id', 0], 'term': 'end'},
+        'structure': [
+            {'name': 'id', 'type': 'short'},
+            {'name': 'name', 'type': 'text'}]}]
+    data = []
+    for index in range(records):
+        data.append(struct.pack('<h', index % 0x7fff + 1))
+        data.append(_names(generator).encode() + b'\x00')
+    data.append(struct.pack('<h', 0))
+
+    return structure, {'types': {'short': _short, 'text': _text}}, data
+
+
+def _macro(records, generator):
+    structure = [
+        {'name': 'size', 'type': 'int'},
+        {'name': 'records', 'for': 'size', 'structure': [
+            {'name': 'person', 'macro': 'person'}]}]
+    data = [struct.pack('<i', records)]
+    for _ in range(records):
+        data.append(_names(generator).encode() + b'\x00')
+        data.append(struct.pack(
+            '<hB', generator.randrange(100), generator.randrange(4)))
+
+    return structure, {
+        'types': {
+            'int': _int, 'short': _short, 'text': _text, 'flags': _flags},
+        'macros': {'person': [
+            {'name': 'name', 'type': 'text'},
+            {'name': 'age', 'type': 'short'},
+            {'name': 'status', 'type': 'flags'}]}}, data
+
+
+def _raw(records, generator):
+    structure = [
+        {'name': 'size', 'type': 'int'},
+        {'name': 'records', 'for': 'size', 'structure': [
+            {'name': 'value', 'type': 'short'},
+            {'size': 14}]}]
+    data = [struct.pack('<i', records)]
+    for _ in range(records):
+        data.append(struct.pack('<h', generator.randrange(0x8000)))
+        data.append(bytes(bytearray(
+            generator.randrange(0x100) for _ in range(14))))
+
+    return structure, {'types': {'int': _int, 'short': _short}}, data
+
+
+constructs = {
+    'for': _for,
+    'do_while': _do_while,
+    'while': _while,
+    'macro': _macro,
+    'raw': _raw}
+
+
+def _read(data, structure, types, parsed):
+    return BinReader(data, structure, types).parsed
+
+
+def _compact_read(data, structure, types, parsed):
+    return BinReader(data, structure, types, compact=True).parsed
+
+
+def _write(data, structure, types, parsed):
+    return BinWriter(parsed, structure, types).data
+
+
+def _cli_read(data, structure, types, parsed):
+    output = io.StringIO()
+    bin_reader(
+        io.BytesIO(data), io.StringIO(yaml.safe_dump(structure)),
+        io.StringIO(yaml.safe_dump(types)), output)
+
+    return output
+
+
+def _cli_write(data, structure, types, parsed):
+    output = io.BytesIO()
+    bin_writer(
+        io.StringIO(yaml.safe_dump(parsed)),
+        io.StringIO(yaml.safe_dump(structure)),
+        io.StringIO(yaml.safe_dump(types)), output)
+
+    return output
+
+
+operations = {
+    'read': _read,
+    'compact_read': _compact_read,
+    'write': _write,
+    'cli_read': _cli_read,
+    'cli_write': _cli_write}
+
+
+def run_case(construct, operation, records, seed=0):
+    """Measure the memory usage of one case.
+
+    :arg str construct: Name of the construct.
+    :arg str operation: Name of the operation.
+    :arg int records: Number of records.
+    :arg int seed: Random seed.
+
+    :returns dict: Memory usage.
+    """
+    structure, types, data = constructs[construct](
+        records, random.Random(seed))
+    data = b''.join(data)
+    parsed = None
+    if operation in ('write', 'cli_write'):
+        parsed = BinReader(data, structure, types).parsed
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = operations[operation](data, structure, types, parsed)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del result
+
+    blocks = sum(
+        stat.count_diff for stat in after.compare_to(before, 'filename'))
+
+    return {
+        'peak': peak,
+        'peak_per_record': peak / float(records),
+        'blocks_per_record': blocks / float(records),
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+
+def run(records, cases):
+    """Run every case in a separate process.
+
+    :arg int records: Number of records.
+    :arg list cases: List of (`construct`, `operation`) tuples.
+
+    :returns dict: Memory usage per case.
+    """
+    results = {}
+
+    for construct, operation in cases:
+        output = subprocess.check_output([
+            sys.executable, __file__, '-r', str(records), '-s',
+            '{}:{}'.format(construct, operation)])
+        results['{}:{}'.format(construct, operation)] = json.loads(
+            output.decode())
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Compare results to a baseline.
+
+    :arg dict results: Memory usage per case.
+    :arg dict baseline: Memory usage per case.
+    :arg float tolerance: Allowed relative increase, a small absolute
+        increase is allowed as well to account for noise.
+
+    :returns list: Descriptions of regressions.
+    """
+    regressions = []
+
+    for case in sorted(results):
+        if case not in baseline:
+            continue
+        for key, slack in (
+                ('peak_per_record', 8), ('blocks_per_record', 0.5)):
+            limit = baseline[case][key] * (1 + tolerance) + slack
+            if results[case][key] > limit:
+                regressions.append('{} {}: {:.1f} > {:.1f}'.format(
+                    case, key, results[case][key], limit))
+
+    return regressions
+
+
+def main():
+    """Command line argument parsing."""
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '-r', dest='records', type=int,
+        help='number of records (%(type)s default=5000 or the number used '
+        'in the baseline)')
+    parser.add_argument(
+        '-o', dest='output', type=str, help='write results to a baseline')
+    parser.add_argument(
+        '-c', dest='baseline', type=str, help='compare results to a baseline')
+    parser.add_argument(
+        '-t', dest='tolerance', type=float, default=0.1,
+        help='allowed relative increase (%(type)s default=%(default)s)')
+    parser.add_argument('-s', dest='single', type=str, help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    baseline = None
+    if arguments.baseline:
+        with open(arguments.baseline) as handle:
+            baseline = json.load(handle)
+    records = arguments.records or (baseline or {}).get('records', 5000)
+
+    if arguments.single:
+        construct, operation = arguments.single.split(':')
+        print(json.dumps(run_case(construct, operation, records)))
+        return
+
+    results = run(records, [
+        (construct, operation)
+        for construct in sorted(constructs) for operation in operations])
+
+    print('{:20} {:>12} {:>14} {:>14} {:>10}'.format(
+        'case', 'peak (MiB)', 'peak/record', 'blocks/record', 'RSS (MiB)'))
+    for case in sorted(results):
+        print('{:20} {:12.1f} {:14.1f} {:14.1f} {:10.1f}'.format(
+            case, results[case]['peak'] / 2.0 ** 20,
+            results[case]['peak_per_record'],
+            results[case]['blocks_per_record'],
+            results[case]['rss'] / 2.0 ** 20))
+
+    if arguments.output:
+        with open(arguments.output, 'w') as handle:
+            json.dump(
+                {'records': records, 'results': results}, handle,
+                indent=2, sort_keys=True)
+
+    if baseline:
+        if baseline['records'] != records:
+            sys.stderr.write(
+                'Warning: the baseline uses {} records.\n'.format(
+                    baseline['records']))
+        regressions = compare(
+            results, baseline['results'], arguments.tolerance)
+        for regression in regressions:
+            sys.stderr.write('Regression: {}\n'.format(regression))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""Compare the throughput of decoding small framed messages with a new
+reader per message and with one message reader.
+
+Usage: python benchmarks/messages.py [MESSAGES]
+"""
+import struct
+import sys
+import time
+
+from bin_parser import BinReader, MessageReader
+
+
+structure = [
+    {'name': 'id', 'type': 'int'},
+    {'name': 'name', 'type': 'label'},
+    {'name': 'code', 'type': 'level'},
+    {'name': 'flags', 'type': 'bits'},
+    {'name': 'value', 'type': 'short'}]
+
+types = {'types': {
+    'int': {'size': 4, 'function': {'name': 'struct', 'args': {'fmt': '<i'}}},
+    'label': {'delimiter': [0x00], 'function': {'name': 'text'}},
+    'level': {'function': {'name': 'struct', 'args': {
+        'fmt': 'B', 'annotation': {0x00: 'none', 0x01: 'low', 0x02: 'high'}}}},
+    'bits': {'function': {'name': 'flags', 'args': {
+        'annotation': {0x01: 'valid', 0x02: 'checked'}}}},
+    'short': {'size': 2, 'function': {
+        'name': 'struct', 'args': {'fmt': '<h'}}}}}
+
+
+def make_messages(count):
+    """Make a stream of length prefixed messages.
+
+    :arg int count: Number of messages.
+
+    :returns tuple(list, bytes): The messages and the framed stream.
+    """
+    messages = []
+
+    for index in range(count):
+        messages.append(b''.join([
+            struct.pack('<i', index),
+            'name_{:04d}'.format(index % 100).encode(), b'\x00',
+            struct.pack('<BBh', index % 3, index % 4, index % 0x8000)]))
+
+    return messages, b''.join(
+        struct.pack('<H', len(message)) + message for message in messages)
+
+
+def per_message(messages, data):
+    return [
+        BinReader(message, structure, types).parsed for message in messages]
+
+
+def message_reader(messages, data):
+    return MessageReader(structure, types, prefix='<H').decode(data)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    messages, data = make_messages(count)
+
+    print('{:16} {:>12} {:>9}'.format('method', 'msg/s', 'time (s)'))
+    for name, method in (
+            ('BinReader', per_message), ('MessageReader', message_reader)):
+        start = time.time()
+        method(messages, data)
+        seconds = time.time() - start
+        print('{:16} {:12.0f} {:9.2f}'.format(name, count / seconds, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Measure the time it takes to read and write a file with many records that
+contain a nested structure.
+
+Usage: python benchmarks/records.py [RECORDS]
+"""
+import struct
+import sys
+import time
+
+from bin_parser import BinReader, BinWriter
+
+
+structure = [
+    {'name': 'number_of_records', 'type': 'int'},
+    {'name': 'records', 'for': 'number_of_records', 'structure': [
+        {'name': 'name', 'type': 'label'},
+        {'name': 'info', 'structure': [
+            {'name': 'code', 'type': 'level'},
+            {'name': 'value', 'type': 'short'}]},
+        {'name': 'flags', 'type': 'bits'}]}]
+
+types = {'types': {
+    'int': {'size': 4, 'function': {'name': 'struct', 'args': {'fmt': '<i'}}},
+    'label': {'delimiter': [0x00], 'function': {'name': 'text'}},
+    'level': {'function': {'name': 'struct', 'args': {
+        'fmt': 'B', 'annotation': {0x00: 'none', 0x01: 'low'}}}},
+    'bits': {'function': {'name': 'flags', 'args': {
+        'annotation': {0x01: 'valid', 0x02: 'checked'}}}},
+    'short': {'size': 2, 'function': {
+        'name': 'struct', 'args': {'fmt': '<h'}}}}}
+
+
+def make_data(count):
+    """Make a binary file.
+
+    :arg int count: Number of records.
+
+    :returns bytes: Content of a binary file.
+    """
+    return struct.pack('<i', count) + b''.join(
+        'name_{:02d}'.format(index % 100).encode() + b'\x00' + struct.pack(
+            '<BhB', index % 2, index % 1000, index % 4)
+        for index in range(count))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    data = make_data(count)
+    read = write = None
+
+    # The best of three runs is reported.
+    for _ in range(3):
+        start = time.perf_counter()
+        parsed = BinReader(data, structure, types).parsed
+        seconds = time.perf_counter() - start
+        read = min(read or seconds, seconds)
+
+        start = time.perf_counter()
+        BinWriter(parsed, structure, types)
+        seconds = time.perf_counter() - start
+        write = min(write or seconds, seconds)
+
+    print('read: {:.2f}s, write: {:.2f}s'.format(read, write))
+
+
+if __name__ == '__main__':
+    main()
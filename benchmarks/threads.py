@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Measure how parsing throughput scales with the number of threads.
+
+Small messages are parsed by a pool of threads, either with a reader that is
+made from a shared schema, or with a reader that compiles the definitions for
+every message. On a free-threaded build of CPython, the threads run in
+parallel.
+
+Usage: python benchmarks/threads.py [MESSAGES] [MAX_THREADS]
+"""
+import struct
+import sys
+import sysconfig
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bin_parser import BinReader, Schema
+
+
+structure = [
+    {'name': 'number_of_records', 'type': 'int'},
+    {'name': 'records', 'for': 'number_of_records', 'structure': [
+        {'name': 'name', 'type': 'label'},
+        {'name': 'code', 'type': 'level'},
+        {'name': 'flags', 'type': 'bits'},
+        {'name': 'value', 'type': 'short'}]}]
+
+types = {'types': {
+    'int': {'size': 4, 'function': {'name': 'struct', 'args': {'fmt': '<i'}}},
+    'label': {'size': 25, 'delimiter': [0x00], 'function': {'name': 'text'}},
+    'level': {'function': {'name': 'struct', 'args': {
+        'fmt': 'B', 'annotation': {0x00: 'none', 0x01: 'low', 0x02: 'high'}}}},
+    'bits': {'function': {'name': 'flags', 'args': {
+        'annotation': {0x01: 'valid', 0x02: 'checked'}}}},
+    'short': {'size': 2, 'function': {
+        'name': 'struct', 'args': {'fmt': '<h'}}}}}
+
+
+def make_message(index, records=10):
+    """Make a small binary message.
+
+    :arg int index: Message number.
+    :arg int records: Number of records.
+
+    :returns bytes: Content of a binary message.
+    """
+    data = [struct.pack('<i', records)]
+
+    for record in range(records):
+        data.append('name_{:04d}'.format(
+            (index + record) % 100).encode().ljust(25, b'\x00'))
+        data.append(struct.pack(
+            '<BBh', record % 3, index % 4, (index * record) % 0x8000))
+
+    return b''.join(data)
+
+
+def gil_status():
+    """Describe whether the global interpreter lock is enabled.
+
+    :returns str: Description.
+    """
+    if not sysconfig.get_config_var('Py_GIL_DISABLED'):
+        return 'GIL enabled'
+    if getattr(sys, '_is_gil_enabled', lambda: True)():
+        return 'free-threaded build, GIL enabled'
+    return 'free-threaded build, GIL disabled'
+
+
+def measure(messages, threads, shared):
+    """Parse messages with a pool of threads.
+
+    :arg list messages: Binary messages.
+    :arg int threads: Number of threads.
+    :arg bool shared: Use a shared schema.
+
+    :returns float: Number of messages per second.
+    """
+    if shared:
+        schema = Schema(structure, types)
+        parse = lambda data: schema.read(data).parsed
+    else:
+        parse = lambda data: BinReader(data, structure, types).parsed
+
+    with ThreadPoolExecutor(threads) as executor:
+        start = time.time()
+        for _ in executor.map(parse, messages, chunksize=64):
+            pass
+        seconds = time.time() - start
+
+    return len(messages) / seconds
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    max_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    messages = [make_message(index) for index in range(count)]
+
+    print('Python {} ({})\n'.format(sys.version.split()[0], gil_status()))
+    print('{:>7} {:>14} {:>14}'.format(
+        'threads', 'shared (msg/s)', 'per call'))
+    threads = 1
+    while threads <= max_threads:
+        print('{:7} {:14.0f} {:14.0f}'.format(
+            threads, measure(messages, threads, True),
+            measure(messages, threads, False)))
+        threads *= 2
+
+
+if __name__ == '__main__':
+    main()
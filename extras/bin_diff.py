@@ -0,0 +1,498 @@
+"""Compare two binary files that share a structure and types definition.
+
+
+Licensed under the MIT license, see the LICENSE file.
+"""
+import argparse
+import collections
+import collections.abc
+import sys
+
+import yaml
+
+from bin_parser import BinReadFunctions, Schema
+from bin_parser.bin_parser import IncompleteField
+from bin_parser.schema import analyse, references
+from bin_parser.stream import BinPushReader
+
+
+Range = collections.namedtuple('Range', ['offset', 'data'])
+Range.__doc__ = """Undecoded element of a loop with a static element size.
+
+:arg int offset: Position of the element in the input.
+:arg bytes data: Content of the element.
+"""
+
+
+def _names(parser, structure):
+    """Find the names of all fields in a structure, including nested
+    structures and macros.
+
+    :arg BinParser parser: Parser.
+    :arg list structure: Structure.
+
+    :returns set: Field names.
+    """
+    names = set()
+    stack = [structure]
+    seen = set()
+
+    while stack:
+        for item in stack.pop() or []:
+            names.add(item.get('name'))
+            if 'structure' in item:
+                stack.append(item['structure'])
+            macro = item.get('macro')
+            if macro in parser.macros and macro not in seen:
+                seen.add(macro)
+                stack.append(parser.macros[macro])
+
+    return names
+
+
+class DiffReader(BinPushReader):
+    """Incremental reader that leaves elements of loops at the top level
+    with a static element size undecoded.
+
+    Such elements are reported as a `Range` so they can be compared byte by
+    byte. This is only done when none of the fields of the element controls
+    the parsing of other fields. For every reported unit, the position of the
+    corresponding item in the structure and the position of the unit in the
+    input are stored in {self.positions}.
+    """
+    def __init__(
+            self, structure, types, functions=BinReadFunctions(),
+            prune=False, debug=0, log=sys.stderr, schema=None):
+        """Constructor.
+
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing parsing functions.
+        :arg bool prune: Remove all unknown data fields from the output.
+        :arg int debug: Debugging level.
+        :arg stream log: Debug stream to write to.
+        :arg Schema schema: Compiled definitions (see `Schema`),
+            {structure}, {types} and {functions} are not used if given.
+        """
+        super(DiffReader, self).__init__(
+            structure, types, functions, prune, debug=debug, log=log,
+            schema=schema)
+
+        analysis = analyse(self)
+        variables = set(references(self._structure, {
+            'defaults': self.defaults, 'types': self.types,
+            'macros': self.macros}))
+        self._ranges = {}
+        for item in self._structure or []:
+            name = item.get('name')
+            if (
+                    name in analysis['element_sizes'] and
+                    not _names(self, item['structure']) & variables):
+                self._ranges[name] = analysis['element_sizes'][name]
+
+        self.offsets = {}
+        self.positions = []
+
+    def _step_range(self, name, size):
+        """Report the next element of a loop as a `Range`.
+
+        :arg str name: Name of the loop.
+        :arg int size: Size of one element.
+
+        :returns list: Parsed data (see `_step`), None if the element is not
+            fully available at the end of the input.
+        """
+        index, iteration, length = self._cursor
+
+        end = self._offset + size
+        if end > len(self.data):
+            if self._final:
+                return None
+            raise IncompleteField(end - len(self.data))
+
+        unit = (name, self._counts[name], Range(
+            self._base + self._offset, self.data[self._offset:end]))
+        self._offset = end
+        self._counts[name] += 1
+
+        if iteration + 1 >= length:
+            self._cursor = [index + 1, None, None]
+        else:
+            self._cursor = [index, iteration + 1, length]
+
+        return [unit]
+
+    def _step(self, partial=False):
+        index, iteration, length = self._cursor
+        start = self.offset
+
+        result = None
+        if iteration is not None and iteration < (length or 0):
+            name = self._structure[index].get('name')
+            if name in self._ranges:
+                result = self._step_range(name, self._ranges[name])
+
+        if result is None:
+            result = super(DiffReader, self)._step(partial)
+        if result:
+            self.positions.extend([(index, start)] * len(result))
+
+        return result
+
+
+def _units(input_handle, reader, block_size):
+    """Parse a binary file incrementally.
+
+    :arg stream input_handle: Open readable handle to a binary file.
+    :arg DiffReader reader: Incremental reader.
+    :arg int block_size: Maximum number of bytes read at once.
+
+    :returns iterator: Tuples (`unit`, `item index`, `offset`, `offsets`),
+        where `offsets` holds the positions of the fields in the unit.
+    """
+    while not reader.done:
+        chunk = input_handle.read(block_size)
+        if chunk:
+            units = reader.feed(chunk)
+        else:
+            units = reader.close()
+
+        offsets = reader.offsets
+        positions = reader.positions
+        reader.offsets = {}
+        reader.positions = []
+        for unit, (index, offset) in zip(units, positions):
+            yield unit, index, offset, offsets
+
+        if not chunk:
+            break
+
+
+def _offset(offsets, path, default):
+    """Find the position of a field, or of the first field in a structure.
+
+    :arg dict offsets: Positions of fields.
+    :arg tuple path: Location of the field.
+    :arg int default: Position used when no field is found.
+
+    :returns int: Position of {path} in the input.
+    """
+    if path in offsets:
+        return offsets[path][0]
+
+    starts = [
+        start for key, (start, _) in offsets.items()
+        if key[:len(path)] == path]
+    if starts:
+        return min(starts)
+    return default
+
+
+def _compare(path, value_1, value_2):
+    """Compare two parsed values.
+
+    :arg tuple path: Location of the values.
+    :arg any value_1: A parsed value.
+    :arg any value_2: An other parsed value.
+
+    :returns iterator: Tuples (`path`, `value_1`, `value_2`) for every
+        difference, values that are missing are given as None.
+    """
+    if (
+            isinstance(value_1, collections.abc.Mapping) and
+            isinstance(value_2, collections.abc.Mapping)):
+        for key in list(value_1) + [
+                key for key in value_2 if key not in value_1]:
+            if key not in value_2:
+                yield path + (key, ), value_1[key], None
+            elif key not in value_1:
+                yield path + (key, ), None, value_2[key]
+            else:
+                yield from _compare(path + (key, ), value_1[key], value_2[key])
+    elif isinstance(value_1, list) and isinstance(value_2, list):
+        for index in range(max(len(value_1), len(value_2))):
+            if index >= len(value_2):
+                yield path + (index, ), value_1[index], None
+            elif index >= len(value_1):
+                yield path + (index, ), None, value_2[index]
+            else:
+                yield from _compare(
+                    path + (index, ), value_1[index], value_2[index])
+    elif value_1 != value_2:
+        yield path, value_1, value_2
+
+
+def _path(unit):
+    """Location of a unit in the parsed data.
+
+    :arg tuple unit: A (`name`, `index`, `value`) triple.
+
+    :returns tuple: Path of names and list indices.
+    """
+    name, index, _ = unit
+    if index is None:
+        return (name, )
+    return (name, index)
+
+
+def _location(unit):
+    """Location of a unit in the structure and in the parsed data.
+
+    :arg tuple unit: Tuple (`unit`, `item index`, `offset`, `offsets`), see
+        `_units`.
+
+    :returns tuple: Item index and path.
+    """
+    return (unit[1], ) + _path(unit[0])
+
+
+def _order(unit):
+    """Sort key for units that are at different locations, loop elements
+    come before other units of the same item (e.g., the terminating field of
+    a `while` loop).
+
+    :arg tuple unit: Tuple (`unit`, `item index`, `offset`, `offsets`), see
+        `_units`.
+
+    :returns tuple: Sort key.
+    """
+    return unit[1], unit[0][1] is None
+
+
+class BinDiff(object):
+    """Compare two binary files while they are being parsed.
+
+    Both files are parsed incrementally and in step with each other, so only
+    a small part of either file is kept in memory. Elements of loops with a
+    static element size are compared byte by byte first and only decoded
+    when they differ.
+    """
+    def __init__(
+            self, structure, types, functions=BinReadFunctions(),
+            prune=False, block_size=65536):
+        """Constructor.
+
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing parsing functions.
+        :arg bool prune: Ignore unknown data fields.
+        :arg int block_size: Maximum number of bytes read at once.
+        """
+        self._structure = structure
+        self._types = types
+        self._functions = functions
+        self._prune = prune
+        self._block_size = block_size
+
+        self._schema = Schema(
+            structure, types, functions, write_functions=None)
+        # Compiled definitions of loop elements per item index, made when an
+        # element of the loop is first decoded.
+        self._element_schemas = {}
+
+    def _decode(self, item_index, value):
+        """Decode an element that was left undecoded.
+
+        :arg int item_index: Position of the loop in the structure.
+        :arg Range value: Undecoded element.
+
+        :returns tuple: The parsed element and the positions of its fields.
+        """
+        if item_index not in self._element_schemas:
+            self._element_schemas[item_index] = Schema(
+                self._structure[item_index]['structure'], self._types,
+                self._functions, write_functions=None)
+        reader = self._element_schemas[item_index].read(
+            bytes(value.data), prune=self._prune, offsets=True)
+
+        return reader.parsed, dict(
+            (path, (start + value.offset, end + value.offset))
+            for path, (start, end) in reader.offsets.items())
+
+    def _value(self, unit):
+        """Get the (decoded) value of a unit.
+
+        :arg tuple unit: Tuple (`unit`, `item index`, `offset`, `offsets`),
+            see `_units`.
+
+        :returns any: Parsed value.
+        """
+        value = unit[0][2]
+        if isinstance(value, Range):
+            return self._decode(unit[1], value)[0]
+        return value
+
+    def _unit_differences(self, unit_1, unit_2):
+        """Compare two units that are at the same location.
+
+        :arg tuple unit_1: Tuple (`unit`, `item index`, `offset`, `offsets`),
+            see `_units`.
+        :arg tuple unit_2: Idem.
+
+        :returns iterator: Differences (see `diff`).
+        """
+        (_, _, value_1), item_index, start_1, offsets_1 = unit_1
+        (_, _, value_2), _, start_2, offsets_2 = unit_2
+
+        path = _path(unit_1[0])
+        prefix = ()
+        if isinstance(value_1, Range):
+            if value_1.data == value_2.data:
+                return
+            value_1, offsets_1 = self._decode(item_index, value_1)
+            value_2, offsets_2 = self._decode(item_index, value_2)
+            prefix, path = path, ()
+
+        for subpath, subvalue_1, subvalue_2 in _compare(
+                path, value_1, value_2):
+            yield (
+                prefix + subpath,
+                None if subvalue_1 is None else _offset(
+                    offsets_1, subpath, start_1),
+                None if subvalue_2 is None else _offset(
+                    offsets_2, subpath, start_2),
+                subvalue_1, subvalue_2)
+
+    def diff(self, input_handle_1, input_handle_2):
+        """Compare two binary files.
+
+        :arg stream input_handle_1: Open readable handle to a binary file.
+        :arg stream input_handle_2: Open readable handle to an other binary
+            file.
+
+        :returns iterator: Tuples (`path`, `offset_1`, `offset_2`, `value_1`,
+            `value_2`) for every difference. The path is a tuple of names and
+            list indices. Values (and offsets) that are only present in one
+            of the files are given as None for the other one.
+        """
+        units_1 = _units(
+            input_handle_1, DiffReader(
+                None, None, prune=self._prune, schema=self._schema),
+            self._block_size)
+        units_2 = _units(
+            input_handle_2, DiffReader(
+                None, None, prune=self._prune, schema=self._schema),
+            self._block_size)
+
+        unit_1 = next(units_1, None)
+        unit_2 = next(units_2, None)
+
+        while unit_1 or unit_2:
+            if unit_1 and unit_2 and _location(unit_1) == _location(unit_2):
+                for difference in self._unit_differences(unit_1, unit_2):
+                    yield difference
+                unit_1 = next(units_1, None)
+                unit_2 = next(units_2, None)
+            elif not unit_2 or unit_1 and _order(unit_1) < _order(unit_2):
+                yield (
+                    _path(unit_1[0]), unit_1[2], None, self._value(unit_1),
+                    None)
+                unit_1 = next(units_1, None)
+            else:
+                yield (
+                    _path(unit_2[0]), None, unit_2[2], None,
+                    self._value(unit_2))
+                unit_2 = next(units_2, None)
+
+
+def _format_value(value):
+    """Format a value for a difference report.
+
+    :arg any value: A parsed value.
+
+    :returns str: Single line representation of {value}.
+    """
+    if value is None:
+        return '-'
+    if isinstance(value, (memoryview, bytes)):
+        return ' '.join('{:02x}'.format(byte) for byte in bytes(value))
+    return yaml.safe_dump(
+        value, default_flow_style=True, width=float('inf')).strip().replace(
+            '\n...', '')
+
+
+def _format_offset(offset):
+    if offset is None:
+        return '-'
+    return '0x{:06x}'.format(offset)
+
+
+def bin_diff(
+        input_handle_1, input_handle_2, structure_handle, types_handle,
+        output_handle, limit=0, prune=False):
+    """Compare two binary files that share a structure and types definition.
+
+    :arg stream input_handle_1: Open readable handle to a binary file.
+    :arg stream input_handle_2: Open readable handle to an other binary file.
+    :arg stream structure_handle: Open readable handle to the structure file.
+    :arg stream types_handle: Open readable handle to the types file.
+    :arg stream output_handle: Open writable handle.
+    :arg int limit: Stop after this many differences (0 for no limit).
+    :arg bool prune: Ignore unknown data fields.
+
+    :returns int: Number of differences reported.
+    """
+    differ = BinDiff(
+        yaml.safe_load(structure_handle), yaml.safe_load(types_handle),
+        prune=prune)
+
+    count = 0
+    for path, offset_1, offset_2, value_1, value_2 in differ.diff(
+            input_handle_1, input_handle_2):
+        output_handle.write('{} ({}, {}): {} != {}\n'.format(
+            '.'.join(map(str, path)), _format_offset(offset_1),
+            _format_offset(offset_2), _format_value(value_1),
+            _format_value(value_2)))
+        count += 1
+        if count == limit:
+            break
+
+    return count
+
+
+def main():
+    """Main entry point."""
+    usage = __doc__.split('\n\n\n')
+    parser = argparse.ArgumentParser(
+        description=usage[0], epilog=usage[1],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument(
+        'input_handle_1', metavar='INPUT_1', type=argparse.FileType('rb'),
+        help='input file')
+    parser.add_argument(
+        'input_handle_2', metavar='INPUT_2', type=argparse.FileType('rb'),
+        help='other input file')
+    parser.add_argument(
+        'structure_handle', metavar='STRUCTURE', type=argparse.FileType('r'),
+        help='structure definition file')
+    parser.add_argument(
+        'types_handle', metavar='TYPES', type=argparse.FileType('r'),
+        help='types definition file')
+    parser.add_argument(
+        '-n', dest='limit', type=int, default=0,
+        help='stop after this many differences (%(type)s '
+        'default=%(default)s, 0 for no limit)')
+    parser.add_argument(
+        '-p', dest='prune', default=False, action='store_true',
+        help='ignore unknown data fields')
+
+    try:
+        arguments = parser.parse_args()
+    except IOError as error:
+        parser.error(error)
+
+    try:
+        count = bin_diff(
+            arguments.input_handle_1, arguments.input_handle_2,
+            arguments.structure_handle, arguments.types_handle, sys.stdout,
+            arguments.limit, arguments.prune)
+    except ValueError as error:
+        parser.error(error)
+
+    if count:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
-"""Use an example file and a delimiter to extract a rudimentary structure and a
-types definition.
+"""Use an example file to extract a rudimentary structure and a types
+definition.
+
+The input is read in blocks, byte frequencies are used to find candidate
+delimiters and autocorrelation is used to find records of a fixed size.
 
 
 (C) 2015 Jeroen F.J. Laros <J.F.J.Laros@lumc.nl>
@@ -7,8 +10,23 @@ types definition.
 Licensed under the MIT license, see the LICENSE file.
 """
 import argparse
+import string
+import sys
+
 import yaml
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+_alphanumeric = set(
+    bytearray((string.ascii_letters + string.digits).encode()))
+_printable = set(range(0x20, 0x7f))
+_whitespace = set(bytearray(b'\t\n\r'))
+_common = set(bytearray(b'\x00\t\n\r ,;|'))
+
 
 class HexInt(int):
     pass
@@ -22,54 +40,382 @@ def hex_int(string):
     return int(string, 16)
 
 
-def make_structure(data, delimiter):
-    """Split the input data and extract a rudimentary structure.
+class Statistics(object):
+    """Byte statistics of a file that is read in blocks."""
+    def __init__(self, delimiter=[], sample_size=1048576):
+        """Constructor.
+
+        :arg list(int) delimiter: Delimiter of which the occurrences are
+            counted.
+        :arg int sample_size: Number of bytes kept from the start of the file.
+        """
+        self.size = 0
+        self.counts = [0] * 256
+        self.runs = [0] * 256
+        self.sample = b''
+
+        self._delimiter = bytes(bytearray(delimiter))
+        self.delimiter_count = 0
+        self._sample_size = sample_size
+        self._tail = b''
+
+    def update(self, block):
+        """Add a block of data.
+
+        :arg bytes block: Data.
+        """
+        if len(self.sample) < self._sample_size:
+            self.sample += block[:self._sample_size - len(self.sample)]
+
+        if numpy is not None:
+            data = numpy.frombuffer(block, dtype=numpy.uint8)
+            counts = numpy.bincount(data, minlength=256)
+            # A run starts at every byte that differs from the previous one.
+            previous = numpy.empty_like(data)
+            previous[1:] = data[:-1]
+            previous[:1] = bytearray(self._tail[-1:] or b'\x00')
+            starts = data != previous
+            if not self._tail:
+                starts[:1] = True
+            runs = numpy.bincount(data[starts], minlength=256)
+            for value in range(256):
+                self.counts[value] += int(counts[value])
+                self.runs[value] += int(runs[value])
+        else:
+            previous = self.last()
+            for value in bytearray(block):
+                self.counts[value] += 1
+                if value != previous:
+                    self.runs[value] += 1
+                    previous = value
+
+        if self._delimiter:
+            overlap = self._tail
+            if len(overlap) == len(self._delimiter):
+                overlap = overlap[1:]
+            self.delimiter_count += (overlap + block).count(self._delimiter)
+        self._tail = (self._tail + block)[-max(len(self._delimiter), 1):]
+        self.size += len(block)
+
+    def last(self):
+        """The last byte that was added.
+
+        :returns int: Last byte, None if no data was added.
+        """
+        if not self._tail:
+            return None
+        return self._tail[-1]
+
+    def ends_with(self, separator):
+        """Check whether the data ends with a separator.
+
+        :arg bytes separator: Separator, at most as long as the delimiter.
+
+        :returns bool: True if the data ends with {separator}.
+        """
+        return self._tail.endswith(separator)
+
+
+def autocorrelation(data, max_lag):
+    """Calculate the fraction of bytes that are equal to the byte a given
+    distance further on.
+
+    :arg bytes data: Data.
+    :arg int max_lag: Largest distance.
+
+    :returns list(float): Fraction for every distance up to {max_lag}, the
+        fraction for distance 0 is 1.
+    """
+    result = [1.0]
+
+    if numpy is not None:
+        array = numpy.frombuffer(data, dtype=numpy.uint8)
+        for lag in range(1, min(max_lag, len(data) - 1) + 1):
+            result.append(
+                numpy.count_nonzero(array[:-lag] == array[lag:]) /
+                float(len(data) - lag))
+        return result
+
+    for lag in range(1, min(max_lag, len(data) - 1) + 1):
+        length = len(data) - lag
+        # Bytes that are equal give a zero byte in the exclusive or.
+        difference = (
+            int.from_bytes(data[:-lag], 'big') ^
+            int.from_bytes(data[lag:], 'big')).to_bytes(length, 'big')
+        result.append(difference.count(0) / float(length))
+
+    return result
+
+
+def record_size(statistics, max_lag=512, threshold=0.2, min_records=8):
+    """Find the size of records that repeat throughout the sample.
+
+    The expected fraction of equal bytes at any distance is subtracted from
+    the autocorrelation, the smallest distance at which the remainder is
+    close to its maximum is selected, multiples of the record size score
+    high as well.
+
+    :arg Statistics statistics: Byte statistics.
+    :arg int max_lag: Largest record size.
+    :arg float threshold: Minimum excess correlation.
+    :arg int min_records: Minimum number of records in the sample.
+
+    :returns int: Record size, None if no record size was found.
+    """
+    if not statistics.size:
+        return None
+
+    expected = sum(
+        (count / float(statistics.size)) ** 2
+        for count in statistics.counts)
+    excess = [
+        fraction - expected for fraction in autocorrelation(
+            statistics.sample,
+            min(max_lag, len(statistics.sample) // min_records))]
+
+    if len(excess) < 3 or max(excess[2:]) < threshold:
+        return None
+
+    best = max(excess[2:])
+    for lag in range(2, len(excess)):
+        if excess[lag] >= 0.8 * best:
+            return lag
+
+
+def delimiter_candidates(statistics, count=5):
+    """Find bytes that are likely to be used as delimiter.
+
+    Letters and digits are excluded, the other bytes are ranked by the
+    number of times they occur, where a repeated byte (e.g., padding) is
+    counted once. Ties are broken in favour of commonly used delimiters
+    (e.g., a tab or a newline).
 
-    :arg str data: The input data.
-    :arg list(int) delimiter: The delimiter to split {data}.
+    :arg Statistics statistics: Byte statistics.
+    :arg int count: Maximum number of candidates.
+
+    :returns list(int): Candidate delimiters, the best one first.
+    """
+    candidates = [
+        value for value in range(256)
+        if value not in _alphanumeric and statistics.runs[value]]
+
+    # On a tie, common delimiters are preferred and the last byte of the
+    # file is likely to end a record.
+    return sorted(candidates, key=lambda value: (
+        -statistics.runs[value], value not in _common,
+        value != statistics.last(), value))[:count]
+
+
+def _column_class(values):
+    """Classify a column of bytes.
+
+    :arg set values: Byte values in the column.
+
+    :returns str: Either `zero`, `text` or `binary`.
+    """
+    if values <= set([0x00]):
+        return 'zero'
+    if values <= _printable | set([0x00]):
+        return 'text'
+    return 'binary'
+
+
+def column_fields(records, size):
+    """Derive typed fields from the columns of fixed sized records.
+
+    Consecutive columns that contain printable characters become a text
+    field, the other columns are divided into integers of four, two and one
+    byte. Zero columns are added to the preceding field (e.g., padding or
+    the most significant bytes of an integer), zero columns at the start of
+    a record become unknown data.
+
+    :arg list(bytes) records: Sample records.
+    :arg int size: Record size.
+
+    :returns list: Structure of a record.
+    """
+    classes = []
+    for column in range(size):
+        classes.append(_column_class(set(
+            record[column] for record in records)))
+
+    fields = []
+    column = 0
+    while column < size:
+        kind = classes[column]
+        end = column + 1
+        while end < size and classes[end] in (kind, 'zero'):
+            end += 1
+
+        if kind == 'zero':
+            fields.append({'size': end - column})
+        elif kind == 'text':
+            fields.append({
+                'name': 'field_{:03d}'.format(column), 'type': 'text',
+                'size': end - column})
+        else:
+            offset = column
+            for width, dtype in ((4, 'int'), (2, 'short'), (1, 'byte')):
+                while end - offset >= width:
+                    fields.append({
+                        'name': 'field_{:03d}'.format(offset),
+                        'type': dtype})
+                    offset += width
+        column = end
+
+    return fields
+
+
+def _fixed_skeleton(statistics, size):
+    """Make a structure and types definition for fixed sized records.
+
+    :arg Statistics statistics: Byte statistics.
+    :arg int size: Record size.
+
+    :returns tuple(list, dict): Structure and types definitions.
     """
+    header = statistics.size % size
+    sample = statistics.sample[header:]
+    records = [
+        sample[start:start + size]
+        for start in range(0, len(sample) - size + 1, size)]
+
     structure = []
+    if header:
+        structure.append({'name': 'header', 'type': 'raw', 'size': header})
+    records_structure = column_fields(records, size)
+    structure.append({
+        'name': 'records', 'for': statistics.size // size,
+        'structure': records_structure})
+
+    definitions = {
+        'raw': {'function': {'name': 'raw'}},
+        'text': {'delimiter': [HexInt(0x00)]},
+        'byte': {'function': {'name': 'struct', 'args': {'fmt': 'B'}}},
+        'short': {
+            'size': 2,
+            'function': {'name': 'struct', 'args': {'fmt': '<h'}}},
+        'int': {
+            'size': 4,
+            'function': {'name': 'struct', 'args': {'fmt': '<i'}}}}
+    used = set(item.get('type') for item in structure + records_structure)
+
+    return structure, {'types': dict(
+        (dtype, definitions[dtype]) for dtype in definitions
+        if dtype in used)}
+
+
+def _delimited_skeleton(statistics, delimiter):
+    """Make a structure and types definition for delimited records.
+
+    When an other candidate delimiter occurs equally often in every record
+    of the sample (and the sample contains more than one record), the
+    records are split into fields. Fields are decoded as text, unless the
+    sample contains bytes that are not printable.
 
-    for index in range(
-            len(data.split(''.join(map(chr, delimiter)).encode('utf-8')))):
-        structure.append({
-            'name': 'field_{:06d}'.format(index),
-            'type': 'raw'})
+    :arg Statistics statistics: Byte statistics.
+    :arg list(int) delimiter: Delimiter.
 
-    return structure
+    :returns tuple(list, dict): Structure and types definitions.
+    """
+    separator = bytes(bytearray(delimiter))
+    if len(delimiter) == 1:
+        count = statistics.counts[delimiter[0]]
+    else:
+        count = statistics.delimiter_count
+    if statistics.size and not statistics.ends_with(separator):
+        count += 1
+
+    # Binary data is represented as hexadecimal values.
+    function = 'text'
+    if not set(bytearray(statistics.sample)) - set(delimiter) <= (
+            _printable | _whitespace):
+        function = 'raw'
+
+    types = {function: {
+        'delimiter': list(map(HexInt, delimiter)),
+        'function': {'name': function}}}
+    fields = [{'name': 'field_000', 'type': function}]
 
+    records = statistics.sample.split(separator)[:-1]
+    for candidate in delimiter_candidates(statistics):
+        if candidate in delimiter or len(records) < 2:
+            continue
+        counts = set(
+            record.count(bytes(bytearray([candidate])))
+            for record in records)
+        if len(counts) == 1 and counts != set([0]):
+            types['field'] = {
+                'delimiter': [HexInt(candidate)],
+                'function': {'name': function}}
+            fields = [
+                {'name': 'field_{:03d}'.format(index), 'type': 'field'}
+                for index in range(counts.pop())]
+            fields.append({
+                'name': 'field_{:03d}'.format(len(fields)),
+                'type': function})
+            break
 
-def make_types(delimiter):
-    return {
-        'types': {
-            'raw': {
-                'delimiter': list(map(HexInt, delimiter)),
-                'function': {
-                    'name': 'raw'}},
-            'text': {
-                'delimiter': list(map(HexInt, delimiter))}}}
+    return [{'name': 'records', 'for': count, 'structure': fields}], {
+        'types': types}
 
 
-def make_skeleton(input_handle, structure_handle, types_handle, delimiter):
-    """Use an example file and a delimiter to extract a rudimentary structure
-    and a types definition.
+def make_skeleton(
+        input_handle, structure_handle, types_handle, delimiter=[],
+        block_size=1048576, sample_size=1048576, max_lag=512,
+        log=sys.stderr):
+    """Use an example file to extract a rudimentary structure and a types
+    definition.
+
+    The file is read in blocks. If records of a fixed size are found, the
+    structure consists of a `for` loop over these records with fields that
+    are typed according to the content of the columns in the sample.
+    Otherwise, a `for` loop over records that are separated by the most
+    likely delimiter is made.
 
     :arg stream input_handle: Open readable handle to a binary input file.
     :arg stream structure_handle: Open writeable handle to the structure file.
     :arg stream types_handle: Open writeable handle to the types file.
-    :arg list(int) delimiter: The delimiter.
+    :arg list(int) delimiter: The delimiter, inferred if not given.
+    :arg int block_size: Number of bytes read at once.
+    :arg int sample_size: Number of bytes used for autocorrelation and to
+        type fields.
+    :arg int max_lag: Largest record size.
+    :arg stream log: Stream to report the inferred properties to.
     """
+    statistics = Statistics(delimiter, sample_size)
+    while True:
+        block = input_handle.read(block_size)
+        if not block:
+            break
+        statistics.update(block)
+
+    size = None
+    if not delimiter:
+        size = record_size(statistics, max_lag)
+        candidates = delimiter_candidates(statistics)
+        log.write('Candidate delimiters: {}\n'.format(
+            ', '.join('0x{:02x}'.format(value) for value in candidates)))
+        if size:
+            log.write('Record size: {}\n'.format(size))
+        elif candidates:
+            delimiter = candidates[:1]
+
+    if size:
+        structure, types = _fixed_skeleton(statistics, size)
+    elif delimiter:
+        structure, types = _delimited_skeleton(statistics, delimiter)
+    else:
+        raise ValueError('No delimiter or record size found.')
+
     yaml.add_representer(HexInt, representer)
 
     structure_handle.write('---\n')
     structure_handle.write(
-        yaml.safe_dump(
-            make_structure(input_handle.read(), delimiter),
-        width=76, default_flow_style=False))
+        yaml.safe_dump(structure, width=76, default_flow_style=False))
     types_handle.write('---\n')
     types_handle.write(
-        yaml.dump(make_types(delimiter), width=76,
-        default_flow_style=False))
+        yaml.dump(types, width=76, default_flow_style=False))
 
 
 def main():
@@ -89,14 +435,25 @@ def main():
         help='types definition file')
     parser.add_argument(
         '-d', dest='delimiter', type=hex_int, action='append', default=[],
-        required=True,
-        help='delimiter (use multiple times for multi byte delimiters)')
+        help='delimiter (use multiple times for multi byte delimiters, '
+        'inferred if not given)')
+    parser.add_argument(
+        '-s', dest='sample_size', type=int, default=1048576,
+        help='number of bytes used to infer the record size and field types '
+        '(%(type)s default=%(default)s)')
+    parser.add_argument(
+        '-l', dest='max_lag', type=int, default=512,
+        help='largest record size (%(type)s default=%(default)s)')
 
     args = parser.parse_args()
 
-    make_skeleton(
-        args.input_handle, args.structure_handle, args.types_handle,
-        args.delimiter)
+    try:
+        make_skeleton(
+            args.input_handle, args.structure_handle, args.types_handle,
+            args.delimiter, sample_size=args.sample_size,
+            max_lag=args.max_lag)
+    except ValueError as error:
+        parser.error(error)
 
 
 if __name__ == '__main__':
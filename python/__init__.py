@@ -2,12 +2,15 @@ from os.path import dirname, abspath
 
 from configparser import ConfigParser
 
-from .bin_parser import BinReader, BinWriter
+from .bin_parser import BinReader, BinWriter, Schema
 from .functions import BinReadFunctions, BinWriteFunctions
+from .messages import MessageReader
+from .stream import BinPushReader
+from .tracer import Tracer
 
 
 config = ConfigParser()
-config.readfp(open('{}/setup.cfg'.format(dirname(abspath(__file__)))))
+config.read_file(open('{}/setup.cfg'.format(dirname(abspath(__file__)))))
 
 _copyright_notice = 'Copyright (c) {} {} <{}>'.format(
     config.get('metadata', 'copyright'),
@@ -0,0 +1,145 @@
+"""Asynchronous interfaces for the general binary parser."""
+import asyncio
+import collections
+import sys
+
+from .bin_parser import BinWriter
+from .functions import BinReadFunctions, BinWriteFunctions
+from .stream import BinPushReader, merge_unit
+
+
+class AsyncBinReader(BinPushReader):
+    """Binary file reader for `asyncio` streams.
+
+    Only the bytes needed to complete the current unit are read from the
+    stream, so nothing beyond the end of the structure is consumed. Units
+    that do not depend on the input are read at once, other units are read
+    in parts of at least their minimum size. Completed units (see
+    `BinPushReader`) can be iterated over with `async for`.
+    """
+    def __init__(
+            self, stream, structure, types, functions=BinReadFunctions(),
+            prune=False, yield_every=1000, debug=0, log=sys.stderr):
+        """Constructor.
+
+        :arg StreamReader stream: Stream to read from.
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing parsing functions.
+        :arg bool prune: Remove all unknown data fields from the output.
+        :arg int yield_every: Yield to the event loop after this many units.
+        :arg int debug: Debugging level.
+        :arg stream log: Debug stream to write to.
+        """
+        super(AsyncBinReader, self).__init__(
+            structure, types, functions, prune, debug=debug, log=log)
+
+        self._stream = stream
+        self._yield_every = yield_every
+        self._queue = collections.deque()
+        self._started = False
+        self._units = 0
+
+    async def _advance(self):
+        """Read the bytes needed to complete the current field and parse."""
+        if not self._started:
+            self._started = True
+            self._queue.extend(self.feed(b''))
+            return
+
+        # Every retry parses the current unit from its start, so we read as
+        # much of it as we can be sure of (see `BinPushReader`).
+        missing = self._needed - self._pending_size
+
+        try:
+            if self._separator and missing <= 0:
+                # Read up to and including the (last byte of the) delimiter.
+                chunk = await self._stream.readuntil(self._separator[-1:])
+            else:
+                chunk = await self._stream.readexactly(max(missing, 1))
+        except asyncio.LimitOverrunError as error:
+            chunk = await self._stream.readexactly(error.consumed)
+        except asyncio.IncompleteReadError as error:
+            self._queue.extend(self.feed(error.partial))
+            self._queue.extend(self.close())
+            return
+
+        units = self.feed(chunk)
+        self._queue.extend(units)
+
+        self._units += len(units)
+        if self._units >= self._yield_every:
+            # Parsing buffered data does not yield, so we do it here.
+            self._units = 0
+            await asyncio.sleep(0)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._queue:
+            if self.done:
+                raise StopAsyncIteration
+            await self._advance()
+
+        return self._queue.popleft()
+
+    async def read(self):
+        """Parse the stream.
+
+        :returns dict: Parsed representation of the stream.
+        """
+        async for unit in self:
+            merge_unit(self.parsed, unit)
+
+        return self.parsed
+
+
+class AsyncBinWriter(BinWriter):
+    """Binary file writer for `asyncio` streams.
+
+    The encoded data is written to the stream in blocks, waiting for the
+    stream to drain in between.
+    """
+    def __init__(
+            self, stream, structure, types, functions=BinWriteFunctions(),
+            block_size=65536, yield_every=1000, debug=0, log=sys.stderr):
+        """Constructor.
+
+        :arg StreamWriter stream: Stream to write to.
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing encoding functions.
+        :arg int block_size: Minimum number of bytes per write.
+        :arg int yield_every: Yield to the event loop after this many units.
+        :arg int debug: Debugging level.
+        :arg stream log: Debug stream to write to.
+        """
+        super(BinWriter, self).__init__(
+            structure, types, functions, debug, log)
+
+        self._stream = stream
+        self._block_size = block_size
+        self._yield_every = yield_every
+
+    async def _flush(self):
+        self._stream.write(self.data)
+        self.data = b''
+        await self._stream.drain()
+
+    async def write(self, parsed):
+        """Encode a parsed representation of a binary file.
+
+        :arg dict parsed: Parsed representation of a binary file.
+        """
+        self._internal = {}
+        self.data = b''
+        self.parsed = parsed
+
+        for index, _ in enumerate(self._encode_units(), 1):
+            if len(self.data) >= self._block_size:
+                await self._flush()
+            elif not index % self._yield_every:
+                await asyncio.sleep(0)
+
+        await self._flush()
@@ -1,8 +1,32 @@
 """General binary file parser."""
-import collections
+import collections.abc
+import copy
+import math
+import random
 import sys
 
-from .functions import BinReadFunctions, BinWriteFunctions, operators
+from .cache import DecodeCache, missing
+from .compact import Record, intern_value, record
+from .functions import (
+    BinReadFunctions, BinWriteFunctions, _memoize, bitfield_layout,
+    decode_table, encode_table, operators, table_key)
+from .schema import SchemaError, skips, validate
+
+
+# Functions for which lookup tables are made for single byte types.
+_table_functions = ('bit', 'bitfield', 'flags', 'map', 'struct')
+
+# Functions of which the lookup tables are made when they are first used,
+# making them calls a deprecated function.
+_lazy_table_functions = ('map', )
+
+_loops = ('for', 'do_while', 'while')
+
+# Attributes that only depend on the structure and types definitions, these
+# are shared by all readers or writers that are made from one `Schema`.
+_compiled = (
+    '_functions', 'constants', 'defaults', 'types', 'macros', '_structure',
+    '_kinds', '_flat', '_arguments', '_tables')
 
 
 def deep_update(target, source):
@@ -12,16 +36,134 @@ def deep_update(target, source):
     :arg dict source: Source dictionary.
     """
     for key in source:
-        if (key in target and isinstance(target[key], collections.Mapping) and
-                isinstance( source[key], collections.Mapping)):
+        if (
+                key in target and
+                isinstance(target[key], collections.abc.Mapping) and
+                isinstance(source[key], collections.abc.Mapping)):
             deep_update(target[key], source[key])
         else:
             target[key] = source[key]
 
 
+def frame_field(data, size=0, delimiter=[]):
+    """Prepare an encoded field for storage using either a fixed size, or a
+    delimiter.
+
+    :arg bytes data: The content of the field.
+    :arg int size: Size of fixed size field.
+    :arg list(char) delimiter: Delimiter for variable sized fields.
+
+    :returns bytes: The field as it is stored.
+    """
+    field = data
+
+    if delimiter:
+        # Add the delimiter for variable length fields.
+        field += ''.join(chr(c) for c in delimiter).encode('utf-8')
+
+    # Pad the field if necessary.
+    field += b'\x00' * (size - len(field))
+
+    if size:
+        # Clip the field if it is too large.
+        # NOTE: This can result in a non-delimited field.
+        field = field[:size]
+
+    return field
+
+
+class EndOfInput(Exception):
+    """Raised when a field starts at the end of the input."""
+
+
+class IncompleteField(Exception):
+    """Raised when a field extends beyond the data that is available so far.
+
+    :arg int size: Number of bytes missing from a fixed sized field.
+    :arg bytes separator: Delimiter that was not found.
+    """
+    def __init__(self, size=0, separator=b''):
+        super(IncompleteField, self).__init__(size, separator)
+        self.size = size
+        self.separator = separator
+
+
+def _kind(item):
+    """Determine how an item of a structure is processed.
+
+    :arg dict item: Data structure.
+
+    :returns str: One of `primitive`, `for`, `do_while`, `while`, `macro` or
+        `structure`.
+    """
+    if 'macro' not in item and 'structure' not in item:
+        return 'primitive'
+    for kind in _loops + ('macro', ):
+        if kind in item:
+            return kind
+    return 'structure'
+
+
+def _sample_indices(length, stride, fraction, generator):
+    """Select the elements of a loop that are sampled.
+
+    :arg int length: Number of elements.
+    :arg int stride: Select every {stride}-th element.
+    :arg float fraction: If {stride} is not given, select every element with
+        probability {fraction}.
+    :arg Random generator: Random number generator.
+
+    :returns iterator: Indices of the selected elements in ascending order.
+    """
+    if stride:
+        yield from range(0, length, stride)
+        return
+
+    # The gaps between selected elements follow a geometric distribution, so
+    # only one random number is needed per selected element.
+    log = math.log(1 - fraction)
+    index = -1
+    while True:
+        index += 1 + int(math.log(1 - generator.random()) / log)
+        if index >= length:
+            return
+        yield index
+
+
+def _category(kind):
+    """Classify a nested structure for tracing purposes.
+
+    :arg str kind: Kind of the nested structure (see `_kind`).
+
+    :returns str: Category of the nested structure.
+    """
+    if kind in _loops:
+        return 'loop'
+    return kind
+
+
+@_memoize
+def _read_table(functions, name, kwargs):
+    """Make a lookup table for decoding single bytes (see `decode_table`).
+
+    :arg object functions: Object containing parsing functions.
+    :arg str name: Name of the function.
+    :arg dict kwargs: Arguments of the function.
+
+    :returns tuple(list, bool): Lookup table and whether it contains
+        dictionaries, or None if no table can be made.
+    """
+    table = decode_table(functions, name, kwargs)
+    if not table:
+        return None
+    return table, any(isinstance(value, dict) for value in table)
+
+
 class BinParser(object):
     """General binary file parser."""
-    def __init__(self, structure, types, functions, debug=0, log=sys.stderr):
+    def __init__(
+            self, structure, types, functions, debug=0, log=sys.stderr,
+            tracer=None, compiled=None):
         """Constructor.
 
         :arg dict structure: The structure definition.
@@ -29,18 +171,47 @@ class BinParser(object):
         :arg object functions: Object containing parsing or encoding functions.
         :arg int debug: Debugging level.
         :arg stream log: Debug stream to write to.
+        :arg Tracer tracer: Timeline tracer.
+        :arg BinParser compiled: Parser to share the compiled definitions
+            with (see `Schema`), {structure}, {types} and {functions} are
+            not used if given.
         """
         self._internal = {}
 
         self._debug = debug
         self._log = log
+        self._tracer = tracer
 
+        if compiled:
+            for name in _compiled:
+                setattr(self, name, getattr(compiled, name))
+        else:
+            self._compile(structure, types, functions)
+        self._frozen = False
+        self._compact = False
+        self._caches = self._make_caches()
+
+        if self._debug & ~0x03:
+            raise ValueError('Invalid debug level.')
+        if self._debug & 0x02:
+            self._log.write('--- PARSING DETAILS ---\n\n')
+
+    def _compile(self, structure, types, functions):
+        """Validate the structure and types definitions and precompute
+        everything that does not depend on the input.
+
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing parsing or encoding functions.
+        """
         self._functions = functions
 
         self.constants = {}
         self.defaults = {
+            'cache_size': 1024,
             'delimiter': [],
             'name': '',
+            'pure': False,
             'size': 0,
             'type': 'text',
             'unknown_destination': '__raw__',
@@ -64,11 +235,195 @@ class BinParser(object):
             deep_update(self.macros, types_data['macros'])
 
         self._structure = structure
+        self._kinds = self._compile_kinds()
+        self._flat = self._compile_flat()
+        self._arguments = {}
 
-        if self._debug & ~0x03:
-            raise ValueError('Invalid debug level.')
-        if self._debug & 0x02:
-            self._log.write('--- PARSING DETAILS ---\n\n')
+        errors = validate(self)
+        if errors:
+            raise SchemaError(errors)
+
+        self._arguments = self._prepare_arguments()
+        self._tables = self._make_tables()
+
+    def _compile_kinds(self):
+        """Determine the kind (see `_kind`) of every item in the structure
+        and in the macros.
+
+        :returns dict: Kind per item, indexed by the identity of the item.
+        """
+        kinds = {}
+        stack = [self._structure or []] + list(self.macros.values())
+
+        while stack:
+            for item in stack.pop() or []:
+                kinds[id(item)] = _kind(item)
+                if 'structure' in item:
+                    stack.append(item['structure'])
+
+        return kinds
+
+    def _compile_flat(self):
+        """Find the structures and macros that only contain primitive data
+        types. These are processed directly instead of in a frame (see
+        `_walk`), since they can not be nested any deeper.
+
+        :returns set: Identities of the flat structures.
+        """
+        flat = set()
+        stack = [self._structure or []] + list(self.macros.values())
+
+        while stack:
+            structure = stack.pop() or []
+            if all(self._kinds[id(item)] == 'primitive' for item in structure):
+                flat.add(id(structure))
+            for item in structure:
+                if 'structure' in item:
+                    stack.append(item['structure'])
+
+        return flat
+
+    def _get_kind(self, item):
+        """Get the kind of an item (see `_kind`).
+
+        :arg dict item: Data structure.
+
+        :returns str: Kind of {item}.
+        """
+        try:
+            return self._kinds[id(item)]
+        except KeyError:
+            return _kind(item)
+
+    def _walk(self, root, frame, fields):
+        """Process nested structures without recursion.
+
+        A frame is a generator that processes one structure. Instead of
+        processing a nested structure itself, it yields a (`structure`,
+        `data`) tuple, after which `frame(structure, data)` is put on a stack
+        and processed before the frame is resumed.
+
+        Flat structures (see `_compile_flat`) are passed to {fields} instead,
+        which processes them directly.
+
+        :arg generator root: Frame for the outermost structure.
+        :arg function frame: Function that makes a frame.
+        :arg function fields: Function that processes a flat structure.
+
+        :returns any: Return value of {root}.
+        """
+        stack = [root]
+        top = root
+        flat = self._flat
+
+        while True:
+            try:
+                nested = next(top)
+            except StopIteration as error:
+                stack.pop()
+                if not stack:
+                    return error.value
+                top = stack[-1]
+            else:
+                if id(nested[0]) in flat:
+                    fields(*nested)
+                else:
+                    top = frame(*nested)
+                    stack.append(top)
+
+    def _single_byte_types(self, base):
+        """Find the types that are encoded in a single byte by one of the
+        functions in `_table_functions`, as implemented in `base`.
+
+        :arg class base: Class containing the original functions.
+
+        :returns list: List of (`dtype`, `func`, `kwargs`) tuples.
+        """
+        result = []
+
+        for dtype in self.types:
+            if self._get_default({}, dtype, 'delimiter'):
+                continue
+            if self._get_value(self._get_default({}, dtype, 'size')) not in (
+                    0, 1):
+                continue
+            _, _, func, kwargs = self._get_function({}, dtype)
+            if (
+                    func in _table_functions and
+                    getattr(type(self._functions), func, None) is
+                    getattr(base, func)):
+                result.append((dtype, func, kwargs))
+
+        return result
+
+    def _prepare_arguments(self):
+        """Precompute function arguments that do not change during parsing,
+        e.g., the shifts and masks of bitfields.
+
+        :returns dict: Function arguments per type.
+        """
+        arguments = {}
+
+        for dtype in self.types:
+            _, _, func, kwargs = self._get_function({}, dtype)
+            if func == 'bitfield':
+                size = self._get_value(self._get_default({}, dtype, 'size'))
+                if not isinstance(size, int):
+                    size = 0
+                arguments[dtype] = dict(
+                    kwargs, size=size,
+                    fields=bitfield_layout(kwargs['fields'], size))
+
+        return arguments
+
+    def _make_tables(self):
+        """Make lookup tables for single byte types. Types of which the table
+        is made when it is first used (see `_lazy_table`) are mapped to None.
+
+        :returns dict: Lookup tables per type.
+        """
+        return {}
+
+    def _make_table(self, func, kwargs):
+        """Make a lookup table for a single byte type.
+
+        :arg str func: Name of the function.
+        :arg dict kwargs: Arguments for the function.
+
+        :returns any: Lookup table, None if no table can be made.
+        """
+        return None
+
+    def _lazy_table(self, dtype):
+        """Make the lookup table of a type that is used for the first time.
+        If no table can be made, the type is removed from {self._tables}.
+
+        :arg str dtype: Data type.
+
+        :returns any: Lookup table, None if no table can be made.
+        """
+        _, _, func, kwargs = self._get_function({}, dtype)
+        table = self._make_table(func, kwargs)
+        if table:
+            self._tables[dtype] = table
+        else:
+            self._tables.pop(dtype, None)
+
+        return table
+
+    def _make_caches(self):
+        """Make decoding caches for types that are marked as pure.
+
+        :returns dict: Decoding cache per type.
+        """
+        return {}
+
+    def cache_info(self):
+        """Get decoding cache statistics.
+
+        :returns dict: Cache statistics (see `DecodeCache.info`) per type.
+        """
+        return {dtype: self._caches[dtype].info() for dtype in self._caches}
 
     def _call(self, name, data, *args, **kwargs):
         return getattr(self._functions, name)(data, *args, **kwargs)
@@ -135,6 +490,7 @@ class BinParser(object):
                 func = self.types[dtype]['function']['name']
             if 'args' in self.types[dtype]['function']:
                 kwargs = self.types[dtype]['function']['args']
+        kwargs = self._arguments.get(dtype, kwargs)
 
         return delim, size, func, kwargs
 
@@ -156,7 +512,7 @@ class BinParser(object):
         operands = []
 
         for operand in expression['operands']:
-            if isinstance(operand, collections.Mapping):
+            if isinstance(operand, collections.abc.Mapping):
                 operands.append(self._evaluate(operand))
             else:
                 operands.append(self._get_value(operand))
@@ -182,56 +538,157 @@ class BinReader(BinParser):
     """General binary file reader."""
     def __init__(
             self, data, structure, types, functions=BinReadFunctions(),
-            prune=False, debug=0, log=sys.stderr):
+            prune=False, debug=0, log=sys.stderr, tracer=None,
+            offsets=False, frozen=False, compact=False, schema=None,
+            stride=0, fraction=0, seed=0):
         """Constructor.
 
         :arg stream data: Content of a binary file.
         :arg dict structure: The structure definition.
         :arg dict types: The types definition.
-        :arg object functions: Object containing parsing functions.
+        :arg object functions: Object containing parsing functions, these
+            must not keep any state (the default object is shared).
         :arg bool prune: Remove all unknown data fields from the output.
         :arg int debug: Debugging level.
         :arg stream log: Debug stream to write to.
+        :arg Tracer tracer: Timeline tracer.
+        :arg bool offsets: Record the position of every field in
+            {self.offsets}.
+        :arg bool frozen: Return shared read-only dictionaries for single
+            byte types (e.g., flags) and cached values (see `DecodeCache`)
+            instead of copies.
+        :arg bool compact: Use records instead of dictionaries for loop
+            elements, nested structures and compound values and intern short
+            strings to reduce memory usage.
+        :arg Schema schema: Compiled definitions (see `Schema`),
+            {structure}, {types} and {functions} are not used if given.
+        :arg int stride: Only decode every {stride}-th element of `for`
+            loops.
+        :arg float fraction: Only decode a random fraction of the elements
+            of `for` loops.
+        :arg int seed: Random seed used with {fraction}.
         """
         super(BinReader, self).__init__(
-            structure, types, functions, debug, log)
+            structure, types, functions, debug, log, tracer,
+            schema and schema._reader)
 
         self._prune = prune
+        self._final = True
+        self._frozen = frozen
+        self._compact = compact
+
+        self._reset(data)
+        if offsets:
+            self.offsets = {}
+        if stride < 0:
+            raise ValueError('Invalid sampling stride.')
+        if not 0 <= fraction <= 1:
+            raise ValueError('Invalid sampling fraction.')
+        if stride > 1 or 0 < fraction < 1:
+            self._sample = (stride, fraction, random.Random(seed))
+            self._skips = skips(self)
+
+        try:
+            self._parse(self._structure, self.parsed)
+        except EndOfInput:
+            pass
+
+        if self._tracer:
+            self._tracer.close(self._offset)
+
+    def _make_tables(self):
+        tables = {}
+
+        for dtype, func, kwargs in self._single_byte_types(BinReadFunctions):
+            if func in _lazy_table_functions:
+                tables[dtype] = None
+                continue
+            table = self._make_table(func, kwargs)
+            if table:
+                tables[dtype] = table
+
+        return tables
+
+    def _make_table(self, func, kwargs):
+        return _read_table(self._functions, func, kwargs)
+
+    def _make_caches(self):
+        return {
+            dtype: DecodeCache(
+                self._get_default({}, dtype, 'cache_size'))
+            for dtype in self.types
+            if self._get_default({}, dtype, 'pure') and
+                dtype not in self._tables}
+
+    def _reset(self, data):
+        """Reset the parser state.
+
+        :arg stream data: Content of a binary file.
+        """
+        self._internal = {}
 
         self.data = data
         self.parsed = {}
         self._offset = 0
         self._raw_byte_count = 0
 
-        try:
-            self._parse(self._structure, self.parsed)
-        except StopIteration:
-            pass
+        self._cursor = [0, None, None]
+        self._counts = {}
+
+        self._base = 0
+        self._path = []
+        self._unit = None
+        self.offsets = None
+
+        self._sample = None
+        self._skips = {}
+
+    def _record(self, path, start, end, item, dtype):
+        """Record the position of a field.
+
+        :arg tuple path: Location of the field in the parsed data.
+        :arg int start: Position of the first byte of the field.
+        :arg int end: Position after the last byte of the field.
+        :arg dict item: Data structure.
+        :arg str dtype: Data type.
+        """
+        self.offsets[path] = (start, end)
 
     def _get_field(self, size=0, delimiter=[]):
         """Extract a field from {self.data} using either a fixed size, or a
         delimiter. After reading, {self._offset} is set to the next field.
 
+        If {self._final} is not set, more data may follow, in which case
+        `IncompleteField` is raised for fields that are not fully available.
+
         :arg int size: Size of fixed size field.
         :arg list(char) delimiter: Delimiter for variable sized fields.
 
         :return str: Content of the requested field.
         """
-        if self._offset >= len(self.data):
-            raise StopIteration
+        if self._offset >= len(self.data) and self._final:
+            raise EndOfInput()
 
         separator = ''.join(chr(c) for c in delimiter).encode('utf-8')
 
         if size:
             # Fixed sized field.
-            field = self.data[self._offset:self._offset + size]
+            end = self._offset + size
+            if end > len(self.data) and not self._final:
+                raise IncompleteField(end - len(self.data))
+            field = self.data[self._offset:end]
             extracted = size
             if delimiter:
                 # A variable sized field in a fixed sized field.
                 field = field.split(separator)[0]
         else:
             # Variable sized field.
-            field = self.data[self._offset:].split(separator)[0]
+            end = self.data.find(separator, self._offset)
+            if end < 0:
+                if not self._final:
+                    raise IncompleteField(separator=separator)
+                end = len(self.data)
+            field = self.data[self._offset:end]
             extracted = len(field) + 1 # FIXME: len(separator)
 
         if self._debug & 0x02:
@@ -245,6 +702,30 @@ class BinReader(BinParser):
         self._offset += extracted
         return field
 
+    def _pack(self, dictionary):
+        """Convert a dictionary to a record in compact mode.
+
+        :arg dict dictionary: Dictionary.
+
+        :returns dict: A `Record` in compact mode, {dictionary} otherwise.
+        """
+        if self._compact:
+            return record(dictionary)
+        return dictionary
+
+    def _refer(self, start, length, representation):
+        """Represent a field by referring to the input.
+
+        :arg int start: Position of the field in {self.data}.
+        :arg int length: Length of the field.
+        :arg str representation: Either `memoryview` or `reference`.
+
+        :returns any: A view of the field, or an (`offset`, `length`) tuple.
+        """
+        if representation == 'memoryview':
+            return memoryview(self.data)[start:start + length]
+        return (self._base + start, length)
+
     def _parse_primitive(self, item, dtype, dest, name):
         """Parse a primitive data type.
 
@@ -258,15 +739,50 @@ class BinReader(BinParser):
             dtype = self._get_value(
                 self._get_default(item, '', 'unknown_function'))
         delim, size, func, kwargs = self._get_function(item, dtype)
-        result = self._call(func, self._get_field(size, delim), **kwargs)
+        start = self._offset
+        field = self._get_field(size, delim)
+        if kwargs.get('representation') in ('memoryview', 'reference'):
+            result = self._refer(start, len(field), kwargs['representation'])
+        elif size == 1 and len(field) == 1 and dtype in self._tables and (
+                self._tables[dtype] or self._lazy_table(dtype)):
+            table, mutable = self._tables[dtype]
+            result = table[ord(field)]
+            if mutable and not self._frozen:
+                result = dict(result)
+        elif dtype in self._caches:
+            result = self._caches[dtype].lookup(field, self._frozen)
+            if result is missing:
+                result = self._call(func, field, **kwargs)
+                self._caches[dtype].store(field, result)
+        else:
+            result = self._call(func, field, **kwargs)
+
+        if self.offsets is not None:
+            if name:
+                path = tuple(self._path) + (name, )
+            else:
+                unknown_dest = self._get_default(
+                    item, dtype, 'unknown_destination')
+                count = len(dest.get(unknown_dest, []))
+                if dest is self._unit:
+                    # Unknown data fields at the top level are counted by
+                    # `_step`.
+                    count += self._counts.get(unknown_dest, 0)
+                path = tuple(self._path) + (unknown_dest, count)
+            self._record(
+                path, self._base + start, self._base + self._offset, item,
+                dtype)
 
         if name:
             # Store the data.
-            if isinstance(result, collections.Mapping):
+            if isinstance(result, collections.abc.Mapping):
                 # Unpack dictionaries in order to use the items in evaluations.
                 for member in result:
                     self._internal[member] = result[member]
+                result = self._pack(result)
             else:
+                if self._compact:
+                    result = intern_value(result)
                 self._internal[name] = result
             dest[name] = result
         else:
@@ -280,7 +796,7 @@ class BinReader(BinParser):
             self._raw_byte_count += size
 
     def _parse_for(self, item, dest, name):
-        """Parse a for loop.
+        """Parse a for loop, yield the elements (see `_walk`).
 
         :arg dict item: Data structure.
         :arg dict dest: Destination dictionary.
@@ -288,27 +804,109 @@ class BinReader(BinParser):
         """
         length = self._get_value(item['for'])
 
-        for _ in range(length):
+        if self._sample:
+            yield from self._sample_for(item, dest, name, length)
+            return
+
+        for index in range(length):
+            if self._tracer:
+                self._tracer.begin(name, 'iteration', self._offset, index)
+            if self.offsets is not None:
+                self._path.append(len(dest[name]))
             structure_dict = {}
-            self._parse(item['structure'], structure_dict)
-            dest[name].append(structure_dict)
+            yield item['structure'], structure_dict
+            dest[name].append(self._pack(structure_dict))
+            if self.offsets is not None:
+                self._path.pop()
+            if self._tracer:
+                self._tracer.end(self._offset)
+
+    def _skip(self, item, count):
+        """Skip elements of a `for` loop.
+
+        Elements of a static size are skipped in one go, elements of which
+        the fields are delimited are skipped by scanning for delimiters.
+        Other elements are decoded and discarded.
+
+        :arg dict item: Data structure.
+        :arg int count: Number of elements.
+        """
+        skip = self._skips.get(id(item))
+
+        if isinstance(skip, int):
+            self._offset = min(self._offset + count * skip, len(self.data))
+        elif skip:
+            for _ in range(count):
+                for size, delimiter in skip:
+                    self._get_field(size, delimiter)
+        else:
+            path = self._path
+            self._path = []
+            offsets = self.offsets
+            self.offsets = None
+            for _ in range(count):
+                self._parse(item['structure'], {})
+            self._path = path
+            self.offsets = offsets
+
+    def _sample_for(self, item, dest, name, length):
+        """Parse a sample of the elements of a `for` loop, yield the
+        elements (see `_walk`). The sampled elements are stored by their
+        index.
+
+        :arg dict item: Data structure.
+        :arg dict dest: Destination dictionary.
+        :arg str name: Field name used in the destination dictionary.
+        :arg int length: Number of elements.
+        """
+        stride, fraction, generator = self._sample
+        dest[name] = {}
+        position = 0
+
+        for index in _sample_indices(length, stride, fraction, generator):
+            self._skip(item, index - position)
+            if self._tracer:
+                self._tracer.begin(name, 'iteration', self._offset, index)
+            if self.offsets is not None:
+                self._path.append(index)
+            structure_dict = {}
+            yield item['structure'], structure_dict
+            dest[name][index] = self._pack(structure_dict)
+            if self.offsets is not None:
+                self._path.pop()
+            if self._tracer:
+                self._tracer.end(self._offset)
+            position = index + 1
+
+        self._skip(item, length - position)
 
     def _parse_do_while(self, item, dest, name):
-        """Parse a do-while loop.
+        """Parse a do-while loop, yield the elements (see `_walk`).
 
         :arg dict item: Data structure.
         :arg dict dest: Destination dictionary.
         :arg str name: Field name used in the destination dictionary.
         """
+        index = 0
+
         while True:
+            if self._tracer:
+                self._tracer.begin(name, 'iteration', self._offset, index)
+            if self.offsets is not None:
+                self._path.append(len(dest[name]))
             structure_dict = {}
-            self._parse(item['structure'], structure_dict)
-            dest[name].append(structure_dict)
+            yield item['structure'], structure_dict
+            dest[name].append(self._pack(structure_dict))
+            if self.offsets is not None:
+                self._path.pop()
+            if self._tracer:
+                self._tracer.end(self._offset)
             if not self._evaluate(item['do_while']):
                 break
+            index += 1
 
     def _parse_while(self, item, dest, name):
-        """Parse a while loop.
+        """Parse a while loop, yield the elements (see `_walk`).
 
         :arg dict item: Data structure.
         :arg dict dest: Destination dictionary.
@@ -316,17 +914,47 @@ class BinReader(BinParser):
         """
         delim = item['structure'][0]
 
+        index = 0
+
         dest[name] = [{}]
-        self._parse([delim], dest[name][0])
+        yield from self._parse_element([delim], dest[name])
         while self._evaluate(item['while']):
-            self._parse(item['structure'][1:], dest[name][-1])
+            if self._tracer:
+                self._tracer.begin(name, 'iteration', self._offset, index)
+            yield from self._parse_element(
+                item['structure'][1:], dest[name])
+            dest[name][-1] = self._pack(dest[name][-1])
             dest[name].append({})
-            self._parse([delim], dest[name][-1])
+            yield from self._parse_element([delim], dest[name])
+            if self._tracer:
+                self._tracer.end(self._offset)
+            index += 1
 
         dest[item['while']['term']] = list(dest[name].pop(-1).values())[0]
 
-    def _parse(self, structure, dest):
-        """Parse a binary file.
+        if self.offsets is not None:
+            # The terminating field is moved out of the list.
+            path = tuple(self._path[:-1])
+            element = path + (name, len(dest[name]), delim['name'])
+            if element in self.offsets:
+                self.offsets[path + (item['while']['term'], )] = (
+                    self.offsets.pop(element))
+
+    def _parse_element(self, structure, dest):
+        """Parse (part of) the last element of a list, yield it (see
+        `_walk`).
+
+        :arg dict structure: Structure of the element.
+        :arg list dest: Destination list.
+        """
+        if self.offsets is not None:
+            self._path.append(len(dest) - 1)
+        yield structure, dest[-1]
+        if self.offsets is not None:
+            self._path.pop()
+
+    def _parse_frame(self, structure, dest):
+        """Parse a structure, yield nested structures (see `_walk`).
 
         :arg dict structure: Structure of the binary file.
         :arg dict dest: Destination dictionary.
@@ -342,8 +970,9 @@ class BinReader(BinParser):
 
             dtype = self._get_value(self._get_default(item, '', 'type'))
             name = self._get_default(item, dtype, 'name')
+            kind = self._get_kind(item)
 
-            if not set(['macro', 'structure']) & set(item):
+            if kind == 'primitive':
                 # Primitive data types.
                 self._parse_primitive(item, dtype, dest, name)
             else:
@@ -352,26 +981,210 @@ class BinReader(BinParser):
                     self._log.write('-- {}\n'.format(name))
 
                 if name not in dest:
-                    if set(['for', 'do_while', 'while']) & set(item):
+                    if kind in _loops:
                         dest[name] = []
                     else:
                         dest[name] = {}
-
-                if 'for' in item:
-                    self._parse_for(item, dest, name)
-                elif 'do_while' in item:
-                    self._parse_do_while(item, dest, name)
-                elif 'while' in item:
-                    self._parse_while(item, dest, name)
-                elif 'macro' in item:
+                elif isinstance(dest[name], Record):
+                    # Records can not be extended.
+                    dest[name] = dict(dest[name])
+
+                if self._tracer:
+                    self._tracer.begin(name, _category(kind), self._offset)
+                if self.offsets is not None:
+                    self._path.append(name)
+
+                if kind == 'for':
+                    yield from self._parse_for(item, dest, name)
+                elif kind == 'do_while':
+                    yield from self._parse_do_while(item, dest, name)
+                elif kind == 'while':
+                    yield from self._parse_while(item, dest, name)
+                elif kind == 'macro':
                     dmacro = self._get_value(
                         self._get_default(item, '', 'macro'))
-                    self._parse(self.macros[dmacro], dest[name])
+                    yield self.macros[dmacro], dest[name]
+                    dest[name] = self._pack(dest[name])
                 else:
-                    self._parse(item['structure'], dest[name])
+                    yield item['structure'], dest[name]
+                    dest[name] = self._pack(dest[name])
+
+                if self.offsets is not None:
+                    self._path.pop()
+                if self._tracer:
+                    self._tracer.end(self._offset)
+
+            if self._debug & 0x02:
+                self._log.write(' --> {}\n'.format(name))
+
+    def _parse_fields(self, structure, dest):
+        """Parse a structure that only contains primitive data types.
+
+        :arg dict structure: Structure of the binary file.
+        :arg dict dest: Destination dictionary.
+        """
+        for item in structure or []:
+            if 'if' in item:
+                # Conditional statement.
+                if not self._evaluate(item['if']):
+                    continue
+
+            dtype = self._get_value(self._get_default(item, '', 'type'))
+            name = self._get_default(item, dtype, 'name')
+            self._parse_primitive(item, dtype, dest, name)
+
+            if self._debug & 0x02:
+                self._log.write(' --> {}\n'.format(name))
+
+    def _parse(self, structure, dest):
+        """Parse a binary file.
+
+        :arg dict structure: Structure of the binary file.
+        :arg dict dest: Destination dictionary.
+        """
+        if id(structure) in self._flat:
+            self._parse_fields(structure, dest)
+        else:
+            self._walk(
+                self._parse_frame(structure, dest), self._parse_frame,
+                self._parse_fields)
+
+    def _step(self, partial=False):
+        """Parse the next unit of the structure.
+
+        A unit is either an item at the top level of the structure, or one
+        element of a loop at the top level of the structure. The position in
+        the structure is kept in {self._cursor}, which holds the index of the
+        current item, the loop iteration and the length of a `for` loop.
+
+        The parsed data is returned as a list of (`name`, `index`, `value`)
+        triples. For items that are not part of a list, `index` is None. The
+        start of a loop is reported once as (`name`, None, []), the elements
+        of loops and unknown data fields are reported with their position in
+        the list.
+
+        If the input ends within a unit, `EndOfInput` is raised, unless
+        `partial` is set, in which case the fields that were read are
+        returned like `BinReader` keeps them and the end of the structure is
+        assumed.
+
+        :arg bool partial: Return incomplete units at the end of the input.
+
+        :returns list: Parsed data, None if the end of the structure is
+            reached.
+        """
+        index, iteration, length = self._cursor
+
+        if index >= len(self._structure or []):
+            return None
+
+        item = self._structure[index]
+        dtype = self._get_value(self._get_default(item, '', 'type'))
+        name = self._get_default(item, dtype, 'name')
+
+        if self._get_kind(item) not in _loops:
+            # Primitive data types and nested structures.
+            unit = {}
+            self._unit = unit
+            try:
+                self._parse([item], unit)
+            except EndOfInput:
+                if not partial:
+                    raise
+                index = len(self._structure) - 1
+            finally:
+                self._unit = None
+                self._path = []
+            self._cursor = [index + 1, None, None]
+
+            result = []
+            for key in unit:
+                if key == name:
+                    result.append((key, None, unit[key]))
+                else:
+                    # Unknown data fields.
+                    for value in unit[key]:
+                        result.append((key, self._counts.get(key, 0), value))
+                        self._counts[key] = self._counts.get(key, 0) + 1
+            return result
+
+        if iteration is None:
+            # Start of a loop.
+            if 'if' in item and not self._evaluate(item['if']):
+                self._cursor = [index + 1, None, None]
+                return []
+
+            if self._debug & 0x02:
+                self._log.write('-- {}\n'.format(name))
+
+            if 'for' in item:
+                length = self._get_value(item['for'])
+            self._cursor = [index, 0, length]
+
+            if name in self._counts:
+                return []
+            self._counts[name] = 0
+            return [(name, None, [])]
 
+        result = []
+        unit = {}
+        done = False
+
+        if self.offsets is not None:
+            self._path = [name, self._counts[name]]
+
+        try:
+            if 'for' in item:
+                if iteration < length:
+                    self._parse(item['structure'], unit)
+                    done = iteration + 1 >= length
+                else:
+                    done = True
+                    unit = None
+            elif 'do_while' in item:
+                self._parse(item['structure'], unit)
+                done = not self._evaluate(item['do_while'])
+            else:
+                self._parse(item['structure'][:1], unit)
+                if self._evaluate(item['while']):
+                    self._parse(item['structure'][1:], unit)
+                else:
+                    done = True
+                    result.append((
+                        item['while']['term'], None,
+                        list(unit.values())[0]))
+                    unit = None
+
+                    if self.offsets is not None:
+                        # The terminating field is moved out of the list.
+                        element = tuple(self._path) + (
+                            item['structure'][0]['name'], )
+                        if element in self.offsets:
+                            self.offsets[(item['while']['term'], )] = (
+                                self.offsets.pop(element))
+        except EndOfInput:
+            if not partial:
+                raise
+            if 'while' not in item:
+                # Only elements of `while` loops are kept by `BinReader`.
+                unit = None
+            index = len(self._structure) - 1
+            done = True
+        finally:
+            self._path = []
+
+        if unit is not None:
+            result.insert(0, (name, self._counts[name], self._pack(unit)))
+            self._counts[name] += 1
+
+        if done:
             if self._debug & 0x02:
                 self._log.write(' --> {}\n'.format(name))
+            self._cursor = [index + 1, None, None]
+        else:
+            self._cursor = [index, iteration + 1, length]
+
+        return result
 
     def log_debug_info(self):
         """Write additional debugging information to the log."""
@@ -384,30 +1197,62 @@ class BinReader(BinParser):
             self._offset, data_length))
         self._log.write('{} bytes parsed ({:d}%).\n'.format(
             parsed, parsed * 100 // data_length))
+        for dtype, info in sorted(self.cache_info().items()):
+            self._log.write(
+                'Cache for `{}`: {} hits, {} misses.\n'.format(
+                    dtype, info['hits'], info['misses']))
 
 
 class BinWriter(BinParser):
     """General binary file writer."""
+    _source = None
+
     def __init__(
             self, parsed, structure, types, functions=BinWriteFunctions(),
-            debug=0, log=sys.stderr):
+            debug=0, log=sys.stderr, tracer=None, schema=None, source=None):
         """Constructor.
 
         :arg dict parsed: Parsed representation of a binary file.
         :arg dict structure: The structure definition.
         :arg dict types: The types definition.
-        :arg object functions: Object containing parsing functions.
+        :arg object functions: Object containing parsing functions, these
+            must not keep any state (the default object is shared).
         :arg int debug: Debugging level.
         :arg stream log: Debug stream to write to.
+        :arg Tracer tracer: Timeline tracer.
+        :arg Schema schema: Compiled definitions (see `Schema`),
+            {structure}, {types} and {functions} are not used if given.
+        :arg bytes source: Input that `reference` representations of unknown
+            data refer to.
         """
+        if schema and not schema._writer:
+            raise ValueError('Schema has no encoding functions.')
         super(BinWriter, self).__init__(
-            structure, types, functions, debug, log)
+            structure, types, functions, debug, log, tracer,
+            schema and schema._writer)
 
+        self._source = source
         self.data = b''
         self.parsed = parsed
 
         self._encode(self._structure, self.parsed)
 
+    def _make_tables(self):
+        tables = {}
+
+        for dtype, func, kwargs in self._single_byte_types(BinWriteFunctions):
+            if func in _lazy_table_functions:
+                tables[dtype] = None
+                continue
+            table = self._make_table(func, kwargs)
+            if table:
+                tables[dtype] = table
+
+        return tables
+
+    def _make_table(self, func, kwargs):
+        return encode_table(BinReadFunctions(), self._functions, func, kwargs)
+
     def _set_field(self, data, size=0, delimiter=[]):
         """Append a field to {self.data} using either a fixed size, or a
         delimiter.
@@ -416,21 +1261,21 @@ class BinWriter(BinParser):
         :arg int size: Size of fixed size field.
         :arg list(char) delimiter: Delimiter for variable sized fields.
         """
-        field = data
+        self.data += frame_field(data, size, delimiter)
 
-        if delimiter:
-            # Add the delimiter for variable length fields.
-            field += ''.join(chr(c) for c in delimiter).encode('utf-8')
+    def _dereference(self, reference):
+        """Get the data that a `reference` representation refers to (see
+        `BinReader._refer`).
 
-        # Pad the field if necessary.
-        field += b'\x00' * (size - len(field))
+        :arg tuple reference: An (`offset`, `length`) pair.
 
-        if size:
-            # Clip the field if it is too large.
-            # NOTE: This can result in a non-delimited field.
-            field = field[:size]
+        :returns bytes: The data in {self._source}.
+        """
+        if self._source is None:
+            raise ValueError('No source for raw data references.')
+        offset, length = reference
 
-        self.data += field
+        return bytes(self._source[offset:offset + length])
 
     def _encode_primitive(self, item, dtype, value, name):
         """Encode a primitive data type.
@@ -441,15 +1286,28 @@ class BinWriter(BinParser):
         :arg str name: Field name used in the destination dictionary.
         """
         delim, size, func, kwargs = self._get_function(item, dtype)
+        if kwargs.get('representation') == 'reference' and isinstance(
+                value, (list, tuple)):
+            value = self._dereference(value)
 
-        if isinstance(value, collections.Mapping):
+        if isinstance(value, collections.abc.Mapping):
             # Unpack dictionaries in order to use the items in evaluations.
             for member in value:
                 self._internal[member] = value[member]
         else:
             self._internal[name] = value
 
-        self._set_field(self._call(func, value, **kwargs), size, delim)
+        encoded = None
+        if size == 1 and not delim and dtype in self._tables and (
+                self._tables[dtype] or self._lazy_table(dtype)):
+            try:
+                encoded = self._tables[dtype].get(table_key(value))
+            except TypeError:
+                pass
+        if encoded is None:
+            encoded = self._call(func, value, **kwargs)
+
+        self._set_field(encoded, size, delim)
 
     def _get_item(self, item):
         """Resolve the `term` field in the `while` structure.
@@ -465,8 +1323,138 @@ class BinWriter(BinParser):
 
         return None
 
-    def _encode(self, structure, source):
-        """Encode to a binary file.
+    def _encode_loop(self, item, name, value, source):
+        """Encode a loop, yield the elements (see `_walk`).
+
+        :arg dict item: Data structure.
+        :arg str name: Field name used in the source dictionary.
+        :arg list value: Elements of the loop.
+        :arg dict source: Source dictionary.
+        """
+        if 'for' in item and self._get_value(item['for']) != len(value):
+            self._log.write(
+                'Warning: size of `{}` and `{}` differ.\n'.format(
+                    item['name'], item['for']))
+        for index, subitem in enumerate(value):
+            if self._tracer:
+                self._tracer.begin(name, 'iteration', len(self.data), index)
+            yield item['structure'], subitem
+            if self._tracer:
+                self._tracer.end(len(self.data))
+        # TODO: Check evaluation for `while` and `do_while`.
+        if 'while' in item:
+            term = self._get_item(item)
+            yield [term], {term['name']: source[item['while']['term']]}
+
+    def _item_source(self, item, source, raw_counter):
+        """Find the value of an item in a source dictionary.
+
+        :arg dict item: Data structure.
+        :arg dict source: Source dictionary.
+        :arg int raw_counter: Number of unknown data fields encoded so far.
+
+        :returns tuple: (`dtype`, `name`, `value`, `raw_counter`), where
+            `raw_counter` is updated, None if the item is not present.
+        """
+        if 'if' in item:
+            # Conditional statement.
+            if not self._evaluate(item['if']):
+                return None
+
+        dtype = self._get_value(self._get_default(item, '', 'type'))
+        name = self._get_default(item, dtype, 'name')
+
+        if not name:
+            # NOTE: Not sure if this is correct.
+            dtype = self._get_value(
+                self._get_default(item, dtype, 'unknown_function'))
+            value = source[self._get_default(
+                item, dtype, 'unknown_destination')][raw_counter]
+            raw_counter += 1
+        else:
+            value = source[name]
+
+        return dtype, name, value, raw_counter
+
+    def _encode_field(self, item, source, raw_counter):
+        """Encode a primitive data type.
+
+        :arg dict item: Data structure.
+        :arg dict source: Source dictionary.
+        :arg int raw_counter: Number of unknown data fields encoded so far.
+
+        :returns int: Updated number of unknown data fields.
+        """
+        found = self._item_source(item, source, raw_counter)
+        if not found:
+            return raw_counter
+        dtype, name, value, raw_counter = found
+
+        if self._debug & 0x02:
+            self._log.write('0x{:06x}: {} --> {}\n'.format(
+                len(self.data), name, value))
+
+        self._encode_primitive(item, dtype, value, name)
+
+        return raw_counter
+
+    def _encode_fields(self, structure, source):
+        """Encode a structure that only contains primitive data types.
+
+        :arg dict structure: Structure of the binary file.
+        :arg dict source: Source dictionary.
+        """
+        raw_counter = 0
+
+        for item in structure or []:
+            raw_counter = self._encode_field(item, source, raw_counter)
+
+    def _encode_item(self, item, source, raw_counter):
+        """Encode one item of a structure, yield nested structures (see
+        `_walk`).
+
+        :arg dict item: Data structure.
+        :arg dict source: Source dictionary.
+        :arg int raw_counter: Number of unknown data fields encoded so far.
+
+        :returns int: Updated number of unknown data fields.
+        """
+        kind = self._get_kind(item)
+
+        if kind == 'primitive':
+            # Primitive data types.
+            return self._encode_field(item, source, raw_counter)
+
+        found = self._item_source(item, source, raw_counter)
+        if not found:
+            return raw_counter
+        dtype, name, value, raw_counter = found
+
+        # Nested structures.
+        if self._debug & 0x02:
+            self._log.write('-- {}\n'.format(name))
+
+        if self._tracer:
+            self._tracer.begin(name, _category(kind), len(self.data))
+
+        if kind in _loops:
+            yield from self._encode_loop(item, name, value, source)
+        elif kind == 'macro':
+            dmacro = self._get_value(self._get_default(item, '', 'macro'))
+            yield self.macros[dmacro], value
+        else:
+            yield item['structure'], value
+
+        if self._tracer:
+            self._tracer.end(len(self.data))
+
+        if self._debug & 0x02:
+            self._log.write(' --> {}\n'.format(name))
+
+        return raw_counter
+
+    def _encode_frame(self, structure, source):
+        """Encode a structure, yield nested structures (see `_walk`).
 
         :arg dict structure: Structure of the binary file.
         :arg dict source: Source dictionary.
@@ -477,62 +1465,127 @@ class BinWriter(BinParser):
         raw_counter = 0
 
         for item in structure:
-            if 'if' in item:
-                # Conditional statement.
-                if not self._evaluate(item['if']):
-                    continue
+            if self._get_kind(item) == 'primitive':
+                raw_counter = self._encode_field(item, source, raw_counter)
+            else:
+                raw_counter = yield from self._encode_item(
+                    item, source, raw_counter)
 
-            dtype = self._get_value(self._get_default(item, '', 'type'))
-            name = self._get_default(item, dtype, 'name')
+    def _encode(self, structure, source):
+        """Encode to a binary file.
 
-            if not name:
-                # NOTE: Not sure if this is correct.
-                dtype = self._get_value(
-                    self._get_default(item, dtype, 'unknown_function'))
-                value = source[self._get_default(
-                    item, dtype, 'unknown_destination')][raw_counter]
-                raw_counter += 1
-            else:
-                value = source[name]
+        :arg dict structure: Structure of the binary file.
+        :arg dict source: Source dictionary.
+        """
+        if id(structure) in self._flat:
+            self._encode_fields(structure, source)
+        else:
+            self._walk(
+                self._encode_frame(structure, source), self._encode_frame,
+                self._encode_fields)
 
-            if not set(['macro', 'structure']) & set(item):
-                # Primitive data types.
-                if self._debug & 0x02:
-                    self._log.write('0x{:06x}: {} --> {}\n'.format(
-                        len(self.data), name, value))
+    def _encode_units(self):
+        """Encode {self.parsed} one unit at a time, yield after every unit.
 
-                self._encode_primitive(item, dtype, value, name)
-            else:
-                # Nested structures.
-                if self._debug & 0x02:
-                    self._log.write('-- {}\n'.format(name))
+        A unit is either an item at the top level of the structure, or one
+        element of a loop at the top level of the structure.
+        """
+        raw_counter = 0
 
-                if set(['for', 'do_while', 'while']) & set(item):
-                    if 'for' in item and self._get_value(
-                            item['for']) != len(value):
-                        self._log.write(
-                            'Warning: size of `{}` and `{}` differ.\n'.format(
-                                item['name'], item['for']))
-                    for subitem in value:
-                        self._encode(item['structure'], subitem)
-                    # TODO: Check evaluation for `while` and `do_while`.
-                    if 'while' in item:
-                        term = self._get_item(item)
-                        self._encode(
-                            [term],
-                            {term['name']: source[item['while']['term']]})
-                elif 'macro' in item:
-                    dmacro = self._get_value(
-                        self._get_default(item, '', 'macro'))
-                    self._encode(self.macros[dmacro], value)
-                else:
-                    self._encode(item['structure'], value)
+        for item in self._structure or []:
+            if self._get_kind(item) not in _loops:
+                raw_counter = self._walk(
+                    self._encode_item(item, self.parsed, raw_counter),
+                    self._encode_frame, self._encode_fields)
+                yield
+                continue
 
-                if self._debug & 0x02:
-                    self._log.write(' --> {}\n'.format(name))
+            if 'if' in item and not self._evaluate(item['if']):
+                continue
+
+            dtype = self._get_value(self._get_default(item, '', 'type'))
+            name = self._get_default(item, dtype, 'name')
+            if self._debug & 0x02:
+                self._log.write('-- {}\n'.format(name))
+
+            for nested in self._encode_loop(
+                    item, name, self.parsed[name], self.parsed):
+                self._encode(*nested)
+                yield
+
+            if self._debug & 0x02:
+                self._log.write(' --> {}\n'.format(name))
 
     def log_debug_info(self):
         """Write additional debugging information to the log."""
         self._log_debug_info()
 
         self._log.write('{} bytes written.\n'.format(len(self.data)))
+
+
+def _compile(parser_class, structure, types, functions):
+    """Make a parser that is only used for its compiled definitions.
+
+    :arg class parser_class: `BinReader` or `BinWriter`.
+    :arg dict structure: The structure definition.
+    :arg dict types: The types definition.
+    :arg object functions: Object containing parsing or encoding functions.
+
+    :returns BinParser: Parser that has not processed any data.
+    """
+    parser = parser_class.__new__(parser_class)
+    BinParser.__init__(parser, structure, types, functions)
+
+    return parser
+
+
+class Schema(object):
+    """Compiled structure and types definitions.
+
+    The definitions are validated and the lookup tables and function
+    arguments are made once. A schema is not modified after construction, so
+    one schema can be shared by many threads. Every reader or writer that is
+    made from a schema only has its own parse state and decoding caches,
+    which makes it cheap to create one per call.
+    """
+    def __init__(
+            self, structure, types, read_functions=BinReadFunctions(),
+            write_functions=BinWriteFunctions()):
+        """Constructor.
+
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object read_functions: Object containing parsing functions.
+        :arg object write_functions: Object containing encoding functions,
+            use None for a schema that is only used for reading.
+        """
+        # The definitions are copied, so they can not be changed by the
+        # caller afterwards.
+        structure = copy.deepcopy(structure)
+        types = copy.deepcopy(types)
+
+        self._reader = _compile(BinReader, structure, types, read_functions)
+        self._writer = None
+        if write_functions is not None:
+            self._writer = _compile(
+                BinWriter, structure, types, write_functions)
+
+    def read(self, data, **kwargs):
+        """Parse a binary file.
+
+        :arg stream data: Content of a binary file.
+        :arg dict kwargs: Options of `BinReader`.
+
+        :returns BinReader: Reader, the result is in its `parsed` member.
+        """
+        return BinReader(data, None, None, schema=self, **kwargs)
+
+    def write(self, parsed, **kwargs):
+        """Encode a parsed representation of a binary file.
+
+        :arg dict parsed: Parsed representation of a binary file.
+        :arg dict kwargs: Options of `BinWriter`.
+
+        :returns BinWriter: Writer, the result is in its `data` member.
+        """
+        return BinWriter(parsed, None, None, schema=self, **kwargs)
@@ -0,0 +1,92 @@
+"""Memoization of decoding functions."""
+import collections
+import copy
+
+from .functions import FrozenDict
+
+
+missing = object()
+
+_immutable = (bool, bytes, float, int, str, type(None))
+
+
+def _freeze(value):
+    """Make a read-only version of a decoded value.
+
+    :arg any value: Decoded value.
+
+    :returns tuple: The read-only value and a function that makes a copy
+        that can be modified, None if {value} can not be modified.
+    """
+    if isinstance(value, _immutable):
+        return value, None
+    if isinstance(value, dict) and all(
+            isinstance(item, _immutable) for item in value.values()):
+        return FrozenDict(value), dict
+    if isinstance(value, list) and all(
+            isinstance(item, _immutable) for item in value):
+        return tuple(value), list
+
+    return copy.deepcopy(value), copy.deepcopy
+
+
+class DecodeCache(object):
+    """Bounded least recently used cache for decoded values.
+
+    Values that can be modified (e.g., dictionaries) are stored as read-only
+    values, these are copied when they are retrieved, unless a shared
+    read-only dictionary is requested.
+    """
+    def __init__(self, size=1024):
+        """Constructor.
+
+        :arg int size: Maximum number of values.
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+        self._values = collections.OrderedDict()
+
+    def lookup(self, key, frozen=False):
+        """Retrieve a value.
+
+        :arg bytes key: Encoded data.
+        :arg bool frozen: Return dictionaries as shared `FrozenDict` objects
+            instead of copies.
+
+        :returns any: Decoded value, `missing` if it is not in the cache.
+        """
+        try:
+            value, thaw = self._values[key]
+        except KeyError:
+            self.misses += 1
+            return missing
+
+        self.hits += 1
+        self._values.move_to_end(key)
+        if not thaw or (frozen and thaw is dict):
+            return value
+        return thaw(value)
+
+    def store(self, key, value):
+        """Store a value, evict the least recently used one if needed.
+
+        :arg bytes key: Encoded data.
+        :arg any value: Decoded value.
+        """
+        self._values[key] = _freeze(value)
+        if len(self._values) > self.size:
+            self._values.popitem(last=False)
+
+    def info(self):
+        """Get cache statistics.
+
+        :returns dict: Number of `hits` and `misses`, current number of values
+            and maximum number of values.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'length': len(self._values),
+            'size': self.size}
@@ -1,15 +1,179 @@
 """Command line interface for the general binary parser."""
 import argparse
+import mmap
+import os
+import sqlite3
+import sys
 
 import yaml
 
 from . import usage, version, doc_split
-from .bin_parser import BinReader, BinWriter
+from .bin_parser import BinParser, BinReader, BinWriter, Schema
+from .compressed import compressions, input_stream, output_stream
+from .functions import BinReadFunctions
+from .patch import patch
+from .registry import SchemaRegistry
+from .schema import SchemaError, analyse, unused_problems
+from .sinks import CsvSink, SqliteSink, load
+from .stream import (
+    BinPushReader, BinStreamWriter, checkpointed_read, follow, load_state,
+    read_stream)
+from .tracer import Tracer
+from .verify import verify
+
+
+def _tracer(trace_handle, trace_every):
+    if trace_handle:
+        return Tracer(trace_every)
+    return None
+
+
+def _map(handle):
+    """Map a file into memory, so that only the parts that are used are
+    read from disk.
+
+    :arg stream handle: Open readable handle to a binary file.
+
+    :returns bytes: Content of {handle}, a memory map if possible.
+    """
+    try:
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        return handle.read()
+
+
+def bin_follower(
+        input_handle, structure_handle, types_handle, output_handle,
+        prune=False, debug=0, state_path=None, interval=1.0):
+    """Follow a growing binary file, write new fields and loop elements as
+    JSON lines.
+
+    :arg stream input_handle: Open readable handle to a binary file.
+    :arg stream structure_handle: Open readable handle to the structure file.
+    :arg stream types_handle: Open readable handle to the types file.
+    :arg stream output_handle: Open writable handle.
+    :arg bool prune: Remove all unknown data fields from the output.
+    :arg int debug: Debugging level.
+    :arg str state_path: Name of the state file.
+    :arg float interval: Time in seconds between checks for new data.
+    """
+    reader = BinPushReader(
+        yaml.safe_load(structure_handle),
+        yaml.safe_load(types_handle),
+        prune=prune, debug=debug)
+    try:
+        follow(input_handle, reader, output_handle, state_path, interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def bin_checkpointed_reader(
+        input_handle, structure_handle, types_handle, output_handle,
+        checkpoint_path, every=0, seconds=0, prune=False, debug=0):
+    """Convert a binary file to JSON lines, save checkpoints periodically.
+
+    :arg stream input_handle: Open readable handle to a binary file.
+    :arg stream structure_handle: Open readable handle to the structure file.
+    :arg stream types_handle: Open readable handle to the types file.
+    :arg stream output_handle: Open writable handle.
+    :arg str checkpoint_path: Name of the checkpoint file.
+    :arg int every: Save a checkpoint after this many fields.
+    :arg float seconds: Save a checkpoint after this many seconds.
+    :arg bool prune: Remove all unknown data fields from the output.
+    :arg int debug: Debugging level.
+    """
+    # A conversion is resumed by opening the files again by name.
+    for handle, description in (
+            (input_handle, 'input'), (output_handle, 'output')):
+        if handle.name.startswith('<') or not handle.seekable():
+            raise ValueError(
+                'Checkpoints require a regular {} file, not a pipe or '
+                'standard {}.'.format(description, description))
+
+    reader = BinPushReader(
+        yaml.safe_load(structure_handle),
+        yaml.safe_load(types_handle),
+        prune=prune, debug=debug)
+    checkpointed_read(
+        input_stream(input_handle), reader, output_handle, checkpoint_path,
+        every, seconds, metadata={
+            'input': os.path.abspath(input_handle.name),
+            'structure': os.path.abspath(structure_handle.name),
+            'types': os.path.abspath(types_handle.name),
+            'output': os.path.abspath(output_handle.name),
+            'every': every,
+            'seconds': seconds,
+            'prune': prune})
+
+
+def bin_resume(checkpoint_path, debug=0):
+    """Resume an interrupted conversion from a checkpoint.
+
+    :arg str checkpoint_path: Name of the checkpoint file.
+    :arg int debug: Debugging level.
+    """
+    checkpoint = load_state(checkpoint_path)
+    if not checkpoint:
+        raise ValueError('No checkpoint found.')
+
+    reader = BinPushReader(
+        yaml.safe_load(open(checkpoint['structure'])),
+        yaml.safe_load(open(checkpoint['types'])),
+        prune=checkpoint['prune'], debug=debug)
+    checkpoint.pop('state')
+    checkpoint.pop('output_size')
+
+    with open(checkpoint['input'], 'rb') as input_handle:
+        with open(checkpoint['output'], 'r+') as output_handle:
+            checkpointed_read(
+                input_stream(input_handle), reader, output_handle,
+                checkpoint_path, checkpoint['every'], checkpoint['seconds'],
+                True, checkpoint)
+
+
+def bin_sink_loader(
+        input_handle, structure_handle, types_handle, sqlite_path=None,
+        csv_path=None, tsv_path=None, debug=0):
+    """Store a binary file in an SQLite database or in CSV or TSV files.
+
+    :arg stream input_handle: Open readable handle to a binary file.
+    :arg stream structure_handle: Open readable handle to the structure file.
+    :arg stream types_handle: Open readable handle to the types file.
+    :arg str sqlite_path: Name of the database.
+    :arg str csv_path: Name of the output directory for CSV files.
+    :arg str tsv_path: Name of the output directory for TSV files.
+    :arg int debug: Debugging level.
+    """
+    schema = Schema(
+        yaml.safe_load(structure_handle), yaml.safe_load(types_handle),
+        write_functions=None)
+    reader = BinPushReader(None, None, prune=True, debug=debug, schema=schema)
+    input_handle = input_stream(input_handle)
+
+    if sqlite_path:
+        connection = sqlite3.connect(sqlite_path)
+        try:
+            load(
+                input_handle, reader,
+                SqliteSink(connection, None, None, schema=schema))
+        finally:
+            connection.close()
+    elif csv_path:
+        load(
+            input_handle, reader,
+            CsvSink(csv_path, None, None, schema=schema))
+    else:
+        load(
+            input_handle, reader,
+            CsvSink(tsv_path, None, None, delimiter='\t', schema=schema))
 
 
 def bin_reader(
         input_handle, structure_handle, types_handle, output_handle,
-        prune=False, debug=0):
+        prune=False, debug=0, trace_handle=None, trace_every=1,
+        follow=False, state_path=None, interval=1.0, checkpoint_path=None,
+        every=0, seconds=0, compact=False, sqlite_path=None, csv_path=None,
+        tsv_path=None, stride=0, fraction=0, seed=0):
     """Convert a binary file to YAML.
 
     :arg stream input_handle: Open readable handle to a binary file.
@@ -18,21 +182,104 @@ def bin_reader(
     :arg stream output_handle: Open writable handle.
     :arg bool prune: Remove all unknown data fields from the output.
     :arg int debug: Debugging level.
+    :arg stream trace_handle: Open writable handle for a timeline trace.
+    :arg int trace_every: Only trace every `trace_every`-th loop iteration.
+    :arg bool follow: Follow a growing file (see `bin_follower`).
+    :arg str state_path: Name of the state file used in follow mode.
+    :arg float interval: Time in seconds between checks for new data.
+    :arg str checkpoint_path: Name of the checkpoint file (see
+        `bin_checkpointed_reader`).
+    :arg int every: Save a checkpoint after this many fields.
+    :arg float seconds: Save a checkpoint after this many seconds.
+    :arg bool compact: Reduce memory usage (see `BinReader`).
+    :arg str sqlite_path: Store the parsed data in this SQLite database
+        instead of writing YAML (see `SqliteSink`).
+    :arg str csv_path: Write the parsed data to CSV files in this directory
+        instead of writing YAML (see `CsvSink`).
+    :arg str tsv_path: Write the parsed data to TSV files in this directory
+        instead of writing YAML.
+    :arg int stride: Only decode every {stride}-th element of `for` loops.
+    :arg float fraction: Only decode a random fraction of the elements of
+        `for` loops.
+    :arg int seed: Random seed used with {fraction}.
     """
+    sink = sqlite_path or csv_path or tsv_path
+    sample = stride > 1 or 0 < fraction < 1
+    if [bool(sink), follow, bool(checkpoint_path)].count(True) > 1:
+        raise ValueError(
+            'Database, CSV or TSV output, follow mode and checkpoints can '
+            'not be combined.')
+    if sink or follow or checkpoint_path:
+        if sample:
+            raise ValueError('Sampling is only supported for YAML output.')
+        if compact:
+            raise ValueError(
+                'Reducing memory usage is only supported for YAML output.')
+        if trace_handle:
+            raise ValueError('Tracing is only supported for YAML output.')
+    if trace_every != 1 and not trace_handle:
+        raise ValueError('Trace sampling requires a trace file.')
+    if state_path and not follow:
+        raise ValueError('A state file is only used in follow mode.')
+    if (every or seconds) and not checkpoint_path:
+        raise ValueError(
+            'Checkpoint intervals are only used with checkpoints.')
+
+    if sink:
+        # Unknown data is never stored, so it is always removed.
+        bin_sink_loader(
+            input_handle, structure_handle, types_handle, sqlite_path,
+            csv_path, tsv_path, debug)
+        return
+    if follow:
+        bin_follower(
+            input_handle, structure_handle, types_handle, output_handle,
+            prune, debug, state_path, interval)
+        return
+    if checkpoint_path:
+        bin_checkpointed_reader(
+            input_handle, structure_handle, types_handle, output_handle,
+            checkpoint_path, every, seconds, prune, debug)
+        return
+
+    tracer = _tracer(trace_handle, trace_every)
+    stream = input_stream(input_handle)
+
+    if stream is not input_handle and not (debug or tracer or sample):
+        # Compressed input is parsed while it is decompressed.
+        parsed = read_stream(stream, BinPushReader(
+            yaml.safe_load(structure_handle),
+            yaml.safe_load(types_handle),
+            prune=prune, compact=compact))
+        output_handle.write('---\n')
+        yaml.safe_dump(
+            parsed, output_handle, width=76, default_flow_style=False)
+        return
+
+    if sample and stream is input_handle:
+        # Skipped loop elements are not read from disk.
+        data = _map(stream)
+    else:
+        data = stream.read()
+
     parser = BinReader(
-        input_handle.read(),
+        data,
         yaml.safe_load(structure_handle),
         yaml.safe_load(types_handle),
-        prune=prune, debug=debug)
+        prune=prune, debug=debug, tracer=tracer, compact=compact,
+        stride=stride, fraction=fraction, seed=seed)
     output_handle.write('---\n')
     yaml.safe_dump(
         parser.parsed, output_handle, width=76, default_flow_style=False)
     if debug:
         parser.log_debug_info()
+    if tracer:
+        tracer.dump(trace_handle)
 
 
 def bin_writer(
-        input_handle, structure_handle, types_handle, output_handle, debug=0):
+        input_handle, structure_handle, types_handle, output_handle, debug=0,
+        trace_handle=None, trace_every=1, compression=None):
     """Convert a YAML file to binary.
 
     :arg stream input_handle: Open readable handle to a YAML file.
@@ -40,15 +287,159 @@ def bin_writer(
     :arg stream types_handle: Open readable handle to the types file.
     :arg stream output_handle: Open writable handle.
     :arg int debug: Debugging level.
+    :arg stream trace_handle: Open writable handle for a timeline trace.
+    :arg int trace_every: Only trace every `trace_every`-th loop iteration.
+    :arg str compression: Compress the output (`gzip`, `bz2` or `xz`), by
+        default this is derived from the name of the output file.
     """
-    parser = BinWriter(
-        yaml.safe_load(input_handle),
-        yaml.safe_load(structure_handle),
-        yaml.safe_load(types_handle),
-        debug=debug)
-    output_handle.write(parser.data)
+    tracer = _tracer(trace_handle, trace_every)
+
+    with output_stream(output_handle, compression) as stream:
+        if stream is not output_handle and not (debug or tracer):
+            # Compressed output is written while it is encoded.
+            BinStreamWriter(
+                stream,
+                yaml.safe_load(structure_handle),
+                yaml.safe_load(types_handle)).write(
+                    yaml.safe_load(input_handle))
+            return
+
+        parser = BinWriter(
+            yaml.safe_load(input_handle),
+            yaml.safe_load(structure_handle),
+            yaml.safe_load(types_handle),
+            debug=debug, tracer=tracer)
+        stream.write(parser.data)
     if debug:
         parser.log_debug_info()
+    if tracer:
+        tracer.dump(trace_handle)
+
+
+def bin_batch_reader(input_paths, schema_paths, output_dir, prune=False):
+    """Convert binary files of different formats to YAML.
+
+    The schema of every file is selected by looking at its header (see the
+    `magic` member of fields). A YAML file is written to {output_dir} for
+    every input file and the selected schema is reported. Every schema is
+    compiled once, when it is loaded.
+
+    :arg list input_paths: Binary files.
+    :arg list schema_paths: Directories containing a structure and a types
+        definition (`structure.yml` and `types.yml`).
+    :arg str output_dir: Output directory.
+    :arg bool prune: Remove all unknown data fields from the output.
+    """
+    output_paths = {}
+    for path in input_paths:
+        output_path = os.path.join(
+            output_dir, '{}.yml'.format(os.path.basename(path)))
+        if output_path in output_paths:
+            raise ValueError(
+                'Input files `{}` and `{}` have the same name.'.format(
+                    output_paths[output_path], path))
+        output_paths[output_path] = path
+
+    registry = SchemaRegistry()
+    for path in schema_paths:
+        registry.load(path)
+
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    failed = 0
+    for output_path, path in output_paths.items():
+        try:
+            with open(path, 'rb') as input_handle:
+                name, stream = registry.route(input_stream(input_handle))
+                if name is None:
+                    raise ValueError('No schema matches.')
+                parsed = read_stream(stream, BinPushReader(
+                    None, None, prune=prune, schema=registry.schemas[name]))
+        except (IOError, ValueError) as error:
+            sys.stderr.write('Error: {}: {}\n'.format(path, error))
+            failed += 1
+            continue
+
+        with open(output_path, 'w') as output_handle:
+            output_handle.write('---\n')
+            yaml.safe_dump(
+                parsed, output_handle, width=76, default_flow_style=False)
+        sys.stdout.write('{}\t{}\n'.format(path, name))
+
+    if failed:
+        sys.exit(1)
+
+
+def bin_patcher(
+        input_path, structure_handle, types_handle, field_path, value):
+    """Change the value of a single field in a binary file.
+
+    :arg str input_path: Name of the binary file.
+    :arg stream structure_handle: Open readable handle to the structure file.
+    :arg stream types_handle: Open readable handle to the types file.
+    :arg str field_path: Location of the field, e.g., `lines.1.content`.
+    :arg str value: New value in YAML notation.
+    """
+    path = tuple(
+        int(part) if part.isdigit() else part
+        for part in field_path.split('.'))
+
+    with open(input_path, 'r+b') as handle:
+        warnings = patch(
+            handle, yaml.safe_load(structure_handle),
+            yaml.safe_load(types_handle), path, yaml.safe_load(value))
+
+    for warning in warnings:
+        sys.stderr.write('Warning: {}\n'.format(warning))
+
+
+def bin_checker(structure_handle, types_handle, output_handle=sys.stdout):
+    """Check a structure and types definition and report static facts.
+
+    :arg stream structure_handle: Open readable handle to the structure file.
+    :arg stream types_handle: Open readable handle to the types file.
+    :arg stream output_handle: Open writable handle.
+    """
+    try:
+        parser = BinParser(
+            yaml.safe_load(structure_handle), yaml.safe_load(types_handle),
+            BinReadFunctions())
+    except SchemaError as error:
+        for message in error.errors:
+            sys.stderr.write('Error: {}\n'.format(message))
+        sys.exit(1)
+
+    for message in unused_problems(parser):
+        sys.stderr.write('Warning: {}\n'.format(message))
+
+    output_handle.write('---\n')
+    yaml.safe_dump(
+        analyse(parser), output_handle, width=76, default_flow_style=False)
+
+
+def bin_verifier(input_handle, structure_handle, types_handle):
+    """Check whether a binary file is reproduced exactly when converted to
+    YAML and back.
+
+    :arg stream input_handle: Open readable handle to a binary file.
+    :arg stream structure_handle: Open readable handle to the structure file.
+    :arg stream types_handle: Open readable handle to the types file.
+    """
+    result = verify(
+        input_stream(input_handle), yaml.safe_load(structure_handle),
+        yaml.safe_load(types_handle))
+
+    if result:
+        path, offset = result
+        if path is None:
+            sys.stderr.write(
+                'Error: data at byte 0x{:06x} is not parsed.\n'.format(offset))
+        else:
+            sys.stderr.write(
+                'Error: mismatch at byte 0x{:06x} in `{}`.\n'.format(
+                    offset, '.'.join(map(str, path))))
+        sys.exit(1)
 
 
 def main():
@@ -70,7 +461,7 @@ def main():
     output_parser = argparse.ArgumentParser(add_help=False)
     output_parser.add_argument(
         'output_handle', metavar='OUTPUT', type=argparse.FileType('w'),
-        help='output file')
+        nargs='?', default='-', help='output file (default: stdout)')
 
     opt_parser = argparse.ArgumentParser(add_help=False)
     opt_parser.add_argument(
@@ -82,6 +473,14 @@ def main():
     opt_parser.add_argument(
         '-d', dest='debug', type=int, default=0,
         help='debugging level (%(type)s default=%(default)s)')
+    opt_parser.add_argument(
+        '-t', dest='trace_handle', metavar='TRACE',
+        type=argparse.FileType('w'),
+        help='write a timeline trace in Chrome trace-event format')
+    opt_parser.add_argument(
+        '-T', dest='trace_every', type=int, default=1,
+        help='only trace every n-th loop iteration '
+        '(%(type)s default=%(default)s)')
 
     parser = argparse.ArgumentParser(
         description=usage[0], epilog=usage[1],
@@ -97,13 +496,126 @@ def main():
     read_parser.add_argument(
         '-p', dest='prune', default=False, action='store_true',
         help='remove unknown data fields')
+    read_parser.add_argument(
+        '-m', dest='compact', default=False, action='store_true',
+        help='reduce memory usage')
+    sink_group = read_parser.add_mutually_exclusive_group()
+    sink_group.add_argument(
+        '--sqlite', dest='sqlite_path', metavar='DB', type=str,
+        default=None, help='store the data in an SQLite database')
+    sink_group.add_argument(
+        '--csv', dest='csv_path', metavar='DIR', type=str, default=None,
+        help='write the data to CSV files, one per loop')
+    sink_group.add_argument(
+        '--tsv', dest='tsv_path', metavar='DIR', type=str, default=None,
+        help='write the data to TSV files, one per loop')
+    read_parser.add_argument(
+        '-f', '--follow', dest='follow', default=False, action='store_true',
+        help='follow a growing file, output JSON lines')
+    read_parser.add_argument(
+        '-s', dest='state_path', metavar='STATE', type=str, default=None,
+        help='state file used to resume following')
+    read_parser.add_argument(
+        '-i', dest='interval', type=float, default=1.0,
+        help='time between checks for new data in follow mode '
+        '(%(type)s default=%(default)s)')
+    read_parser.add_argument(
+        '-c', dest='checkpoint_path', metavar='CHECKPOINT', type=str,
+        default=None, help='save checkpoints, output JSON lines')
+    read_parser.add_argument(
+        '-n', dest='every', type=int, default=0,
+        help='save a checkpoint after this many fields '
+        '(%(type)s default=%(default)s)')
+    read_parser.add_argument(
+        '-e', dest='seconds', type=float, default=0,
+        help='save a checkpoint after this many seconds '
+        '(%(type)s default=%(default)s)')
+    sample_group = read_parser.add_mutually_exclusive_group()
+    sample_group.add_argument(
+        '--stride', dest='stride', metavar='N', type=int, default=0,
+        help='only decode every n-th element of for loops')
+    sample_group.add_argument(
+        '--fraction', dest='fraction', metavar='F', type=float, default=0,
+        help='only decode a random fraction of the elements of for loops')
+    read_parser.add_argument(
+        '--seed', dest='seed', type=int, default=0,
+        help='random seed used with --fraction '
+        '(%(type)s default=%(default)s)')
     read_parser.set_defaults(func=bin_reader)
 
     write_parser = subparsers.add_parser(
         'write', parents=[input_parser, opt_parser, bin_output_parser],
         description=doc_split(bin_writer))
+    write_parser.add_argument(
+        '-z', dest='compression', choices=compressions, default=None,
+        help='compress the output (default: derived from the file name)')
     write_parser.set_defaults(func=bin_writer)
 
+    batch_parser = subparsers.add_parser(
+        'batch', description=doc_split(bin_batch_reader))
+    batch_parser.add_argument(
+        'output_dir', metavar='OUTPUT', type=str, help='output directory')
+    batch_parser.add_argument(
+        'input_paths', metavar='INPUT', type=str, nargs='+',
+        help='input files')
+    batch_parser.add_argument(
+        '-s', dest='schema_paths', metavar='SCHEMA', type=str,
+        action='append', required=True,
+        help='directory containing structure.yml and types.yml '
+        '(may be given more than once)')
+    batch_parser.add_argument(
+        '-p', dest='prune', default=False, action='store_true',
+        help='remove unknown data fields')
+    batch_parser.set_defaults(func=bin_batch_reader)
+
+    patch_parser = subparsers.add_parser(
+        'patch', description=doc_split(bin_patcher))
+    patch_parser.add_argument(
+        'input_path', metavar='INPUT', type=str, help='input file')
+    patch_parser.add_argument(
+        'structure_handle', metavar='STRUCTURE', type=argparse.FileType('r'),
+        help='structure definition file')
+    patch_parser.add_argument(
+        'types_handle', metavar='TYPES', type=argparse.FileType('r'),
+        help='type definition file')
+    patch_parser.add_argument(
+        'field_path', metavar='PATH', type=str,
+        help='location of the field, e.g., lines.1.content')
+    patch_parser.add_argument(
+        'value', metavar='VALUE', type=str, help='new value (YAML)')
+    patch_parser.set_defaults(func=bin_patcher)
+
+    check_parser = subparsers.add_parser(
+        'check', description=doc_split(bin_checker))
+    check_parser.add_argument(
+        'structure_handle', metavar='STRUCTURE', type=argparse.FileType('r'),
+        help='structure definition file')
+    check_parser.add_argument(
+        'types_handle', metavar='TYPES', type=argparse.FileType('r'),
+        help='type definition file')
+    check_parser.set_defaults(func=bin_checker)
+
+    verify_parser = subparsers.add_parser(
+        'verify', parents=[bin_input_parser],
+        description=doc_split(bin_verifier))
+    verify_parser.add_argument(
+        'structure_handle', metavar='STRUCTURE', type=argparse.FileType('r'),
+        help='structure definition file')
+    verify_parser.add_argument(
+        'types_handle', metavar='TYPES', type=argparse.FileType('r'),
+        help='type definition file')
+    verify_parser.set_defaults(func=bin_verifier)
+
+    resume_parser = subparsers.add_parser(
+        'resume', description=doc_split(bin_resume))
+    resume_parser.add_argument(
+        'checkpoint_path', metavar='CHECKPOINT', type=str,
+        help='checkpoint file')
+    resume_parser.add_argument(
+        '-d', dest='debug', type=int, default=0,
+        help='debugging level (%(type)s default=%(default)s)')
+    resume_parser.set_defaults(func=bin_resume)
+
     try:
         arguments = parser.parse_args()
     except IOError as error:
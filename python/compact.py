@@ -0,0 +1,121 @@
+"""Memory efficient representations of parsed data."""
+import collections.abc
+import sys
+
+import yaml
+
+
+_record_classes = {}
+
+
+class Record(collections.abc.Mapping):
+    """Read-only mapping with a fixed set of keys, stored in slots.
+
+    Values of existing keys can be replaced, but keys can not be added or
+    removed. Subclasses are made with `record_class`.
+    """
+    __slots__ = ()
+    _fields = ()
+    _slots = {}
+
+    def __init__(self, values):
+        """Constructor.
+
+        :arg iterable values: Values in the order of {self._fields}.
+        """
+        for slot, value in zip(self.__slots__, values):
+            setattr(self, slot, value)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self._slots[key])
+        except (KeyError, TypeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._slots:
+            raise KeyError(key)
+        setattr(self, self._slots[key], value)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __contains__(self, key):
+        try:
+            return key in self._slots
+        except TypeError:
+            return False
+
+    def __repr__(self):
+        return 'Record({})'.format(dict(self))
+
+    def __reduce__(self):
+        return record, (dict(self), )
+
+
+# Records (of any record class) are written like dictionaries.
+yaml.SafeDumper.add_multi_representer(Record, yaml.SafeDumper.represent_dict)
+
+
+class FrozenDict(dict):
+    """Dictionary that can not be modified."""
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('FrozenDict can not be modified.')
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        # The default implementation fills an empty copy item by item.
+        return FrozenDict, (dict(self), )
+
+
+yaml.SafeDumper.add_representer(FrozenDict, yaml.SafeDumper.represent_dict)
+
+
+def record_class(fields):
+    """Make (or reuse) a record class for a set of keys.
+
+    :arg tuple fields: Keys.
+
+    :returns class: Subclass of `Record`.
+    """
+    if fields not in _record_classes:
+        slots = tuple('_{}'.format(index) for index in range(len(fields)))
+        # When two threads make the same class, the first one is kept.
+        _record_classes.setdefault(fields, type('Record', (Record, ), {
+            '__module__': __name__,
+            '__slots__': slots,
+            '_fields': tuple(
+                sys.intern(field) if isinstance(field, str) else field
+                for field in fields),
+            '_slots': dict(zip(fields, slots))}))
+
+    return _record_classes[fields]
+
+
+def intern_value(value, max_length=64):
+    """Intern short strings, so that repeated values share one object.
+
+    :arg any value: Value.
+    :arg int max_length: Maximum length of strings that are interned.
+
+    :returns any: The interned string if applicable, {value} otherwise.
+    """
+    if type(value) is str and len(value) <= max_length:
+        return sys.intern(value)
+    return value
+
+
+def record(dictionary):
+    """Convert a dictionary to a record, short string values are interned.
+
+    :arg dict dictionary: Dictionary.
+
+    :returns Record: Record with the same keys and values.
+    """
+    return record_class(tuple(dictionary))(
+        intern_value(value) for value in dictionary.values())
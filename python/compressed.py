@@ -0,0 +1,177 @@
+"""Transparent decompression and compression of binary files."""
+import contextlib
+import gzip
+import io
+
+# Python can be built without bzip2 or xz support.
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+
+_magic = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'))
+
+_extensions = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz'}
+
+compressions = ('gzip', 'bz2', 'xz')
+
+
+class _Prefixed(io.RawIOBase):
+    """Readable stream that puts back bytes that were already read.
+
+    :arg bytes prefix: Bytes that were read from {handle}.
+    :arg stream handle: Open readable handle.
+    """
+    def __init__(self, prefix, handle):
+        self._prefix = prefix
+        self._handle = handle
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            data = self._prefix[:len(buffer)]
+            self._prefix = self._prefix[len(data):]
+        else:
+            data = self._handle.read(len(buffer))
+        buffer[:len(data)] = data
+
+        return len(data)
+
+
+def _module(compression):
+    """Get the module that implements a compression method.
+
+    :arg str compression: Compression method (`gzip`, `bz2` or `xz`).
+
+    :returns module: Module that implements {compression}.
+    """
+    module = {'gzip': gzip, 'bz2': bz2, 'xz': lzma}[compression]
+    if not module:
+        raise ValueError(
+            'Compression method `{}` is not supported by this Python '
+            'installation.'.format(compression))
+
+    return module
+
+
+def detect(prefix):
+    """Determine the compression method from the first bytes of a file.
+
+    :arg bytes prefix: First bytes of a file.
+
+    :returns str: Compression method, None if the data is not compressed.
+    """
+    for magic, compression in _magic:
+        if prefix.startswith(magic):
+            return compression
+
+    return None
+
+
+def _peek(handle, size):
+    """Read the first bytes of a stream without consuming them.
+
+    :arg stream handle: Open readable handle.
+    :arg int size: Number of bytes.
+
+    :returns tuple(bytes, stream): The first bytes and a stream that starts
+        with these bytes.
+    """
+    if hasattr(handle, 'peek'):
+        return handle.peek(size)[:size], handle
+    if handle.seekable():
+        position = handle.tell()
+        prefix = handle.read(size)
+        handle.seek(position)
+        return prefix, handle
+
+    prefix = handle.read(size)
+    return prefix, io.BufferedReader(_Prefixed(prefix, handle))
+
+
+def input_stream(handle, block_size=1048576):
+    """Decompress a binary file if needed.
+
+    Gzip, bzip2 and xz compressed files are recognised by their content. The
+    data is decompressed while it is read, in blocks of {block_size} bytes.
+
+    :arg stream handle: Open readable handle to a binary file.
+    :arg int block_size: Size of the decompression buffer.
+
+    :returns stream: Readable stream of the (decompressed) content.
+    """
+    prefix, handle = _peek(handle, max(len(magic) for magic, _ in _magic))
+    compression = detect(prefix)
+
+    if compression == 'gzip':
+        stream = gzip.GzipFile(fileobj=handle, mode='rb')
+    elif compression == 'bz2':
+        stream = _module(compression).BZ2File(handle, 'rb')
+    elif compression == 'xz':
+        stream = _module(compression).LZMAFile(handle, 'rb')
+    else:
+        return handle
+
+    return io.BufferedReader(stream, block_size)
+
+
+def compression_of(name):
+    """Determine the compression method from a file name.
+
+    :arg str name: File name.
+
+    :returns str: Compression method, None for other extensions.
+    """
+    for extension, compression in _extensions.items():
+        if str(name).endswith(extension):
+            return compression
+
+    return None
+
+
+@contextlib.contextmanager
+def output_stream(handle, compression=None):
+    """Compress the data written to a binary file.
+
+    The compression is finished when the context is left, {handle} is not
+    closed.
+
+    :arg stream handle: Open writable handle to a binary file.
+    :arg str compression: Compression method (`gzip`, `bz2` or `xz`), if not
+        given it is derived from the file name.
+
+    :returns stream: Writable stream.
+    """
+    if not compression:
+        compression = compression_of(getattr(handle, 'name', ''))
+
+    if compression == 'gzip':
+        stream = gzip.GzipFile(fileobj=handle, mode='wb')
+    elif compression == 'bz2':
+        stream = _module(compression).BZ2File(handle, 'wb')
+    elif compression == 'xz':
+        stream = _module(compression).LZMAFile(handle, 'wb')
+    elif compression:
+        raise ValueError('Unknown compression method `{}`.'.format(
+            compression))
+    else:
+        yield handle
+        return
+
+    try:
+        yield stream
+    finally:
+        stream.close()
@@ -1,7 +1,9 @@
 import sys
+import threading
 
 
 show_deprecation_warning = True
+_lock = threading.Lock()
 deprecation_text = """
 ---
 warning: type `{}` is deprecated. use `struct` instead.
@@ -16,5 +18,8 @@ def deprecation_warning(message):
     global show_deprecation_warning
 
     if show_deprecation_warning:
-        sys.stderr.write(deprecation_text.format(message))
-    show_deprecation_warning = False
+        # The warning is shown once, also when called from multiple threads.
+        with _lock:
+            if show_deprecation_warning:
+                sys.stderr.write(deprecation_text.format(message))
+                show_deprecation_warning = False
@@ -1,9 +1,14 @@
 """Field packing and unpacking functions for the general binary parser."""
+import base64
 import codecs
 import collections
+import collections.abc
+import functools
 import operator
 import struct
+import threading
 
+from .compact import FrozenDict, Record
 from .deprecated import deprecation_warning
 
 
@@ -23,10 +28,199 @@ operators = {
 }
 
 
+_hex_bytes = ['{:02x}'.format(x) for x in range(0x100)]
+
+# Lookup tables, see `_memoize`.
+_tables = collections.OrderedDict()
+_tables_lock = threading.Lock()
+_max_tables = 256
+
+
 def _inverse_dict(dictionary):
     return {v: k for k, v in dictionary.items()}
 
 
+def _hex(data):
+    """Encode bytes in hexadecimal, grouped by byte.
+
+    :arg bytes data: Input data.
+
+    :returns str: Hexadecimal representation of {data}.
+    """
+    return bytes(data).hex(' ')
+
+
+try:
+    b''.hex(' ')
+except (AttributeError, TypeError):
+    # Grouping is not supported by `bytes.hex` before Python 3.8.
+    def _hex(data):
+        return ' '.join([_hex_bytes[x] for x in bytearray(data)])
+
+
+def bitfield_layout(fields, size=0):
+    """Compute the shifts and masks of the fields in a bitfield.
+
+    Every field is a dictionary with a `name` and a width in `bits`. A field
+    starts at the bit given by `start` (counting from the least significant
+    bit), or directly after the previous field if `start` is not given.
+
+    :arg list fields: Bitfield definition.
+    :arg int size: Size of the bitfield in bytes, 0 for no limit.
+
+    :returns tuple: Tuple of (`name`, `shift`, `mask`) tuples.
+    """
+    layout = []
+    used = 0
+    start = 0
+
+    for field in fields:
+        start = field.get('start', start)
+        mask = (1 << field['bits']) - 1
+        if (mask << start) & used:
+            raise ValueError(
+                'Bitfield `{}` overlaps with another field.'.format(
+                    field['name']))
+        if size and start + field['bits'] > size * 8:
+            raise ValueError('Bitfield `{}` does not fit in {} bytes.'.format(
+                field['name'], size))
+        used |= mask << start
+        layout.append((field['name'], start, mask))
+        start += field['bits']
+
+    return tuple(layout)
+
+
+def table_key(value):
+    """Make a key for an encoding table.
+
+    :arg any value: Decoded value.
+
+    Values are keyed together with their types, so that for example `1.0`
+    and `True` are not encoded as `1`.
+
+    :arg any value: Decoded value.
+
+    :returns any: Hashable representation of {value}.
+    """
+    if isinstance(value, (dict, Record)):
+        return frozenset(
+            (key, type(item), item) for key, item in value.items())
+    return type(value), value
+
+
+def _freeze(value):
+    """Make a hashable representation of function arguments.
+
+    :arg any value: Function arguments.
+
+    :returns any: Hashable representation of {value}.
+    """
+    if isinstance(value, dict):
+        return frozenset(
+            (key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _memoize(make_table):
+    """Keep the tables made by a function, so that a table is shared by all
+    parsers instead of being made once per parser.
+
+    Tables are keyed by the classes of the function objects, these must not
+    keep any state that changes the result of a function. The most recently
+    used {_max_tables} tables are kept.
+
+    :arg function make_table: Function that makes a table.
+
+    :returns function: Memoized version of {make_table}.
+    """
+    @functools.wraps(make_table)
+    def wrapper(*args):
+        key = (make_table.__name__, ) + tuple(
+            type(functions) for functions in args[:-2]) + (
+                args[-2], _freeze(args[-1]))
+        try:
+            with _tables_lock:
+                _tables.move_to_end(key)
+                return _tables[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable arguments.
+            return make_table(*args)
+
+        # The lock is not held while making the table, `make_table` may call
+        # other memoized functions.
+        table = make_table(*args)
+        with _tables_lock:
+            table = _tables.setdefault(key, table)
+            while len(_tables) > _max_tables:
+                _tables.popitem(last=False)
+
+        return table
+
+    return wrapper
+
+
+@_memoize
+def decode_table(functions, name, kwargs):
+    """Make a lookup table for decoding single bytes. Tables are shared by
+    all parsers (see `_memoize`).
+
+    :arg object functions: Object containing parsing functions.
+    :arg str name: Name of the decoding function.
+    :arg dict kwargs: Arguments for the decoding function.
+
+    :returns list: The decoded values of all 256 bytes, None if not all bytes
+        can be decoded. Dictionaries are stored as `FrozenDict` objects.
+    """
+    table = []
+
+    for byte in range(0x100):
+        try:
+            value = getattr(functions, name)(
+                bytes(bytearray([byte])), **kwargs)
+        except (IndexError, KeyError, TypeError, ValueError, struct.error):
+            return None
+        if isinstance(value, dict):
+            value = FrozenDict(value)
+        table.append(value)
+
+    return table
+
+
+@_memoize
+def encode_table(read_functions, write_functions, name, kwargs):
+    """Make a lookup table for encoding single bytes. Tables are shared by
+    all parsers (see `_memoize`).
+
+    :arg object read_functions: Object containing parsing functions.
+    :arg object write_functions: Object containing encoding functions.
+    :arg str name: Name of the encoding function.
+    :arg dict kwargs: Arguments for the encoding function.
+
+    :returns dict: The encoded data of all values that can be decoded from a
+        single byte, keyed by `table_key`, None if not all values can be
+        encoded.
+    """
+    decoded = decode_table(read_functions, name, kwargs)
+    if decoded is None:
+        return None
+
+    table = {}
+
+    for value in decoded:
+        try:
+            table[table_key(value)] = getattr(write_functions, name)(
+                value, **kwargs)
+        except (IndexError, KeyError, TypeError, ValueError, struct.error):
+            return None
+
+    return table
+
+
 class BinReadFunctions(object):
     """Functions for decoding data."""
     def struct(self, data, fmt='b', labels=None, annotation=None):
@@ -62,22 +256,47 @@ class BinReadFunctions(object):
             return decoded[0].decode('utf-8')
         return decoded[0]
 
-    def raw(self, data):
-        """Encode a string in hexadecimal, grouped by byte.
+    def raw(self, data, representation='hex'):
+        """Represent unknown data.
+
+        The `memoryview` and `reference` representations refer to the input
+        and are therefore handled by the reader.
 
         :arg str data: Input data.
+        :arg str representation: One of `hex` (hexadecimal, grouped by byte),
+            `bytes` or `base64`.
 
-        :returns str: Hexadecimal representation of {data}.
+        :returns any: Representation of {data}.
         """
-        raw_data = codecs.encode(data, 'hex')
-
-        return b' '.join(
-            [raw_data[x:x + 2] for x in range(0, len(raw_data), 2)]).decode(
-                'utf-8')
+        if representation == 'hex':
+            return _hex(data)
+        if representation == 'bytes':
+            return bytes(data)
+        if representation == 'base64':
+            return base64.b64encode(data).decode('ascii')
+        raise ValueError(
+            'Invalid raw data representation `{}`.'.format(representation))
 
     def bit(self, data):
         return '{:08b}'.format(ord(data))
 
+    def bitfield(self, data, fields, order='big', size=0):
+        """Decode named groups of bits in a multi-byte word.
+
+        :arg str data: Input data.
+        :arg list fields: Bitfield definition (see `bitfield_layout`), or a
+            precomputed layout.
+        :arg str order: Byte order, either `big` or `little`.
+        :arg int size: Size of the bitfield in bytes.
+
+        :returns dict: Dictionary of fields and their values.
+        """
+        if not isinstance(fields, tuple):
+            fields = bitfield_layout(fields, size)
+        value = int.from_bytes(data, order)
+
+        return {name: (value >> shift) & mask for name, shift, mask in fields}
+
     def int(self, data):
         """Decode a little-endian encoded integer.
 
@@ -193,7 +412,7 @@ class BinWriteFunctions(object):
     encoding. Documentation of these functions is omitted.
     """
     def struct(self, data, fmt='b', labels=None, annotation=None):
-        if isinstance(data, collections.Mapping):
+        if isinstance(data, collections.abc.Mapping):
             data_list = [data[x] for x in labels]
         elif isinstance(data, list):
             data_list = data
@@ -211,12 +430,35 @@ class BinWriteFunctions(object):
 
         return struct.pack(fmt, *data_list)
 
-    def raw(self, hex_string):
-        return codecs.decode(''.join(hex_string.split()), 'hex')
+    def raw(self, data, representation='hex'):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return bytes(data)
+        if representation == 'base64':
+            return base64.b64decode(data)
+        return codecs.decode(''.join(data.split()), 'hex')
 
     def bit(self, bit_string):
         return chr(int('0b{}'.format(bit_string), 2)).encode('utf-8')
 
+    def bitfield(self, data, fields, order='big', size=0):
+        if not isinstance(fields, tuple):
+            fields = bitfield_layout(fields, size)
+        value = 0
+
+        for name, shift, mask in fields:
+            if data[name] & ~mask:
+                raise ValueError(
+                    'Value of `{}` does not fit in {} bits.'.format(
+                        name, mask.bit_length()))
+            value |= data[name] << shift
+
+        if not size:
+            size = max(
+                [(shift + mask.bit_length() + 7) // 8
+                for _, shift, mask in fields] + [1])
+
+        return value.to_bytes(size, order)
+
     def int(self, integer):
         # TODO: Deprecated, remove.
         deprecation_warning('int')
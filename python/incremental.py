@@ -0,0 +1,341 @@
+"""Incremental re-parsing of modified binary files."""
+import bisect
+import sys
+
+from .bin_parser import BinReader, EndOfInput
+from .functions import BinReadFunctions
+from .schema import references
+
+
+_missing = object()
+
+
+def _lookup(parsed, path):
+    """Find a value in a parsed representation of a binary file.
+
+    :arg dict parsed: Parsed representation of a binary file.
+    :arg tuple path: Location of the value.
+
+    :returns any: The value, `_missing` if it is not present.
+    """
+    value = parsed
+
+    for key in path:
+        try:
+            value = value[key]
+        except (IndexError, KeyError, TypeError):
+            return _missing
+
+    return value
+
+
+def _merge_ranges(ranges):
+    """Sort byte ranges and merge the ones that overlap.
+
+    :arg list ranges: List of (`start`, `end`) tuples.
+
+    :returns list: Sorted list of disjoint (`start`, `end`) tuples.
+    """
+    merged = []
+
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+class IncrementalReader(BinReader):
+    """Binary file reader that updates its parsed representation after parts
+    of the input are modified.
+
+    The position of every field is recorded (see {self.offsets}), as well as
+    the parser state at the start of every unit (see `BinReader._step`). The
+    state consists of the position in the input and in the structure and the
+    values of all variables that control parsing, e.g., the sizes of fields
+    and the lengths of loops.
+    """
+    def __init__(
+            self, data, structure, types, functions=BinReadFunctions(),
+            prune=False, debug=0, log=sys.stderr):
+        """Constructor.
+
+        :arg bytes data: Content of a binary file.
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing parsing functions.
+        :arg bool prune: Remove all unknown data fields from the output.
+        :arg int debug: Debugging level.
+        :arg stream log: Debug stream to write to.
+        """
+        super(BinReader, self).__init__(
+            structure, types, functions, debug, log)
+
+        self._prune = prune
+        self._final = True
+        self._dependencies = sorted(references(structure, types))
+
+        self._reset(data)
+        self.offsets = {}
+        self._fields = {}
+
+        self._boundaries, units, _ = self._run()
+        for unit in units:
+            self._merge(unit)
+
+    def _record(self, path, start, end, item, dtype):
+        self.offsets[path] = (start, end)
+        self._fields[start] = self._get_function(item, dtype)
+
+    def _state(self):
+        """Get the parser state.
+
+        :returns tuple: (`offset`, `cursor`, `counts`, `values`), where
+            `values` contains the values of all variables that control
+            parsing.
+        """
+        return (
+            self._offset, tuple(self._cursor), dict(self._counts),
+            tuple(
+                self._internal.get(name, _missing)
+                for name in self._dependencies))
+
+    def _restore(self, state):
+        """Restore a parser state obtained with `_state`.
+
+        :arg tuple state: Parser state.
+        """
+        offset, cursor, counts, values = state
+
+        self._offset = offset
+        self._cursor = list(cursor)
+        self._counts = dict(counts)
+        for name, value in zip(self._dependencies, values):
+            if value is _missing:
+                self._internal.pop(name, None)
+            else:
+                self._internal[name] = value
+
+    def _merge(self, unit):
+        name, index, value = unit
+
+        if index is None:
+            self.parsed[name] = value
+        else:
+            self.parsed.setdefault(name, []).append(value)
+
+    def _run(self, old=[], position=0, limit=None):
+        """Parse units until the end of the structure is reached.
+
+        If `limit` is given, parsing stops as soon as the parser state beyond
+        `limit` equals one of the states in `old`, from that point on the
+        result would be the same.
+
+        :arg list old: Parser states at the start of every unit.
+        :arg int position: Index in `old` of the state parsing started from.
+        :arg int limit: Position in the input after the last modification.
+
+        :returns tuple: (`states`, `units`, `stop`), where `states` contains
+            the parser states at the start of every new unit, `units` the
+            parsed units and `stop` the index in `old` of the state where
+            parsing stopped.
+        """
+        states = []
+        units = []
+
+        while True:
+            state = self._state()
+
+            if limit is not None and state[0] >= limit:
+                # Try to resynchronise with the previous parse.
+                while position < len(old) and old[position][0] < state[0]:
+                    position += 1
+                index = position
+                while index < len(old) and old[index][0] == state[0]:
+                    if old[index] == state:
+                        return states, units, index
+                    index += 1
+
+            states.append(state)
+            unit = self._step(True)
+            if unit is None:
+                break
+            units.extend(unit)
+
+        return states, units, len(old)
+
+    def _decode(self, ranges):
+        """Decode the fields that overlap with modified byte ranges.
+
+        :arg list ranges: Sorted list of disjoint (`start`, `end`) tuples.
+
+        :returns list: Paths of the fields that changed, None if the
+            structure of the file may have changed.
+        """
+        ends = [end for _, end in ranges]
+        offset = self._offset
+        changes = []
+
+        for path, (start, end) in self.offsets.items():
+            index = bisect.bisect_right(ends, start)
+            if index == len(ranges) or ranges[index][0] >= end:
+                continue
+
+            delim, size, func, kwargs = self._fields[start]
+            representation = kwargs.get('representation')
+            self._offset = start
+            try:
+                field = self._get_field(size, delim)
+            except EndOfInput:
+                self._offset = offset
+                return None
+            decoded_end = self._offset
+            self._offset = offset
+            if decoded_end != end:
+                # A delimiter was added or removed.
+                return None
+            if representation in ('memoryview', 'reference'):
+                value = self._refer(start, len(field), representation)
+            else:
+                value = self._call(func, field, **kwargs)
+
+            old_value = _lookup(self.parsed, path)
+            if old_value is _missing or (
+                    value == old_value and representation != 'reference'):
+                # A reference does not change when the data it refers to
+                # does.
+                continue
+
+            names = set([path[-1]])
+            for member in (old_value, value):
+                if isinstance(member, dict):
+                    names |= set(member)
+            if names & set(self._dependencies):
+                # A variable that controls parsing was changed.
+                return None
+
+            changes.append((start, path, value))
+
+        for _, path, value in changes:
+            target = self.parsed
+            for key in path[:-1]:
+                target = target[key]
+            target[path[-1]] = value
+
+        return [path for _, path, _ in sorted(changes, key=lambda x: x[0])]
+
+    def _reparse(self, ranges, resized):
+        """Parse the input again, starting at the unit that contains the first
+        modification.
+
+        :arg list ranges: Sorted list of disjoint (`start`, `end`) tuples.
+        :arg bool resized: Whether the size of the input has changed.
+
+        :returns dict: Description of the changes.
+        """
+        old = self._boundaries
+        first = ranges[0][0] if ranges else len(self.data)
+        position = max(bisect.bisect_right([s[0] for s in old], first) - 1, 0)
+
+        self._restore(old[position])
+        offsets, fields = self.offsets, self._fields
+        self.offsets, self._fields = {}, {}
+        states, units, stop = self._run(
+            old, position, None if resized else ranges[-1][1])
+        new_offsets, new_fields = self.offsets, self._fields
+        self.offsets, self._fields = offsets, fields
+
+        start = old[position][0]
+        if stop < len(old):
+            end = old[stop][0]
+            stop_counts = old[stop][2]
+            stop_index = old[stop][1][0]
+        else:
+            end = float('inf')
+            stop_counts = old[-1][2]
+            stop_index = len(self._structure or [])
+
+        # Remove the fields in the parsed range from the offsets.
+        old_offsets = {}
+        for path, (field_start, field_end) in list(self.offsets.items()):
+            if start <= field_start < end:
+                old_offsets[path] = (
+                    _lookup(self.parsed, path), (field_start, field_end))
+                del self.offsets[path]
+                self._fields.pop(field_start, None)
+        self.offsets.update(new_offsets)
+        self._fields.update(new_fields)
+
+        # Remove the units in the parsed range from the parsed data.
+        start_counts = old[position][2]
+        tails = {}
+        for name, count in stop_counts.items():
+            if name not in self.parsed:
+                continue
+            if stop < len(old):
+                tails[name] = self.parsed[name][count:]
+            if name in start_counts:
+                del self.parsed[name][start_counts[name]:]
+            else:
+                self.parsed.pop(name)
+        for item in (self._structure or [])[old[position][1][0]:stop_index]:
+            if item.get('name') not in stop_counts:
+                self.parsed.pop(item.get('name'), None)
+            if 'while' in item:
+                self.parsed.pop(item['while']['term'], None)
+
+        for unit in units:
+            self._merge(unit)
+        for name, tail in tails.items():
+            self.parsed[name].extend(tail)
+
+        self._boundaries = old[:position] + states + old[stop:]
+
+        changes = []
+        for path in set(old_offsets) | set(new_offsets):
+            if (
+                    path not in old_offsets or path not in new_offsets or
+                    old_offsets[path] != (
+                        _lookup(self.parsed, path), new_offsets[path])):
+                changes.append(path)
+
+        return {
+            'fields': sorted(
+                changes, key=lambda path: self.offsets.get(path, (-1, ))[0]),
+            'reparsed': (start, min(end, self._offset))}
+
+    def update(self, data, ranges):
+        """Update the parsed representation after parts of the input are
+        modified.
+
+        When the modified fields can be decoded again without affecting the
+        rest of the file, only these fields are updated. Otherwise, parsing
+        resumes at the start of the unit that contains the first modification
+        and stops as soon as the parser state is the same as in the previous
+        parse.
+
+        :arg bytes data: New content of the binary file.
+        :arg list ranges: List of (`start`, `end`) tuples of modified byte
+            ranges, `end` is exclusive.
+
+        :returns dict: Description of the changes: `fields` is a list of paths
+            of the fields that were changed, added, removed or moved,
+            `reparsed` is the range of the input that was parsed again, None
+            if only the modified fields were decoded again.
+        """
+        ranges = _merge_ranges(ranges)
+        resized = len(data) != len(self.data)
+        if resized:
+            ranges = _merge_ranges(
+                ranges + [(min(len(data), len(self.data)), len(data))])
+
+        self.data = data
+
+        if not resized:
+            fields = self._decode(ranges)
+            if fields is not None:
+                return {'fields': fields, 'reparsed': None}
+
+        return self._reparse(ranges, resized)
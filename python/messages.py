@@ -0,0 +1,165 @@
+"""Decoding of streams of small framed messages."""
+import struct
+import sys
+
+from .bin_parser import BinReader, EndOfInput
+from .functions import BinReadFunctions
+
+
+class MessageReader(BinReader):
+    """Reader that decodes many small messages with the same structure.
+
+    Messages are framed either by a length prefix or by a delimiter. The
+    definitions are compiled once and the parser is reused for every
+    message, only the parse state is reset in between. Decoding caches (see
+    the `pure` member of types) are kept for all messages.
+    """
+    def __init__(
+            self, structure, types, functions=BinReadFunctions(),
+            prefix=None, delimiter=[], prune=False, frozen=False,
+            compact=False, schema=None, debug=0, log=sys.stderr):
+        """Constructor.
+
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing parsing functions.
+        :arg str prefix: Format of the length prefix of every message (see
+            the `struct` module), e.g., `<H`. The length does not include
+            the prefix.
+        :arg list(char) delimiter: Delimiter that follows every message.
+        :arg bool prune: Remove all unknown data fields from the output.
+        :arg bool frozen: Return shared read-only dictionaries for single
+            byte types (see `BinReader`).
+        :arg bool compact: Reduce memory usage (see `BinReader`).
+        :arg Schema schema: Compiled definitions (see `Schema`),
+            {structure}, {types} and {functions} are not used if given.
+        :arg int debug: Debugging level.
+        :arg stream log: Debug stream to write to.
+        """
+        super(BinReader, self).__init__(
+            structure, types, functions, debug, log, None,
+            schema and schema._reader)
+
+        if bool(prefix) == bool(delimiter):
+            raise ValueError(
+                'Either a length prefix or a delimiter must be given.')
+        self._prefix = None
+        if prefix:
+            try:
+                self._prefix = struct.Struct(prefix)
+            except struct.error:
+                raise ValueError('Invalid length prefix `{}`.'.format(
+                    prefix))
+        # Delimiters are encoded like the delimiters of fields.
+        self._delimiter = ''.join(chr(c) for c in delimiter).encode('utf-8')
+
+        self._prune = prune
+        self._final = True
+        self._frozen = frozen
+        self._compact = compact
+
+        self._reset(b'')
+
+    def _split(self, data, final):
+        """Split data into messages.
+
+        :arg bytes data: Data.
+        :arg bool final: No more data follows.
+
+        :returns tuple(list, int): The complete messages and the position
+            after the last one.
+        """
+        messages = []
+        start = 0
+
+        if self._prefix:
+            unpack = self._prefix.unpack_from
+            size = self._prefix.size
+            while start + size <= len(data):
+                end = start + size + unpack(data, start)[0]
+                if end > len(data):
+                    break
+                messages.append(data[start + size:end])
+                start = end
+        else:
+            separator = self._delimiter
+            while True:
+                end = data.find(separator, start)
+                if end < 0:
+                    break
+                messages.append(data[start:end])
+                start = end + len(separator)
+            if final and start < len(data):
+                # The last message does not need to be delimited.
+                messages.append(data[start:])
+                start = len(data)
+
+        return messages, start
+
+    def parse(self, message):
+        """Decode one message.
+
+        :arg bytes message: Content of a message, without framing.
+
+        :returns dict: Parsed representation of {message}.
+        """
+        self._reset(message)
+
+        try:
+            self._parse(self._structure, self.parsed)
+        except EndOfInput:
+            pass
+
+        return self.parsed
+
+    def iterate(self, data):
+        """Decode all messages in a buffer.
+
+        :arg bytes data: Framed messages.
+
+        :returns iterator: Parsed representation of every message.
+        """
+        messages, end = self._split(data, True)
+        if end < len(data):
+            raise ValueError(
+                'Incomplete message at byte 0x{:06x}.'.format(end))
+
+        for message in messages:
+            yield self.parse(message)
+
+    def decode(self, data):
+        """Decode all messages in a buffer.
+
+        :arg bytes data: Framed messages.
+
+        :returns list: Parsed representation of every message.
+        """
+        return list(self.iterate(data))
+
+    def stream(self, handle, block_size=65536):
+        """Decode all messages in a stream while it is read.
+
+        :arg stream handle: Open readable handle.
+        :arg int block_size: Maximum number of bytes read at once.
+
+        :returns iterator: Parsed representation of every message.
+        """
+        buffer = b''
+        offset = 0
+
+        while True:
+            chunk = handle.read(block_size)
+            buffer += chunk
+
+            messages, end = self._split(buffer, not chunk)
+            for message in messages:
+                yield self.parse(message)
+            buffer = buffer[end:]
+            offset += end
+
+            if not chunk:
+                break
+
+        if buffer:
+            raise ValueError(
+                'Incomplete message at byte 0x{:06x}.'.format(offset))
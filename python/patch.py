@@ -0,0 +1,159 @@
+"""In-place modification of fields in binary files."""
+import collections.abc
+import mmap
+import os
+
+from .bin_parser import BinReader, EndOfInput, frame_field
+from .functions import BinReadFunctions, BinWriteFunctions
+from .schema import references
+
+
+class _Found(Exception):
+    pass
+
+
+class FieldLocator(BinReader):
+    """Find the position and encoding of a single field.
+
+    Parsing stops as soon as the field is found and the parsed data is not
+    retained, so this can be used on very large files.
+    """
+    def __init__(
+            self, data, structure, types, path,
+            functions=BinReadFunctions()):
+        """Constructor.
+
+        :arg stream data: Content of a binary file.
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg tuple path: Location of the field in the parsed data.
+        :arg object functions: Object containing parsing functions.
+        """
+        super(BinReader, self).__init__(structure, types, functions)
+
+        self._prune = False
+        self._final = True
+        self._reset(data)
+        self.offsets = {}
+
+        self._target = tuple(path)
+        self.location = None
+
+        try:
+            while self._step() is not None:
+                pass
+        except (EndOfInput, _Found):
+            pass
+
+    def _record(self, path, start, end, item, dtype):
+        if path == self._target:
+            delim, size, func, kwargs = self._get_function(item, dtype)
+            self.location = {
+                'start': start,
+                'end': end,
+                'item': item,
+                'size': size,
+                'delimiter': delim,
+                'function': func,
+                'args': kwargs}
+            raise _Found()
+
+
+def _move_tail(handle, start, end, field, block_size=1048576):
+    """Replace a part of a file by data of a different size.
+
+    :arg stream handle: Open readable and writable handle.
+    :arg int start: Position of the first byte to be replaced.
+    :arg int end: Position after the last byte to be replaced.
+    :arg bytes field: Replacement data.
+    :arg int block_size: Number of bytes moved at once.
+    """
+    file_size = handle.seek(0, os.SEEK_END)
+    shift = len(field) - (end - start)
+
+    if shift > 0:
+        # Move the tail backwards, starting at the end of the file.
+        position = file_size
+        while position > end:
+            length = min(block_size, position - end)
+            position -= length
+            handle.seek(position)
+            block = handle.read(length)
+            handle.seek(position + shift)
+            handle.write(block)
+    else:
+        # Move the tail forwards, starting at the end of the field.
+        position = end
+        while position < file_size:
+            handle.seek(position)
+            block = handle.read(block_size)
+            handle.seek(position + shift)
+            handle.write(block)
+            position += len(block)
+        handle.truncate(file_size + shift)
+
+    handle.seek(start)
+    handle.write(field)
+
+
+def patch(
+        handle, structure, types, path, value,
+        read_functions=BinReadFunctions(),
+        write_functions=BinWriteFunctions()):
+    """Change the value of a single field in a binary file.
+
+    If the size of the encoded field does not change, the new value is written
+    in place. Otherwise, only the part of the file after the field is
+    rewritten.
+
+    :arg stream handle: Open readable and writable handle to a binary file.
+    :arg dict structure: The structure definition.
+    :arg dict types: The types definition.
+    :arg tuple path: Location of the field in the parsed data.
+    :arg any value: New value.
+    :arg object read_functions: Object containing parsing functions.
+    :arg object write_functions: Object containing encoding functions.
+
+    :returns list: Warnings about fields that may need to be updated too.
+    """
+    data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_WRITE)
+
+    try:
+        location = FieldLocator(
+            data, structure, types, path, read_functions).location
+        if not location:
+            raise ValueError('Field `{}` not found.'.format(
+                '.'.join(map(str, path))))
+
+        encoded = getattr(write_functions, location['function'])(
+            value, **location['args'])
+        field = frame_field(encoded, location['size'], location['delimiter'])
+
+        if len(field) == location['end'] - location['start']:
+            data[location['start']:location['end']] = field
+            data.flush()
+    finally:
+        data.close()
+
+    if len(field) != location['end'] - location['start']:
+        _move_tail(handle, location['start'], location['end'], field)
+        handle.flush()
+
+    warnings = []
+
+    if len(encoded) + len(location['delimiter']) > len(field):
+        warnings.append('Value does not fit in the field and is clipped.')
+    if isinstance(location['item'].get('size'), str):
+        warnings.append('Size of the field is controlled by `{}`.'.format(
+            location['item']['size']))
+
+    names = [path[-1]]
+    if isinstance(value, collections.abc.Mapping):
+        names += list(value)
+    used = references(structure, types)
+    for name in names:
+        for description in used.get(name, []):
+            warnings.append('Field `{}` is used in {}.'.format(
+                name, description))
+
+    return warnings
@@ -0,0 +1,224 @@
+"""Selection of a schema by the header of a binary file."""
+import os
+
+import yaml
+
+from .bin_parser import Schema, frame_field
+from .compressed import _peek
+from .functions import BinReadFunctions, BinWriteFunctions
+from .schema import _item_type
+
+
+def _leading_items(parser, structure):
+    """Find the items at the start of a structure that are always present.
+
+    Nested structures and macros are expanded, the search stops at the first
+    loop or conditional item.
+
+    :arg BinParser parser: Parser.
+    :arg list structure: Structure definition.
+
+    :returns tuple(list, bool): The primitive items and whether the search
+        stopped before the end of {structure}.
+    """
+    items = []
+
+    for item in structure:
+        if 'if' in item:
+            return items, True
+
+        kind = parser._get_kind(item)
+        if kind == 'primitive':
+            items.append(item)
+            continue
+
+        if kind == 'macro' and item['macro'] in parser.macros:
+            nested = parser.macros[item['macro']]
+        elif kind == 'structure':
+            nested = item['structure']
+        else:
+            return items, True
+        nested_items, stopped = _leading_items(parser, nested)
+        items += nested_items
+        if stopped:
+            return items, True
+
+    return items, False
+
+
+def header(parser, functions=BinWriteFunctions()):
+    """Determine the fixed bytes at the start of a binary file.
+
+    Fields with a `magic` member, given in the structure or in the type
+    definition, are header fields. The value of `magic` is the parsed value
+    of the field, or a list of allowed values, e.g., for version bytes.
+    Header fields must have a fixed size and can only be preceded by other
+    fixed sized fields.
+
+    :arg BinParser parser: Parser.
+    :arg object functions: Object containing encoding functions.
+
+    :returns list: List of (`offset`, `values`) tuples, where `values` is a
+        set of allowed byte strings at position `offset`.
+    """
+    pattern = []
+    offset = 0
+
+    for item in _leading_items(parser, parser._structure or [])[0]:
+        dtype = parser._get_value(_item_type(parser, item))
+        if dtype not in parser.types:
+            break
+        delim, size, func, kwargs = parser._get_function(item, dtype)
+        if delim or not isinstance(size, int):
+            break
+
+        magic = parser._get_default(item, dtype, 'magic')
+        if magic is not None:
+            if not isinstance(magic, list):
+                magic = [magic]
+            values = set()
+            for value in magic:
+                data = getattr(functions, func)(
+                    parser._get_value(value), **kwargs)
+                if len(data) > size:
+                    raise ValueError(
+                        'Magic value `{}` of `{}` does not fit in {} '
+                        'bytes.'.format(value, item.get('name', ''), size))
+                values.add(frame_field(data, size))
+            pattern.append((offset, values))
+
+        offset += size
+
+    return pattern
+
+
+class SchemaRegistry(object):
+    """Collection of schemas that selects the schema of a binary file by
+    looking at its first few bytes.
+
+    The header fields of every schema (see `header`) are used to build a
+    dispatch table, indexed by the first header field of the schema. A file
+    is matched to the schema with the largest number of matching header
+    bytes. Schemas without header fields match any file.
+    """
+    def __init__(
+            self, read_functions=BinReadFunctions(),
+            write_functions=BinWriteFunctions()):
+        """Constructor.
+
+        :arg object read_functions: Object containing parsing functions.
+        :arg object write_functions: Object containing encoding functions,
+            used to encode the values of header fields.
+        """
+        self._read_functions = read_functions
+        self._write_functions = write_functions
+
+        # Compiled definitions per schema (see `Schema`).
+        self.schemas = {}
+        self.prefix_size = 0
+        self._patterns = {}
+        self._table = {}
+        self._fallback = []
+
+    def add(self, name, structure, types):
+        """Add a schema.
+
+        :arg str name: Name of the schema.
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        """
+        if name in self.schemas:
+            raise ValueError('Schema `{}` is already defined.'.format(name))
+
+        schema = Schema(
+            structure, types, self._read_functions, write_functions=None)
+        pattern = header(schema._reader, self._write_functions)
+
+        self.schemas[name] = schema
+        self._patterns[name] = pattern
+        if not pattern:
+            self._fallback.append(name)
+            return
+
+        offset, values = pattern[0]
+        key = offset, len(next(iter(values)))
+        for value in values:
+            self._table.setdefault(key, {}).setdefault(value, []).append(name)
+        for offset, values in pattern:
+            self.prefix_size = max(
+                self.prefix_size, offset + len(next(iter(values))))
+
+    def load(self, path, name=None):
+        """Add a schema from a directory containing a `structure.yml` and a
+        `types.yml` file.
+
+        :arg str path: Directory.
+        :arg str name: Name of the schema, by default the name of the
+            directory.
+        """
+        with open(os.path.join(path, 'structure.yml')) as handle:
+            structure = yaml.safe_load(handle)
+        with open(os.path.join(path, 'types.yml')) as handle:
+            types = yaml.safe_load(handle)
+
+        self.add(
+            name or os.path.basename(os.path.normpath(path)), structure,
+            types)
+
+    def _size(self, name):
+        return sum(len(next(iter(values))) for _, values in (
+            self._patterns[name]))
+
+    def _matches(self, name, prefix):
+        for offset, values in self._patterns[name]:
+            size = len(next(iter(values)))
+            if bytes(prefix[offset:offset + size]) not in values:
+                return False
+
+        return True
+
+    def candidates(self, prefix):
+        """Find the schemas that match the start of a binary file.
+
+        :arg bytes prefix: The first {self.prefix_size} bytes of a file.
+
+        :returns list: Names of matching schemas, the most specific first.
+        """
+        found = []
+
+        for (offset, size), table in self._table.items():
+            for name in table.get(bytes(prefix[offset:offset + size]), []):
+                if self._matches(name, prefix):
+                    found.append(name)
+        found.sort(key=lambda name: -self._size(name))
+
+        return found + self._fallback
+
+    def match(self, prefix):
+        """Select the schema of a binary file.
+
+        :arg bytes prefix: The first {self.prefix_size} bytes of a file.
+
+        :returns str: Name of the schema, None if no schema matches.
+        """
+        found = self.candidates(prefix)
+
+        if not found:
+            return None
+        if len(found) > 1 and self._size(found[0]) == self._size(found[1]):
+            raise ValueError('Schemas `{}` and `{}` both match.'.format(
+                found[0], found[1]))
+
+        return found[0]
+
+    def route(self, handle):
+        """Select the schema of a binary file without consuming any data.
+
+        :arg stream handle: Open readable handle to a binary file.
+
+        :returns tuple(str, stream): Name of the schema (None if no schema
+            matches) and a stream that starts at the beginning of the file.
+        """
+        prefix, handle = _peek(handle, self.prefix_size)
+
+        return self.match(prefix), handle
@@ -0,0 +1,651 @@
+"""Validation and static analysis of structure and types definitions."""
+import collections
+import collections.abc
+
+from .functions import BinReadFunctions, BinWriteFunctions, operators
+
+
+class SchemaError(ValueError):
+    """Raised when the structure or types definition is invalid.
+
+    :arg list errors: Descriptions of the problems that were found.
+    """
+    def __init__(self, errors):
+        super(SchemaError, self).__init__(
+            'Invalid schema: {}'.format(' '.join(errors)))
+        self.errors = errors
+
+
+def _operands(expression):
+    """Find all operands in an expression.
+
+    :arg dict expression: An expression.
+
+    :returns list: Operands.
+    """
+    operands = []
+
+    for operand in expression.get('operands', []):
+        if isinstance(operand, collections.abc.Mapping):
+            operands += _operands(operand)
+        else:
+            operands.append(operand)
+
+    return operands
+
+
+def _expressions(expression):
+    """Find all (sub)expressions in an expression.
+
+    :arg dict expression: An expression.
+
+    :returns list: Expressions.
+    """
+    expressions = [expression]
+
+    for operand in expression.get('operands', []):
+        if isinstance(operand, collections.abc.Mapping):
+            expressions += _expressions(operand)
+
+    return expressions
+
+
+def references(structure, types):
+    """Find all variables that control the parsing of a structure.
+
+    :arg list structure: The structure definition.
+    :arg dict types: The types definition.
+
+    :returns dict: For every variable, a list of descriptions of where it is
+        used.
+    """
+    types = types or {}
+    macros = types.get('macros', {})
+    result = collections.defaultdict(list)
+
+    def add(variable, description):
+        if isinstance(variable, str):
+            result[variable].append(description)
+
+    def walk(structure, seen):
+        for item in structure or []:
+            name = item.get('name', '')
+            for key in ('for', 'size', 'type', 'macro'):
+                if key in item:
+                    add(item[key], '`{}` of `{}`'.format(key, name))
+            for key in ('if', 'do_while', 'while'):
+                if key in item:
+                    for operand in _operands(item[key]):
+                        add(operand, '`{}` of `{}`'.format(key, name))
+            if 'while' in item and 'term' in item['while']:
+                # The terminating field is the last operand evaluated.
+                add(item['while']['term'], '`while` of `{}`'.format(name))
+            if 'structure' in item:
+                walk(item['structure'], seen)
+            if item.get('macro') in macros and item['macro'] not in seen:
+                walk(macros[item['macro']], seen | set([item['macro']]))
+
+    walk(structure, set())
+    for dtype, definition in types.get('types', {}).items():
+        if 'size' in definition:
+            add(definition['size'], '`size` of type `{}`'.format(dtype))
+    if 'size' in types.get('defaults', {}):
+        add(types['defaults']['size'], 'default `size`')
+
+    return result
+
+
+def _items(parser, macros=None):
+    """Find all items in the structure and in the macros.
+
+    :arg BinParser parser: Parser.
+    :arg set macros: Names of the macros to include, None for all macros.
+
+    :returns list: List of (`path`, `item`) tuples in depth-first order,
+        where `path` is a tuple of names. The path of a macro starts with
+        `macros` and the name of the macro.
+    """
+    result = []
+    stack = [((), parser._structure or [])] + [
+        (('macros', name), parser.macros[name])
+        for name in sorted(parser.macros, reverse=True)
+        if macros is None or name in macros]
+
+    while stack:
+        path, structure = stack.pop()
+        nested = []
+        for item in structure or []:
+            item_path = path + (item.get('name', ''), )
+            result.append((item_path, item))
+            if 'structure' in item:
+                nested.append((item_path, item['structure']))
+        stack.extend(reversed(nested))
+
+    return result
+
+
+def _used_macros(parser):
+    """Find the macros that are used by the structure, directly or by other
+    macros.
+
+    :arg BinParser parser: Parser.
+
+    :returns set: Names of macros, all macros if a macro is selected by a
+        variable.
+    """
+    used = set()
+    stack = [parser._structure or []]
+
+    while stack:
+        for item in stack.pop() or []:
+            if 'structure' in item:
+                stack.append(item['structure'])
+            if 'macro' not in item or item['macro'] in used:
+                continue
+            if item['macro'] not in parser.macros:
+                return set(parser.macros)
+            used.add(item['macro'])
+            stack.append(parser.macros[item['macro']])
+
+    return used
+
+
+def _item_type(parser, item):
+    """Determine the type of an item without resolving variables.
+
+    :arg BinParser parser: Parser.
+    :arg dict item: Data structure.
+
+    :returns any: Type of {item}.
+    """
+    if parser._get_default(item, '', 'name'):
+        return parser._get_default(item, '', 'type')
+    return parser._get_default(item, '', 'unknown_function')
+
+
+def _used_types(parser, items):
+    """Find the types that are used by primitive items.
+
+    :arg BinParser parser: Parser.
+    :arg list items: List of (`path`, `item`) tuples (see `_items`).
+
+    :returns set: Names of types.
+    """
+    return set(
+        _item_type(parser, item) for _, item in items
+        if parser._get_kind(item) == 'primitive' and
+            _item_type(parser, item) in parser.types)
+
+
+def _variables(parser, items):
+    """Find the names of all variables that can be defined during parsing.
+
+    :arg BinParser parser: Parser.
+    :arg list items: List of (`path`, `item`) tuples (see `_items`).
+
+    :returns set: Variable names, None if they can not be determined because
+        a function that is not part of this package is used.
+    """
+    names = set(parser.constants)
+
+    for _, item in items:
+        names.add(item.get('name'))
+        if 'while' in item:
+            names.add(item['while'].get('term'))
+
+    for dtype in _used_types(parser, items):
+        _, _, func, _ = parser._get_function({}, dtype)
+        kwargs = parser.types[dtype].get('function', {}).get('args', {})
+        if not (
+                hasattr(BinReadFunctions, func) or
+                hasattr(BinWriteFunctions, func)):
+            return None
+        if func == 'flags':
+            names |= set(kwargs.get('annotation', {}).values())
+        elif func == 'bitfield':
+            names |= set(field['name'] for field in kwargs.get('fields', []))
+        elif func == 'struct':
+            names |= set(kwargs.get('labels') or [])
+
+    return names
+
+
+def _problems(parser, items, variables):
+    """Check items of a structure.
+
+    :arg BinParser parser: Parser.
+    :arg list items: List of (`path`, `item`) tuples (see `_items`).
+    :arg set variables: Variables that can be defined during parsing (see
+        `_variables`).
+
+    :returns list: Descriptions of the problems that were found.
+    """
+    errors = []
+
+    def defined(name):
+        return variables is None or name in variables
+
+    for dtype in sorted(_used_types(parser, items)):
+        _, _, func, _ = parser._get_function({}, dtype)
+        if not hasattr(parser._functions, func):
+            errors.append('Function `{}` of type `{}` is not defined.'.format(
+                func, dtype))
+
+    for path, item in items:
+        name = '.'.join(path)
+        kind = parser._get_kind(item)
+
+        if kind == 'primitive':
+            dtype = _item_type(parser, item)
+            if dtype not in parser.types and not defined(dtype):
+                errors.append('Type `{}` of `{}` is not defined.'.format(
+                    dtype, name))
+        elif kind == 'macro':
+            if item['macro'] not in parser.macros and not defined(
+                    item['macro']):
+                errors.append('Macro `{}` of `{}` is not defined.'.format(
+                    item['macro'], name))
+
+        for key in ('for', 'size'):
+            if isinstance(item.get(key), str) and not defined(item[key]):
+                errors.append(
+                    'Variable `{}` (`{}` of `{}`) is not defined.'.format(
+                        item[key], key, name))
+
+        for key in ('if', 'do_while', 'while'):
+            if key not in item:
+                continue
+            for expression in _expressions(item[key]):
+                if 'operator' in expression:
+                    if expression['operator'] not in operators:
+                        errors.append(
+                            'Operator `{}` (`{}` of `{}`) is not '
+                            'defined.'.format(
+                                expression['operator'], key, name))
+                elif len(expression.get('operands', [])) != 1:
+                    errors.append(
+                        'Expression (`{}` of `{}`) has no operator.'.format(
+                            key, name))
+
+        if kind == 'while':
+            fields = [field.get('name') for field in item['structure']]
+            if 'term' not in item['while']:
+                errors.append('`while` of `{}` has no `term`.'.format(name))
+            if not set(_operands(item['while'])) & set(fields):
+                errors.append(
+                    '`while` of `{}` does not refer to a field of its '
+                    'structure.'.format(name))
+
+    return errors
+
+
+def validate(parser):
+    """Check the structure and types definitions of a parser.
+
+    Types, macros and functions that are not defined, variables that can not
+    be defined during parsing, unknown operators and `while` loops of which
+    the terminating field can not be determined are reported. Macros that
+    are not used are not checked (see `unused_problems`).
+
+    :arg BinParser parser: Parser.
+
+    :returns list: Descriptions of the problems that were found.
+    """
+    variables = _variables(parser, _items(parser))
+    errors = _problems(
+        parser, _items(parser, _used_macros(parser)), variables)
+
+    def defined(name):
+        return variables is None or name in variables
+
+    for dtype in sorted(parser.types):
+        size = parser.types[dtype].get('size')
+        if isinstance(size, str) and not defined(size):
+            errors.append(
+                'Variable `{}` (`size` of type `{}`) is not defined.'.format(
+                    size, dtype))
+
+    return errors
+
+
+def unused_problems(parser):
+    """Check the macros that are not used by the structure. These do not
+    affect parsing, so their problems are not reported by `validate`.
+
+    :arg BinParser parser: Parser.
+
+    :returns list: Descriptions of the problems that were found.
+    """
+    items = _items(parser)
+    used = set(
+        id(item) for _, item in _items(parser, _used_macros(parser)))
+
+    return _problems(
+        parser, [(path, item) for path, item in items if id(item) not in used],
+        _variables(parser, items))
+
+
+def _static_value(parser, value):
+    """Resolve a value that does not depend on the input.
+
+    :arg BinParser parser: Parser.
+    :arg any value: The name of a constant or a value.
+
+    :returns int: The value, None if it is not a static integer.
+    """
+    value = parser.constants.get(value, value) if isinstance(
+        value, str) else value
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def _item_size(parser, item, sizes, macro_sizes):
+    """Determine the size of an item if it does not depend on the input.
+
+    :arg BinParser parser: Parser.
+    :arg dict item: Data structure.
+    :arg dict sizes: Sizes of the items found so far, by identity.
+    :arg dict macro_sizes: Sizes of the macros found so far.
+
+    :returns int: Size of {item}, None if it is not static.
+    """
+    if 'if' in item:
+        return None
+
+    kind = parser._get_kind(item)
+
+    if kind == 'primitive':
+        dtype = _item_type(parser, item)
+        if dtype not in parser.types:
+            return None
+        size = _static_value(parser, parser._get_default(item, dtype, 'size'))
+        if size is None or not size and parser._get_default(
+                item, dtype, 'delimiter'):
+            return None
+        return size or 1
+    if kind == 'macro':
+        return macro_sizes.get(item['macro'])
+    if kind in ('do_while', 'while'):
+        return None
+
+    size = _structure_size(item['structure'], sizes)
+    if kind == 'for':
+        length = _static_value(parser, item['for'])
+        if size is None or length is None:
+            return None
+        return length * size
+    return size
+
+
+def _structure_size(structure, sizes):
+    """Sum the sizes of the items in a structure.
+
+    :arg list structure: Structure.
+    :arg dict sizes: Sizes of items, by identity.
+
+    :returns int: Size of {structure}, None if it is not static.
+    """
+    total = 0
+
+    for item in structure or []:
+        if sizes.get(id(item)) is None:
+            return None
+        total += sizes[id(item)]
+
+    return total
+
+
+def _sizes(parser, items):
+    """Determine the sizes of the items that do not depend on the input.
+
+    :arg BinParser parser: Parser.
+    :arg list items: All items (see `_items`).
+
+    :returns dict: Sizes of the static items, by identity.
+    """
+    sizes = {}
+    macro_sizes = {}
+
+    # Items are visited in reverse depth-first order, so nested items are
+    # done before the items that contain them. Macros can use other macros,
+    # so this is repeated until no new sizes are found.
+    changed = True
+    while changed:
+        changed = False
+        for _, item in reversed(items):
+            size = _item_size(parser, item, sizes, macro_sizes)
+            if size is not None and sizes.get(id(item)) is None:
+                sizes[id(item)] = size
+                changed = True
+        for name in parser.macros:
+            size = _structure_size(parser.macros[name], sizes)
+            if size is not None and name not in macro_sizes:
+                macro_sizes[name] = size
+                changed = True
+
+    return sizes
+
+
+def unit_sizes(parser):
+    """Determine how many bytes the units of a structure consume at least
+    (see `BinReader._step`).
+
+    Items of which the size depends on the input are counted as empty, so
+    for units that do not depend on the input, this is the exact size.
+
+    :arg BinParser parser: Parser.
+
+    :returns list: For every item at the top level of the structure, the
+        minimum size of the item, or of one element if it is a loop.
+    """
+    sizes = _sizes(parser, _items(parser))
+    result = []
+
+    def minimum(structure):
+        return sum(sizes.get(id(item)) or 0 for item in structure or [])
+
+    for item in parser._structure or []:
+        kind = parser._get_kind(item)
+        if kind == 'while':
+            # Only the first item is read before the condition is evaluated.
+            result.append(minimum(item['structure'][:1]))
+        elif kind in ('for', 'do_while') or (
+                kind == 'structure' and 'if' not in item):
+            result.append(minimum(item['structure']))
+        else:
+            result.append(sizes.get(id(item)) or 0)
+
+    return result
+
+
+def analyse(parser):
+    """Derive facts about the structure that do not depend on the input.
+
+    :arg BinParser parser: Parser.
+
+    :returns dict: The `static_sizes` of the items that do not depend on the
+        input, the variables that need to be decoded to determine sizes,
+        counts, types and conditions (`dependencies`) and the `for` loops of
+        which the elements have a static size (`batchable`), these can be
+        read in one go. The size of one element of these loops is given in
+        `element_sizes`. Items are given as dot separated paths.
+    """
+    items = _items(parser)
+    sizes = _sizes(parser, items)
+    variables = _variables(parser, items)
+
+    static_sizes = {}
+    element_sizes = {}
+    batchable = []
+    for path, item in items:
+        name = '.'.join(path)
+        if sizes.get(id(item)) is not None and item.get('name'):
+            static_sizes[name] = sizes[id(item)]
+        if parser._get_kind(item) == 'for':
+            size = _structure_size(item['structure'], sizes)
+            if size is not None:
+                element_sizes[name] = size
+                batchable.append(name)
+
+    types = {
+        'constants': parser.constants, 'defaults': parser.defaults,
+        'types': parser.types, 'macros': parser.macros}
+    dependencies = {
+        name: descriptions
+        for name, descriptions in references(
+            parser._structure, types).items()
+        if (variables is None or name in variables) and
+            name not in parser.constants and name not in parser.types and
+            name not in parser.macros}
+
+    return {
+        'static_sizes': static_sizes,
+        'dependencies': dependencies,
+        'batchable': batchable,
+        'element_sizes': element_sizes}
+
+
+def _scan_fields(parser, structure, seen=()):
+    """Determine how the fields of a structure are framed, for structures
+    that can be skipped without decoding any field.
+
+    :arg BinParser parser: Parser.
+    :arg list structure: Structure.
+    :arg tuple seen: Names of the macros that are being expanded.
+
+    :returns list: List of (`size`, `delimiter`) tuples, None if a field
+        can not be skipped this way.
+    """
+    fields = []
+
+    for item in structure or []:
+        if 'if' in item:
+            return None
+
+        kind = parser._get_kind(item)
+        if kind == 'primitive':
+            dtype = _item_type(parser, item)
+            if dtype not in parser.types:
+                return None
+            size = _static_value(
+                parser, parser._get_default(item, dtype, 'size'))
+            delimiter = parser._get_default(item, dtype, 'delimiter')
+            if size is None:
+                return None
+            fields.append((size or (0 if delimiter else 1), delimiter))
+            continue
+
+        if kind == 'structure':
+            nested = _scan_fields(parser, item['structure'], seen)
+        elif (
+                kind == 'macro' and item['macro'] in parser.macros and
+                item['macro'] not in seen):
+            nested = _scan_fields(
+                parser, parser.macros[item['macro']],
+                seen + (item['macro'], ))
+        else:
+            return None
+        if nested is None:
+            return None
+        fields += nested
+
+    return fields
+
+
+def _member_names(parser, item):
+    """Find the names under which the members of a decoded field are stored
+    as variables, for fields that are decoded to a dictionary (see
+    `BinReader._parse_primitive`).
+
+    :arg BinParser parser: Parser.
+    :arg dict item: Primitive item.
+
+    :returns set: Names of members, None if they can not be determined.
+    """
+    dtype = _item_type(parser, item)
+    if dtype not in parser.types:
+        return None
+    _, _, func, _ = parser._get_function({}, dtype)
+    kwargs = parser.types[dtype].get('function', {}).get('args', {})
+
+    if not hasattr(BinReadFunctions, func):
+        return None
+    if func == 'flags':
+        # Flags that are not annotated are named after their bit.
+        return set(kwargs.get('annotation', {}).values()) | set(
+            'flag_{:02x}'.format(2 ** bit) for bit in range(8))
+    if func == 'bitfield':
+        return set(field['name'] for field in kwargs.get('fields', []))
+    if func == 'struct':
+        return set(kwargs.get('labels') or [])
+    return set()
+
+
+def _field_names(parser, structure):
+    """Find the names of all fields in a structure, including nested
+    structures and macros, and the names of the members of fields that are
+    decoded to a dictionary.
+
+    :arg BinParser parser: Parser.
+    :arg list structure: Structure.
+
+    :returns set: Names of fields, None if they can not be determined.
+    """
+    names = set()
+    seen = set()
+    stack = [structure]
+
+    while stack:
+        for item in stack.pop() or []:
+            names.add(item.get('name', ''))
+            if item.get('name') and parser._get_kind(item) == 'primitive':
+                members = _member_names(parser, item)
+                if members is None:
+                    return None
+                names |= members
+            if 'structure' in item:
+                stack.append(item['structure'])
+            if item.get('macro') in parser.macros and (
+                    item['macro'] not in seen):
+                seen.add(item['macro'])
+                stack.append(parser.macros[item['macro']])
+
+    return names
+
+
+def skips(parser):
+    """Determine how the elements of `for` loops can be skipped without
+    decoding them.
+
+    Elements can only be skipped when none of their fields (or the members of
+    their fields) is used as a variable, since skipped fields are not
+    decoded.
+
+    :arg BinParser parser: Parser.
+
+    :returns dict: For every `for` loop of which the elements can be skipped
+        (by identity), the size of one element if it is static, or a list of
+        (`size`, `delimiter`) tuples that describe how its fields are framed
+        otherwise.
+    """
+    used = set(references(parser._structure, {
+        'constants': parser.constants, 'defaults': parser.defaults,
+        'types': parser.types, 'macros': parser.macros}))
+    result = {}
+
+    for _, item in _items(parser):
+        if parser._get_kind(item) != 'for':
+            continue
+        names = _field_names(parser, item['structure'])
+        if names is None or names & used:
+            continue
+        fields = _scan_fields(parser, item['structure'])
+        if fields is None:
+            continue
+        if all(size for size, _ in fields):
+            result[id(item)] = sum(size for size, _ in fields)
+        else:
+            result[id(item)] = fields
+
+    return result
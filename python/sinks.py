@@ -0,0 +1,486 @@
+"""Output sinks that store parsed data while a binary file is being read."""
+import collections
+import csv
+import io
+import json
+import os
+import re
+
+from .bin_parser import BinParser
+from .compact import Record
+from .functions import BinReadFunctions
+
+
+_loops = ('for', 'do_while', 'while')
+
+# Column types per `struct` format character.
+_struct_types = dict(
+    [(code, 'INTEGER') for code in 'bBhHiIlLqQnN?'] +
+    [(code, 'REAL') for code in 'efd'] +
+    [(code, 'TEXT') for code in 'csp'])
+
+# Column types per function.
+_function_types = {
+    'bit': 'TEXT',
+    'colour': 'TEXT',
+    'date': 'TEXT',
+    'float': 'REAL',
+    'int': 'INTEGER',
+    'map': 'TEXT',
+    'text': 'TEXT'}
+
+_raw_types = {
+    'base64': 'TEXT',
+    'bytes': 'BLOB',
+    'hex': 'TEXT',
+    'memoryview': 'BLOB',
+    'reference': 'TEXT'}
+
+
+class _Table(object):
+    """Table for the elements of a loop, or for the top level of the
+    structure.
+    """
+    def __init__(self, name, parent=None):
+        """Constructor.
+
+        :arg str name: Name of the table.
+        :arg _Table parent: Table of the enclosing loop.
+        """
+        self.name = name
+        self.parent = parent
+        self.columns = []
+        self.children = []
+
+
+def _format_codes(fmt):
+    """Split a `struct` format into format characters, one per value.
+
+    :arg str fmt: Format.
+
+    :returns list: Format characters.
+    """
+    codes = []
+
+    for count, code in re.findall(r'(\d*)([a-zA-Z?])', fmt):
+        if code in 'sp':
+            codes.append(code)
+        elif code != 'x':
+            codes += [code] * int(count or 1)
+
+    return codes
+
+
+def _columns(parser, item, path):
+    """Determine the columns of a primitive item.
+
+    :arg BinParser parser: Parser.
+    :arg dict item: Data structure.
+    :arg tuple path: Location of the item in a loop element.
+
+    :returns list: List of (`path`, `type`) tuples.
+    """
+    dtype = parser._get_default(item, '', 'type')
+    if dtype not in parser.types:
+        return [(path, '')]
+
+    _, _, func, kwargs = parser._get_function(item, dtype)
+
+    if func == 'struct':
+        codes = _format_codes(kwargs.get('fmt', 'b'))
+        if len(codes) > 1:
+            if kwargs.get('labels'):
+                return [
+                    (path + (label, ), _struct_types.get(code, ''))
+                    for label, code in zip(kwargs['labels'], codes)]
+            return [(path, 'TEXT')]
+        if kwargs.get('annotation') or not codes:
+            return [(path, '')]
+        return [(path, _struct_types.get(codes[0], ''))]
+    if func == 'flags':
+        annotation = kwargs.get('annotation') or {}
+        return [
+            (path + (annotation.get(flag, 'flag_{:02x}'.format(flag)), ),
+                'INTEGER')
+            for flag in (2 ** x for x in range(8))]
+    if func == 'bitfield':
+        return [
+            (path + (name, ), 'INTEGER') for name, _, _ in kwargs['fields']]
+    if func == 'raw':
+        return [(path, _raw_types.get(kwargs.get('representation', 'hex')))]
+
+    return [(path, _function_types.get(func, ''))]
+
+
+def _tables(parser, name):
+    """Derive tables from a structure, one for the top level and one for
+    every loop.
+
+    Nested structures and dictionaries (e.g., flags) are flattened into
+    columns, the name of a column is its location in a loop element.
+
+    :arg BinParser parser: Parser.
+    :arg str name: Name of the table for the top level.
+
+    :returns list: Tables, every table precedes the tables of nested loops.
+    """
+    tables = [_Table(name)]
+
+    def walk(structure, table, path, macros):
+        for item in structure or []:
+            item_name = item.get('name')
+            if not item_name:
+                # Unknown data is not stored.
+                continue
+            item_path = path + (item_name, )
+            kind = parser._get_kind(item)
+
+            if kind == 'primitive':
+                table.columns += _columns(parser, item, item_path)
+            elif kind in _loops:
+                prefix = (table.name, ) if table.parent else ()
+                child = _Table('.'.join(prefix + item_path), table)
+                table.children.append((item_path, child))
+                tables.append(child)
+                walk(item['structure'], child, (), macros)
+                if kind == 'while':
+                    # The terminating field is stored next to the loop.
+                    table.columns.append(
+                        (path + (item['while']['term'], ), ''))
+            elif kind == 'macro':
+                if item['macro'] in parser.macros and (
+                        item['macro'] not in macros):
+                    walk(
+                        parser.macros[item['macro']], table, item_path,
+                        macros | set([item['macro']]))
+                else:
+                    table.columns.append((item_path, ''))
+            else:
+                walk(item['structure'], table, item_path, macros)
+
+    walk(parser._structure, tables[0], (), set())
+
+    return tables
+
+
+def _lookup(data, path):
+    """Find a value in a (nested) loop element.
+
+    :arg dict data: Loop element.
+    :arg tuple path: Location of the value.
+
+    :returns any: The value, None if it is not present.
+    """
+    for key in path:
+        try:
+            data = data[key]
+        except (IndexError, KeyError, TypeError):
+            return None
+
+    return data
+
+
+def _convert(value):
+    """Convert a value to a type that can be stored in a column.
+
+    :arg any value: Value.
+
+    :returns any: Converted value.
+    """
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    if isinstance(value, (dict, Record, list, tuple)):
+        return json.dumps(value, sort_keys=True, default=dict)
+    return value
+
+
+def _quote(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class Sink(object):
+    """Base class for output sinks.
+
+    The units reported by an incremental reader (see `BinPushReader`) are
+    passed to `write`, after the last unit `close` must be called.
+
+    Every loop is stored in its own table, with a reference to the element of
+    the enclosing loop (`_parent_id`) and the position of the element in the
+    loop (`_position`). All other fields are stored in one row of the table
+    for the top level (see `_tables`). Subclasses implement `_insert` and
+    optionally `_open` and `_close`.
+    """
+    def __init__(
+            self, structure, types, functions=BinReadFunctions(),
+            name='root', schema=None):
+        """Constructor.
+
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing parsing functions.
+        :arg str name: Name of the table for the top level.
+        :arg Schema schema: Compiled definitions (see `Schema`),
+            {structure}, {types} and {functions} are not used if given.
+        """
+        self._tables = _tables(
+            BinParser(
+                structure, types, functions, compiled=schema and
+                schema._reader),
+            name)
+        self._root = self._tables[0]
+        self._loops = dict(
+            (path[0], table) for path, table in self._root.children
+            if len(path) == 1)
+        self._values = {}
+
+        self._ids = self._open()
+        self._ids[self._root.name] += 1
+        self._id = self._ids[self._root.name]
+
+    def _open(self):
+        """Prepare the output.
+
+        :returns dict: Largest row identifier used so far per table.
+        """
+        return dict((table.name, 0) for table in self._tables)
+
+    def _insert(self, table, row):
+        """Store a row.
+
+        :arg _Table table: Table.
+        :arg list row: Values of the columns of {table}, preceded by the row
+            identifier and for loops the identifier of the enclosing element
+            and the position in the loop.
+        """
+        raise NotImplementedError
+
+    def _close(self):
+        """Finish the output."""
+        pass
+
+    def _add(self, table, element, parent_id, position):
+        """Add a loop element and the elements of its nested loops.
+
+        :arg _Table table: Table of the loop.
+        :arg dict element: Loop element.
+        :arg int parent_id: Identifier of the enclosing element.
+        :arg int position: Position of the element in the loop.
+        """
+        self._ids[table.name] += 1
+        row_id = self._ids[table.name]
+
+        self._insert(table, [row_id, parent_id, position] + [
+            _convert(_lookup(element, path)) for path, _ in table.columns])
+
+        for path, child in table.children:
+            for index, subelement in enumerate(_lookup(element, path) or []):
+                self._add(child, subelement, row_id, index)
+
+    def write(self, units):
+        """Store units reported by an incremental reader.
+
+        :arg list units: List of (`name`, `index`, `value`) triples.
+        """
+        for name, index, value in units:
+            if name in self._loops:
+                if index is not None:
+                    self._add(self._loops[name], value, self._id, index)
+            elif index is None:
+                self._values[name] = value
+                for path, child in self._root.children:
+                    if len(path) > 1 and path[0] == name:
+                        for position, element in enumerate(
+                                _lookup(self._values, path) or []):
+                            self._add(child, element, self._id, position)
+
+    def close(self):
+        """Store the fields at the top level and finish the output."""
+        self._insert(self._root, [self._id] + [
+            _convert(_lookup(self._values, path))
+            for path, _ in self._root.columns])
+        self._close()
+
+
+class SqliteSink(Sink):
+    """Store parsed data in an SQLite database.
+
+    Every file that is stored adds a row to the table for the top level.
+    Column types are derived from the types definition.
+    """
+    def __init__(
+            self, connection, structure, types, functions=BinReadFunctions(),
+            name='root', batch_size=10000, schema=None):
+        """Constructor.
+
+        :arg Connection connection: Database connection.
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing parsing functions.
+        :arg str name: Name of the table for the top level.
+        :arg int batch_size: Number of rows inserted per transaction.
+        :arg Schema schema: Compiled definitions (see `Schema`).
+        """
+        self._connection = connection
+        self._batch_size = batch_size
+
+        self._rows = collections.defaultdict(list)
+        self._pending = 0
+
+        super(SqliteSink, self).__init__(
+            structure, types, functions, name, schema)
+
+        # Reserve the row for the top level, which is filled in at the end.
+        self._connection.execute(
+            'INSERT INTO {} ("_id") VALUES (?)'.format(
+                _quote(self._root.name)),
+            (self._id, ))
+
+    def _open(self):
+        ids = {}
+
+        for table in self._tables:
+            columns = ['"_id" INTEGER PRIMARY KEY']
+            if table.parent:
+                columns += [
+                    '"_parent_id" INTEGER REFERENCES {}("_id")'.format(
+                        _quote(table.parent.name)),
+                    '"_position" INTEGER']
+            columns += [
+                '{} {}'.format(_quote('.'.join(path)), column_type).strip()
+                for path, column_type in table.columns]
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS {} ({})'.format(
+                    _quote(table.name), ', '.join(columns)))
+            ids[table.name] = self._connection.execute(
+                'SELECT coalesce(max("_id"), 0) FROM {}'.format(
+                    _quote(table.name))).fetchone()[0]
+
+        return ids
+
+    def _insert(self, table, row):
+        if table is self._root:
+            if table.columns:
+                self._connection.execute(
+                    'UPDATE {} SET {} WHERE "_id" = ?'.format(
+                        _quote(table.name), ', '.join(
+                            '{} = ?'.format(_quote('.'.join(path)))
+                            for path, _ in table.columns)),
+                    row[1:] + row[:1])
+            return
+
+        self._rows[table.name].append(row)
+        self._pending += 1
+        if self._pending >= self._batch_size:
+            self._flush()
+
+    def _flush(self):
+        """Insert the pending rows and commit the transaction."""
+        for table in self._tables:
+            rows = self._rows.pop(table.name, [])
+            if rows:
+                self._connection.executemany(
+                    'INSERT INTO {} VALUES ({})'.format(
+                        _quote(table.name), ', '.join('?' * len(rows[0]))),
+                    rows)
+        self._connection.commit()
+        self._pending = 0
+
+    def _close(self):
+        self._flush()
+
+
+class CsvSink(Sink):
+    """Write parsed data to CSV (or TSV) files, one file per table.
+
+    The name of a file is the name of the table, with the extension `.csv`
+    (or `.tsv`). The first line of every file contains the column names.
+    Binary values are written in hexadecimal notation.
+    """
+    def __init__(
+            self, directory, structure, types, functions=BinReadFunctions(),
+            name='root', delimiter=',', block_size=1048576, schema=None):
+        """Constructor.
+
+        :arg str directory: Name of the output directory.
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing parsing functions.
+        :arg str name: Name of the table for the top level.
+        :arg str delimiter: Field delimiter, a tab results in TSV files.
+        :arg int block_size: Number of characters buffered per file.
+        :arg Schema schema: Compiled definitions (see `Schema`).
+        """
+        self._directory = directory
+        self._delimiter = delimiter
+        self._block_size = block_size
+
+        self._handles = {}
+        self._buffers = {}
+        self._writers = {}
+
+        super(CsvSink, self).__init__(
+            structure, types, functions, name, schema)
+
+    def _open(self):
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+        extension = 'tsv' if self._delimiter == '\t' else 'csv'
+
+        for table in self._tables:
+            self._handles[table.name] = io.open(
+                os.path.join(
+                    self._directory, '{}.{}'.format(table.name, extension)),
+                'w', newline='', encoding='utf-8')
+            self._buffers[table.name] = io.StringIO()
+            self._writers[table.name] = csv.writer(
+                self._buffers[table.name], delimiter=self._delimiter,
+                lineterminator='\n')
+
+            header = ['_id']
+            if table.parent:
+                header += ['_parent_id', '_position']
+            self._writers[table.name].writerow(
+                header + ['.'.join(path) for path, _ in table.columns])
+
+        return super(CsvSink, self)._open()
+
+    def _write_buffer(self, name):
+        """Write the buffer of a table to its file.
+
+        :arg str name: Name of the table.
+        """
+        self._handles[name].write(self._buffers[name].getvalue())
+        self._buffers[name].seek(0)
+        self._buffers[name].truncate()
+
+    def _insert(self, table, row):
+        self._writers[table.name].writerow([
+            value.hex() if isinstance(value, bytes) else value
+            for value in row])
+        if self._buffers[table.name].tell() >= self._block_size:
+            self._write_buffer(table.name)
+
+    def _close(self):
+        for name in self._handles:
+            self._write_buffer(name)
+            self._handles[name].close()
+
+
+def load(input_handle, reader, sink, block_size=65536):
+    """Parse a binary file and store the units in a sink as they are
+    completed.
+
+    :arg stream input_handle: Open readable handle to a binary file.
+    :arg BinPushReader reader: Incremental reader.
+    :arg object sink: Output sink.
+    :arg int block_size: Maximum number of bytes read at once.
+    """
+    while not reader.done:
+        chunk = input_handle.read(block_size)
+        if not chunk:
+            break
+        sink.write(reader.feed(chunk))
+    sink.write(reader.close())
+    sink.close()
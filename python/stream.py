@@ -0,0 +1,512 @@
+"""Incremental parsing and encoding for the general binary parser."""
+import collections.abc
+import json
+import os
+import sys
+import time
+
+from .bin_parser import (
+    BinReader, BinWriter, EndOfInput, IncompleteField, frame_field)
+from .functions import BinReadFunctions, BinWriteFunctions
+from .schema import unit_sizes
+
+
+def merge_unit(parsed, unit):
+    """Add a unit reported by an incremental reader to a parsed representation
+    of a binary file.
+
+    :arg dict parsed: Parsed representation of a binary file.
+    :arg tuple unit: A (`name`, `index`, `value`) triple.
+    """
+    name, index, value = unit
+
+    if index is None:
+        parsed[name] = value
+    else:
+        # Unknown data fields at the top level have no start unit.
+        parsed.setdefault(name, []).append(value)
+
+
+class BinPushReader(BinReader):
+    """Incremental binary file reader.
+
+    Instead of parsing the content of a binary file at once, data is fed to
+    this reader in chunks. Every time a unit (an item at the top level of the
+    structure, or one element of a loop at the top level) is completed, it is
+    reported as a (`name`, `index`, `value`) triple, see `BinReader._step` for
+    more information. Only the bytes that have not been consumed by completed
+    units are kept in memory.
+
+    An incomplete unit is kept in memory as a whole and it is parsed again
+    from its start when more data is available. Parsing is only retried once
+    the minimum size of the unit (see `unit_sizes`) is available, for units
+    that depend on the input, it is retried for every chunk that completes a
+    field.
+    """
+    def __init__(
+            self, structure, types, functions=BinReadFunctions(),
+            prune=False, callback=None, debug=0, log=sys.stderr,
+            compact=False, schema=None):
+        """Constructor.
+
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing parsing functions.
+        :arg bool prune: Remove all unknown data fields from the output.
+        :arg function callback: Function that is called with `name`, `index`
+            and `value` for every completed unit.
+        :arg int debug: Debugging level.
+        :arg stream log: Debug stream to write to.
+        :arg bool compact: Reduce memory usage (see `BinReader`).
+        :arg Schema schema: Compiled definitions (see `Schema`),
+            {structure}, {types} and {functions} are not used if given.
+        """
+        super(BinReader, self).__init__(
+            structure, types, functions, debug, log, None,
+            schema and schema._reader)
+
+        self._prune = prune
+        self._compact = compact
+        self._callback = callback
+        self._final = False
+        self._done = False
+
+        self._unit_sizes = unit_sizes(self)
+        self._reset(b'')
+        self._base = 0
+        self._pending = []
+        self._pending_size = 0
+        self._needed = 0
+        self._separator = b''
+
+    @property
+    def offset(self):
+        """Position in the input of the first byte that is not consumed."""
+        return self._base + self._offset
+
+    @property
+    def done(self):
+        """Whether the end of the structure was reached."""
+        return self._done
+
+    def get_state(self):
+        """Get the parser state at the end of the last completed unit.
+
+        :returns dict: Parser state.
+        """
+        return {
+            'offset': self.offset,
+            'cursor': list(self._cursor),
+            'counts': dict(self._counts),
+            'internal': dict(self._internal),
+            'done': self._done}
+
+    def set_state(self, state):
+        """Resume parsing from a state obtained with `get_state`. The data fed
+        to the reader after this call must start at `state['offset']`.
+
+        :arg dict state: Parser state.
+        """
+        self._reset(b'')
+        self._base = state['offset']
+        self._cursor = list(state['cursor'])
+        self._counts = dict(state['counts'])
+        self._internal = dict(state['internal'])
+        self._done = state['done']
+        self._pending = []
+        self._pending_size = 0
+        self._needed = 0
+        self._separator = b''
+
+    def _ready(self):
+        """Decide whether enough data is available to retry the unit that was
+        incomplete.
+
+        :returns bool: True if parsing can be resumed.
+        """
+        if self._final:
+            return True
+        if self._pending_size < self._needed:
+            return False
+        if self._separator:
+            tail = self.data[
+                max(len(self.data) - len(self._separator) + 1, 0):]
+            return self._separator in tail + b''.join(self._pending)
+        return True
+
+    def _save(self):
+        return (
+            self._offset, self._raw_byte_count, self._cursor,
+            dict(self._counts), dict(self._internal))
+
+    def _restore(self, state):
+        (self._offset, self._raw_byte_count, self._cursor, self._counts,
+            self._internal) = state
+
+    def _run(self):
+        """Parse as many units as possible.
+
+        :returns list: Completed units.
+        """
+        if self._pending:
+            self.data += b''.join(self._pending)
+            self._pending = []
+            self._pending_size = 0
+
+        result = []
+
+        while not self._done:
+            state = self._save()
+            try:
+                # At the end of the input, incomplete units are kept like
+                # `BinReader` keeps them.
+                unit = self._step(self._final)
+            except IncompleteField as error:
+                # Wait for more data and retry the unit.
+                self._restore(state)
+                self._needed = max(
+                    error.size, self._offset + self._unit_sizes[
+                        self._cursor[0]] - len(self.data))
+                self._separator = error.separator
+                break
+            except EndOfInput:
+                # The input ended within the unit.
+                self._restore(state)
+                unit = None
+
+            if unit is None:
+                self._done = True
+                break
+            result.extend(unit)
+
+        self._base += self._offset
+        self.data = self.data[self._offset:]
+        self._offset = 0
+
+        if self._callback:
+            for unit in result:
+                self._callback(*unit)
+
+        return result
+
+    def feed(self, chunk):
+        """Add a chunk of data and parse all units that are completed.
+
+        :arg bytes chunk: Content of a binary file.
+
+        :returns list: Completed units.
+        """
+        if self._final:
+            raise ValueError('Reader is closed.')
+        if self._done:
+            return []
+
+        self._pending.append(chunk)
+        self._pending_size += len(chunk)
+
+        if not self._ready():
+            return []
+        return self._run()
+
+    def close(self):
+        """Signal the end of the input and parse the remaining data.
+
+        :returns list: Completed units.
+        """
+        self._final = True
+
+        if self._done:
+            return []
+        return self._run()
+
+
+class BinStreamWriter(BinWriter):
+    """Binary file writer that writes the encoded data to a stream in
+    blocks, instead of keeping it in memory.
+    """
+    def __init__(
+            self, handle, structure, types, functions=BinWriteFunctions(),
+            block_size=1048576, debug=0, log=sys.stderr, source=None):
+        """Constructor.
+
+        :arg stream handle: Open writable handle.
+        :arg dict structure: The structure definition.
+        :arg dict types: The types definition.
+        :arg object functions: Object containing encoding functions.
+        :arg int block_size: Minimum number of bytes per write.
+        :arg int debug: Debugging level.
+        :arg stream log: Debug stream to write to.
+        :arg bytes source: Input that `reference` representations of unknown
+            data refer to.
+        """
+        super(BinWriter, self).__init__(
+            structure, types, functions, debug, log)
+
+        self._source = source
+        self._handle = handle
+        self._block_size = block_size
+        self._fields = []
+        self._size = 0
+        self.data = b''
+
+    def _set_field(self, data, size=0, delimiter=[]):
+        self._fields.append(frame_field(data, size, delimiter))
+        self._size += len(self._fields[-1])
+
+    def _flush(self):
+        self._handle.write(b''.join(self._fields))
+        self._fields = []
+        self._size = 0
+
+    def write(self, parsed):
+        """Encode a parsed representation of a binary file.
+
+        :arg dict parsed: Parsed representation of a binary file.
+        """
+        self._internal = {}
+        self.parsed = parsed
+
+        for _ in self._encode_units():
+            if self._size >= self._block_size:
+                self._flush()
+
+        self._flush()
+
+
+def read_stream(input_handle, reader, block_size=1048576):
+    """Parse a binary file incrementally.
+
+    Unlike `BinReader`, this does not require the whole file to be in
+    memory.
+
+    :arg stream input_handle: Open readable handle to a binary file.
+    :arg BinPushReader reader: Incremental reader.
+    :arg int block_size: Maximum number of bytes read at once.
+
+    :returns dict: Parsed representation of the binary file.
+    """
+    parsed = {}
+
+    while not reader.done:
+        chunk = input_handle.read(block_size)
+        if chunk:
+            units = reader.feed(chunk)
+        else:
+            units = reader.close()
+
+        for unit in units:
+            merge_unit(parsed, unit)
+
+        if not chunk:
+            break
+
+    return parsed
+
+
+def to_json(value):
+    """Convert a parsed value to a form that can be written as JSON.
+
+    Byte strings (and memory views) become `{"__bytes__": hex}` objects and
+    tuples become `{"__tuple__": list}` objects, so they are restored by
+    `from_json`. Other mappings, like compact records, become objects.
+
+    :arg any value: Parsed value.
+
+    :returns any: JSON compatible value.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'__bytes__': bytes(value).hex()}
+    if isinstance(value, tuple):
+        return {'__tuple__': [to_json(element) for element in value]}
+    if isinstance(value, list):
+        return [to_json(element) for element in value]
+    if isinstance(value, collections.abc.Mapping):
+        return {key: to_json(element) for key, element in value.items()}
+    return value
+
+
+def _from_json_object(value):
+    if list(value) == ['__bytes__']:
+        return bytes.fromhex(value['__bytes__'])
+    if list(value) == ['__tuple__']:
+        return tuple(value['__tuple__'])
+    return value
+
+
+def from_json(text):
+    """Read a JSON document written with `to_json`.
+
+    :arg str text: JSON document.
+
+    :returns any: Value, with byte strings and tuples restored.
+    """
+    return json.loads(text, object_hook=_from_json_object)
+
+
+def write_units(handle, units):
+    """Write units as JSON, one per line (see `to_json`).
+
+    :arg stream handle: Open writable handle.
+    :arg list units: List of (`name`, `index`, `value`) triples.
+    """
+    for name, index, value in units:
+        handle.write('{}\n'.format(json.dumps(
+            {'name': name, 'index': index, 'value': to_json(value)},
+            sort_keys=True)))
+
+
+def save_state(path, state):
+    """Atomically write a parser state to a file.
+
+    :arg str path: Name of the state file.
+    :arg dict state: Parser state.
+    """
+    temporary_path = '{}.tmp'.format(path)
+
+    with open(temporary_path, 'w') as handle:
+        json.dump(to_json(state), handle)
+    os.replace(temporary_path, path)
+
+
+def load_state(path):
+    """Read a parser state from a file.
+
+    :arg str path: Name of the state file.
+
+    :returns dict: Parser state, None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as handle:
+        return from_json(handle.read())
+
+
+def follow(
+        input_handle, reader, output_handle, state_path=None, interval=1.0,
+        timeout=None, block_size=65536):
+    """Parse a file that is growing, e.g., a log file that is being written
+    to.
+
+    Completed units are written to `output_handle` as JSON lines as soon as
+    they are available. If `state_path` is given, the parser state is saved
+    after every batch of units, parsing resumes from this state when the
+    function is called again.
+
+    :arg stream input_handle: Open readable handle to a binary file.
+    :arg BinPushReader reader: Incremental reader.
+    :arg stream output_handle: Open writable handle.
+    :arg str state_path: Name of the state file.
+    :arg float interval: Time in seconds between checks for new data.
+    :arg float timeout: Stop after this many seconds without new data.
+    :arg int block_size: Maximum number of bytes read at once.
+    """
+    if state_path:
+        state = load_state(state_path)
+        if state:
+            reader.set_state(state)
+            input_handle.seek(reader.offset)
+
+    idle = 0
+
+    while not reader.done:
+        chunk = input_handle.read(block_size)
+
+        if not chunk:
+            if timeout is not None and idle >= timeout:
+                break
+            time.sleep(interval)
+            idle += interval
+            continue
+        idle = 0
+
+        units = reader.feed(chunk)
+        if units:
+            write_units(output_handle, units)
+            output_handle.flush()
+            if state_path:
+                save_state(state_path, reader.get_state())
+
+
+def _sync(handle):
+    """Flush a handle to disk.
+
+    :arg stream handle: Open writable handle.
+    """
+    handle.flush()
+    try:
+        os.fsync(handle.fileno())
+    except (AttributeError, IOError, OSError, ValueError):
+        pass
+
+
+def checkpointed_read(
+        input_handle, reader, output_handle, checkpoint_path, every=0,
+        seconds=0, resume=False, metadata={}, block_size=65536):
+    """Parse a binary file and periodically save a checkpoint from which
+    parsing can be resumed.
+
+    Completed units are written to `output_handle` as JSON lines. A checkpoint
+    contains the parser state and the size of the output at that point. When
+    resuming, the output is truncated to this size before parsing continues,
+    so the output of a resumed run is identical to that of an uninterrupted
+    one.
+
+    :arg stream input_handle: Open readable handle to a binary file.
+    :arg BinPushReader reader: Incremental reader.
+    :arg stream output_handle: Open writable handle.
+    :arg str checkpoint_path: Name of the checkpoint file.
+    :arg int every: Save a checkpoint after this many units.
+    :arg float seconds: Save a checkpoint after this many seconds.
+    :arg bool resume: Resume from the checkpoint in `checkpoint_path`.
+    :arg dict metadata: Additional information stored in the checkpoint.
+    :arg int block_size: Maximum number of bytes read at once.
+    """
+    if resume:
+        checkpoint = load_state(checkpoint_path)
+        if not checkpoint:
+            raise ValueError('No checkpoint found.')
+        reader.set_state(checkpoint['state'])
+        input_handle.seek(reader.offset)
+        if output_handle.seek(0, os.SEEK_END) < checkpoint['output_size']:
+            raise ValueError('Output is smaller than at the checkpoint.')
+        output_handle.seek(checkpoint['output_size'])
+        output_handle.truncate()
+
+    def save():
+        _sync(output_handle)
+        checkpoint = dict(metadata)
+        checkpoint.update({
+            'state': reader.get_state(),
+            'output_size': output_handle.tell()})
+        save_state(checkpoint_path, checkpoint)
+
+    if not resume:
+        # Replace any stale checkpoint, this also allows resuming when the
+        # first regular checkpoint was not reached.
+        save()
+
+    count = 0
+    last = time.time()
+
+    while not reader.done:
+        chunk = input_handle.read(block_size)
+        if chunk:
+            units = reader.feed(chunk)
+        else:
+            units = reader.close()
+
+        write_units(output_handle, units)
+
+        count += len(units)
+        if (
+                (every and count >= every) or
+                (seconds and time.time() - last >= seconds)):
+            save()
+            count = 0
+            last = time.time()
+
+        if not chunk:
+            break
+
+    save()
@@ -0,0 +1,94 @@
+"""Timeline tracing for the general binary parser.
+
+The events are recorded in the Chrome trace-event format, see
+https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+for more information. The resulting file can be viewed with Perfetto
+(https://ui.perfetto.dev) or `about:tracing` in Chromium.
+"""
+import json
+import os
+import threading
+import time
+
+
+class Tracer(object):
+    """Record begin and end events of substructures, macro expansions and loop
+    iterations.
+    """
+    def __init__(self, every=1, clock=None):
+        """Constructor.
+
+        :arg int every: Only trace every `every`-th loop iteration.
+        :arg function clock: Clock that returns the time in seconds,
+            `time.perf_counter` by default.
+        """
+        if every < 1:
+            raise ValueError('Invalid trace sampling interval.')
+
+        self._every = every
+        self._clock = clock or time.perf_counter
+        self._pid = os.getpid()
+        self._tid = threading.current_thread().ident
+        self._stack = []
+
+        self.events = []
+
+    def _event(self, name, category, phase, offset):
+        return {
+            'name': name,
+            'cat': category,
+            'ph': phase,
+            'ts': self._clock() * 1e6,
+            'pid': self._pid,
+            'tid': self._tid,
+            'args': {'offset': offset}}
+
+    def begin(self, name, category, offset, index=None):
+        """Record the start of a substructure.
+
+        Loop iterations (for which `index` is given) that are not sampled are
+        not recorded, neither is anything nested within them.
+
+        :arg str name: Name of the substructure.
+        :arg str category: Kind of substructure.
+        :arg int offset: Current file position.
+        :arg int index: Loop iteration.
+        """
+        record = not self._stack or self._stack[-1][0]
+
+        if index is not None:
+            if index % self._every:
+                record = False
+            name = '{}[{}]'.format(name, index)
+
+        self._stack.append((record, name, category))
+        if record:
+            self.events.append(self._event(name, category, 'B', offset))
+
+    def end(self, offset):
+        """Record the end of the most recently started substructure.
+
+        :arg int offset: Current file position.
+        """
+        record, name, category = self._stack.pop()
+
+        if record:
+            self.events.append(self._event(name, category, 'E', offset))
+
+    def close(self, offset):
+        """End all open substructures, e.g., when the end of the input was
+        reached prematurely.
+
+        :arg int offset: Current file position.
+        """
+        while self._stack:
+            self.end(offset)
+
+    def dump(self, handle):
+        """Write the recorded events in the Chrome trace-event JSON format.
+
+        :arg stream handle: Open writable handle.
+        """
+        json.dump(
+            {'traceEvents': self.events, 'displayTimeUnit': 'ms'}, handle)
+        handle.write('\n')
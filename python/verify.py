@@ -0,0 +1,165 @@
+"""Round-trip verification of binary files in constant memory."""
+
+from .bin_parser import BinWriter, Schema, _loops, frame_field
+from .functions import BinReadFunctions, BinWriteFunctions
+from .stream import BinPushReader
+
+
+class _Mismatch(Exception):
+    def __init__(self, offset):
+        self.offset = offset
+
+
+class _UnitReader(BinPushReader):
+    """Incremental reader that records, for every unit, the position of the
+    corresponding item in the structure in {self.positions}.
+    """
+    def __init__(self, schema):
+        super(_UnitReader, self).__init__(None, None, schema=schema)
+
+        self.offsets = {}
+        self.positions = []
+
+    def _step(self, partial=False):
+        index = self._cursor[0]
+        result = super(_UnitReader, self)._step(partial)
+        if result:
+            self.positions.extend([index] * len(result))
+
+        return result
+
+
+class _UnitWriter(BinWriter):
+    """Writer that encodes one unit at a time and compares every encoded
+    field to the original data instead of storing it.
+    """
+    def __init__(self, schema):
+        super(BinWriter, self).__init__(
+            None, None, None, compiled=schema._writer)
+
+        self.data = b''
+        self.parsed = {}
+
+        self.position = 0
+        self._window = b''
+        self._window_start = 0
+
+    def _set_field(self, data, size=0, delimiter=[]):
+        field = frame_field(data, size, delimiter)
+        start = self.position - self._window_start
+        original = self._window[start:start + len(field)]
+
+        if original != field:
+            for index, byte in enumerate(original):
+                if byte != field[index]:
+                    raise _Mismatch(self.position + index)
+            raise _Mismatch(self.position + len(original))
+
+        self.position += len(field)
+
+    def set_window(self, data, start):
+        """Set the part of the original data that is compared to.
+
+        :arg bytes data: Original data.
+        :arg int start: Position of {data} in the original file.
+        """
+        self._window = data
+        self._window_start = start
+
+    def encode_unit(self, item, unit):
+        """Encode a unit reported by an incremental reader.
+
+        :arg dict item: Item in the structure that {unit} belongs to.
+        :arg tuple unit: A (`name`, `index`, `value`) triple.
+        """
+        name, index, value = unit
+
+        if self._get_kind(item) not in _loops:
+            if index is not None:
+                # Unknown data field.
+                value = [value]
+            self._walk(
+                self._encode_item(item, {name: value}, 0),
+                self._encode_frame, self._encode_fields)
+        elif index is not None:
+            self._encode(item['structure'], value)
+        elif name != item['name']:
+            # Terminating field of a `while` loop.
+            term = self._get_item(item)
+            self._encode([term], {term['name']: value})
+
+
+def _locate(offsets, offset):
+    """Find the field that contains a position.
+
+    :arg dict offsets: Positions of fields.
+    :arg int offset: Position in the input.
+
+    :returns tuple: Location of the field, None if no field was found.
+    """
+    for path, (start, end) in offsets.items():
+        if start <= offset < end or start == offset == end:
+            return path
+
+    return None
+
+
+def verify(
+        input_handle, structure, types, read_functions=BinReadFunctions(),
+        write_functions=BinWriteFunctions(), block_size=65536):
+    """Check whether a binary file is reproduced exactly by converting it to
+    its parsed representation and back.
+
+    The file is parsed incrementally, every unit is encoded as soon as it is
+    complete and every encoded field is compared to the original data at the
+    same position. Only the units that are being verified are kept in
+    memory, the memory use is proportional to the size of the largest unit
+    (see `BinPushReader`).
+
+    :arg stream input_handle: Open readable handle to a binary file.
+    :arg dict structure: The structure definition.
+    :arg dict types: The types definition.
+    :arg object read_functions: Object containing parsing functions.
+    :arg object write_functions: Object containing encoding functions.
+    :arg int block_size: Maximum number of bytes read at once.
+
+    :returns tuple: The location of the first field that differs and the
+        position of the first byte that differs, None if the file is
+        reproduced exactly. The location is None for data that is not
+        parsed, e.g., data after the end of the structure.
+    """
+    schema = Schema(structure, types, read_functions, write_functions)
+    reader = _UnitReader(schema)
+    writer = _UnitWriter(schema)
+    window = b''
+
+    while True:
+        chunk = input_handle.read(block_size)
+        if chunk:
+            units = reader.feed(chunk)
+        else:
+            units = reader.close()
+        window += chunk
+
+        offsets = reader.offsets
+        positions = reader.positions
+        reader.offsets = {}
+        reader.positions = []
+
+        start = writer.position
+        writer.set_window(window, start)
+        try:
+            for unit, index in zip(units, positions):
+                writer.encode_unit(reader._structure[index], unit)
+            if writer.position != reader.offset:
+                raise _Mismatch(writer.position)
+        except _Mismatch as mismatch:
+            return _locate(offsets, mismatch.offset), mismatch.offset
+        window = window[writer.position - start:]
+
+        if reader.done:
+            if window or input_handle.read(1):
+                return None, reader.offset
+            return None
+        if not chunk:
+            return None
@@ -0,0 +1,14 @@
+"""Helpers that are shared by the tests."""
+import yaml
+
+
+def load_example(path, name):
+    """Load a structure or types definition from the examples directory.
+
+    :arg str path: Name of the example.
+    :arg str name: Name of the file.
+
+    :returns any: Content of the file.
+    """
+    with open('examples/{}/{}'.format(path, name), 'rb') as handle:
+        return yaml.safe_load(handle)
@@ -0,0 +1,124 @@
+"""Tests for the bin_parser.aio module."""
+import asyncio
+import socket
+
+from bin_parser import BinReader
+from bin_parser.aio import AsyncBinReader, AsyncBinWriter
+
+from shared import load_example
+
+
+def _parsed(path, input_file, structure_file, types_file):
+    return BinReader(
+        open('examples/{}/{}'.format(path, input_file), 'rb').read(),
+        load_example(path, structure_file),
+        load_example(path, types_file)).parsed
+
+
+async def _round_trip(path, input_file, structure_file, types_file):
+    """Write a parsed file to one end of a socket pair and read it from the
+    other end.
+    """
+    structure = load_example(path, structure_file)
+    types = load_example(path, types_file)
+    read_socket, write_socket = socket.socketpair()
+
+    # Both writers are kept, the transport is closed when one is collected.
+    stream_reader, read_writer = await asyncio.open_connection(
+        sock=read_socket)
+    _, stream_writer = await asyncio.open_connection(sock=write_socket)
+
+    async def write():
+        await AsyncBinWriter(
+            stream_writer, structure, types, block_size=4).write(
+                _parsed(path, input_file, structure_file, types_file))
+        stream_writer.close()
+
+    parsed, _ = await asyncio.gather(
+        AsyncBinReader(
+            stream_reader, structure, types, yield_every=1).read(),
+        write())
+    read_writer.close()
+
+    return parsed
+
+
+class _CountingReader(asyncio.StreamReader):
+    """Stream reader that counts the reads."""
+    reads = 0
+
+    async def readexactly(self, n):
+        self.reads += 1
+        return await super(_CountingReader, self).readexactly(n)
+
+    async def readuntil(self, separator=b'\n'):
+        self.reads += 1
+        return await super(_CountingReader, self).readuntil(separator)
+
+
+class TestAsync(object):
+    """Test the bin_parser.aio module."""
+    def setup(self):
+        self._data = [
+            ['balance', 'balance.dat', 'structure.yml', 'types.yml'],
+            ['lists', 'for.dat', 'structure_for.yml', 'types.yml'],
+            ['lists', 'do_while.dat', 'structure_do_while.yml', 'types.yml'],
+            ['lists', 'while.dat', 'structure_while.yml', 'types.yml'],
+            ['csv', 'test.csv', 'structure.yml', 'types.yml'],
+            ['size_string', 'size_string.dat', 'structure.yml', 'types.yml']]
+
+    def test_round_trip(self):
+        assert asyncio.run(_round_trip(*self._data[0])) == _parsed(
+            *self._data[0])
+
+    def test_concurrent(self):
+        async def run():
+            return await asyncio.gather(
+                *[_round_trip(*example) for example in self._data])
+
+        for parsed, example in zip(asyncio.run(run()), self._data):
+            assert parsed == _parsed(*example)
+
+    def test_exact(self):
+        async def run():
+            stream = asyncio.StreamReader()
+            stream.feed_data(
+                open('examples/balance/balance.dat', 'rb').read() + b'tail')
+            stream.feed_eof()
+            await AsyncBinReader(
+                stream, load_example('balance', 'structure.yml'),
+                load_example('balance', 'types.yml')).read()
+            return await stream.read()
+
+        assert asyncio.run(run()) == b'tail'
+
+    def test_iterate(self):
+        async def run():
+            stream = asyncio.StreamReader()
+            stream.feed_data(b'\x02line1\x00line2\x00')
+            stream.feed_eof()
+            return [unit async for unit in AsyncBinReader(
+                stream, load_example('lists', 'structure_for.yml'),
+                load_example('lists', 'types.yml'))]
+
+        assert asyncio.run(run())[-1] == ('lines', 1, {'content': 'line2'})
+
+    def test_static_unit(self):
+        structure = [
+            {'name': 'count', 'type': 'byte'},
+            {'name': 'records', 'for': 'count', 'structure': [
+                {'name': 'field_{}'.format(index), 'type': 'byte'}
+                for index in range(100)]}]
+        types = {'types': {'byte': {
+            'function': {'name': 'struct', 'args': {'fmt': 'B'}}}}}
+
+        async def run():
+            stream = _CountingReader()
+            stream.feed_data(b'\x02' + bytes(range(200)))
+            stream.feed_eof()
+            parsed = await AsyncBinReader(stream, structure, types).read()
+            return parsed, stream.reads
+
+        parsed, reads = asyncio.run(run())
+        assert parsed['records'][1]['field_99'] == 199
+        assert reads == 3
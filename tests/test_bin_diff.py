@@ -0,0 +1,99 @@
+"""Tests for the bin_parser_extras.bin_diff module."""
+import io
+import struct
+
+import yaml
+
+from bin_parser_extras.bin_diff import BinDiff, DiffReader, Range, bin_diff
+
+
+def _data(values, name, items):
+    data = struct.pack('<i', len(values))
+    for value in values:
+        data += struct.pack('<hh', value, 0)
+    data += name + b'\x00'
+    for item_id, label in items:
+        data += struct.pack('<h', item_id) + label + b'\x00'
+
+    return data + struct.pack('<h', 0)
+
+
+class TestBinDiff(object):
+    def setup(self):
+        self._structure = [
+            {'name': 'size', 'type': 'int'},
+            {'name': 'records', 'for': 'size', 'structure': [
+                {'name': 'value', 'type': 'short'},
+                {'size': 2}]},
+            {'name': 'name', 'type': 'text'},
+            {'name': 'items', 'while': {
+                'operator': 'ne', 'operands': ['id', 0], 'term': 'end'},
+                'structure': [
+                    {'name': 'id', 'type': 'short'},
+                    {'name': 'label', 'type': 'text'}]}]
+        self._types = {'types': {
+            'int': {
+                'size': 4,
+                'function': {'name': 'struct', 'args': {'fmt': '<i'}}},
+            'short': {
+                'size': 2,
+                'function': {'name': 'struct', 'args': {'fmt': '<h'}}},
+            'text': {'delimiter': [0x00]}}}
+        self._data_1 = _data([1, 2, 3, 4], b'abc', [(1, b'x'), (2, b'y')])
+        self._data_2 = _data(
+            [1, 2, 5, 4, 7], b'abd', [(1, b'x'), (2, b'z'), (3, b'w')])
+
+    def _diff(self, data_1, data_2, block_size=65536):
+        return list(BinDiff(
+            self._structure, self._types, block_size=block_size).diff(
+                io.BytesIO(data_1), io.BytesIO(data_2)))
+
+    def test_equal(self):
+        assert self._diff(self._data_1, self._data_1) == []
+
+    def test_differences(self):
+        assert self._diff(self._data_1, self._data_2) == [
+            (('size', ), 0, 0, 4, 5),
+            (('records', 2, 'value'), 12, 12, 3, 5),
+            (('records', 4), None, 20, None, {
+                'value': 7, '__raw__': ['00 00']}),
+            (('name', ), 20, 24, 'abc', 'abd'),
+            (('items', 1, 'label'), 30, 34, 'y', 'z'),
+            (('items', 2), None, 36, None, {'id': 3, 'label': 'w'})]
+
+    def test_block_size(self):
+        assert self._diff(self._data_1, self._data_2, 3) == self._diff(
+            self._data_1, self._data_2)
+
+    def test_element_schema(self):
+        differ = BinDiff(self._structure, self._types)
+        list(differ.diff(
+            io.BytesIO(self._data_1), io.BytesIO(self._data_2)))
+
+        assert list(differ._element_schemas) == [1]
+
+    def test_ranges(self):
+        reader = DiffReader(self._structure, self._types)
+        units = reader.feed(self._data_1)
+
+        assert units[3] == ('records', 1, Range(8, b'\x02\x00\x00\x00'))
+        assert reader.positions[3] == (1, 8)
+
+    def test_ranges_dependency(self):
+        self._structure[1]['structure'][0]['name'] = 'size'
+        reader = DiffReader(self._structure, self._types)
+
+        assert reader.feed(self._data_1)[3] == (
+            'records', 1, {'size': 2, '__raw__': ['00 00']})
+
+    def test_limit(self):
+        output = io.StringIO()
+        count = bin_diff(
+            io.BytesIO(self._data_1), io.BytesIO(self._data_2),
+            io.StringIO(yaml.safe_dump(self._structure)),
+            io.StringIO(yaml.safe_dump(self._types)), output, limit=2)
+
+        assert count == 2
+        assert output.getvalue() == (
+            'size (0x000000, 0x000000): 4 != 5\n'
+            'records.2.value (0x00000c, 0x00000c): 3 != 5\n')
@@ -0,0 +1,60 @@
+"""Tests for the bin_parser.cache module."""
+import pytest
+
+from bin_parser.cache import DecodeCache, missing
+
+
+class TestDecodeCache(object):
+    def setup(self):
+        self._cache = DecodeCache(2)
+
+    def test_missing(self):
+        assert self._cache.lookup(b'a') is missing
+        assert self._cache.misses == 1
+
+    def test_hit(self):
+        self._cache.store(b'a', 1)
+        assert self._cache.lookup(b'a') == 1
+        assert self._cache.hits == 1
+
+    def test_evict(self):
+        self._cache.store(b'a', 1)
+        self._cache.store(b'b', 2)
+        self._cache.store(b'c', 3)
+        assert self._cache.lookup(b'a') is missing
+
+    def test_recently_used(self):
+        self._cache.store(b'a', 1)
+        self._cache.store(b'b', 2)
+        self._cache.lookup(b'a')
+        self._cache.store(b'c', 3)
+        assert self._cache.lookup(b'a') == 1
+        assert self._cache.lookup(b'b') is missing
+
+    def test_copy(self):
+        value = {'a': [1]}
+        self._cache.store(b'a', value)
+        value['a'].append(2)
+        self._cache.lookup(b'a')['a'].append(3)
+        assert self._cache.lookup(b'a') == {'a': [1]}
+
+    def test_frozen(self):
+        self._cache.store(b'a', {'a': 1})
+        value = self._cache.lookup(b'a', frozen=True)
+        assert value is self._cache.lookup(b'a', frozen=True)
+        with pytest.raises(TypeError):
+            value['a'] = 2
+        self._cache.lookup(b'a')['a'] = 2
+        assert self._cache.lookup(b'a') == {'a': 1}
+
+    def test_list(self):
+        self._cache.store(b'a', [1, 2])
+        self._cache.lookup(b'a', frozen=True).append(3)
+        assert self._cache.lookup(b'a') == [1, 2]
+
+    def test_info(self):
+        self._cache.store(b'a', 1)
+        self._cache.lookup(b'a')
+        self._cache.lookup(b'b')
+        assert self._cache.info() == {
+            'hits': 1, 'misses': 1, 'length': 1, 'size': 2}
@@ -0,0 +1,117 @@
+"""Tests for the bin_parser.compact module."""
+import copy
+import pickle
+
+import pytest
+import yaml
+
+from bin_parser import BinReader, BinWriter
+from bin_parser.compact import Record, intern_value, record, record_class
+
+from shared import load_example
+
+
+def _compare(path, input_file, structure_file, types_file):
+    data = open('examples/{}/{}'.format(path, input_file), 'rb').read()
+    structure = load_example(path, structure_file)
+    types = load_example(path, types_file)
+
+    parsed = BinReader(data, structure, types, compact=True).parsed
+    assert parsed == BinReader(data, structure, types).parsed
+    assert BinWriter(parsed, structure, types).data == data
+
+
+class TestRecord(object):
+    def setup(self):
+        self._record = record({'a': 1, 'b': 'x'})
+
+    def test_record(self):
+        assert isinstance(self._record, Record)
+        assert self._record['a'] == 1
+
+    def test_equal(self):
+        assert self._record == {'a': 1, 'b': 'x'}
+        assert {'a': 1, 'b': 'x'} == self._record
+
+    def test_keys(self):
+        assert list(self._record) == ['a', 'b']
+        assert len(self._record) == 2
+        assert 'b' in self._record
+        assert 'c' not in self._record
+
+    def test_missing(self):
+        with pytest.raises(KeyError):
+            self._record['c']
+
+    def test_set(self):
+        self._record['a'] = 2
+        assert self._record['a'] == 2
+
+    def test_add(self):
+        with pytest.raises(KeyError):
+            self._record['c'] = 2
+
+    def test_slots(self):
+        with pytest.raises(AttributeError):
+            self._record.__dict__
+
+    def test_class(self):
+        assert type(record({'a': 2, 'b': 'y'})) is type(self._record)
+        assert record_class(('a', 'b')) is type(self._record)
+
+    def test_copy(self):
+        assert copy.deepcopy(self._record) == self._record
+
+    def test_pickle(self):
+        assert pickle.loads(pickle.dumps(self._record)) == self._record
+
+    def test_intern(self):
+        assert intern_value(''.join(['a', 'b'])) is intern_value('ab')
+
+    def test_intern_long(self):
+        assert intern_value(100) == 100
+        assert intern_value('a' * 65) is not intern_value('a' * 65)
+
+    def test_yaml(self):
+        assert yaml.safe_load(yaml.safe_dump(self._record)) == self._record
+
+
+class TestCompactReader(object):
+    def test_for(self):
+        _compare('lists', 'for.dat', 'structure_for.yml', 'types.yml')
+
+    def test_while(self):
+        _compare('lists', 'while.dat', 'structure_while.yml', 'types.yml')
+
+    def test_do_while(self):
+        _compare(
+            'lists', 'do_while.dat', 'structure_do_while.yml', 'types.yml')
+
+    def test_flags(self):
+        _compare('flags', 'flags.dat', 'structure.yml', 'types.yml')
+
+    def test_bitfield(self):
+        _compare('bitfield', 'bitfield.dat', 'structure.yml', 'types.yml')
+
+    def test_size_string(self):
+        _compare(
+            'size_string', 'size_string.dat', 'structure.yml', 'types.yml')
+
+    def test_records(self):
+        parsed = BinReader(
+            open('examples/csv/test.csv', 'rb').read(),
+            load_example('csv', 'structure.yml'),
+            load_example('csv', 'types.yml'),
+            compact=True).parsed
+
+        assert isinstance(parsed['body'][0], Record)
+        assert type(parsed['body'][0]) is type(parsed['body'][1])
+
+    def test_dump(self):
+        data = open('examples/csv/test.csv', 'rb').read()
+        structure = load_example('csv', 'structure.yml')
+        types = load_example('csv', 'types.yml')
+
+        assert yaml.safe_load(yaml.safe_dump(BinReader(
+            data, structure, types, compact=True).parsed)) == BinReader(
+                data, structure, types).parsed
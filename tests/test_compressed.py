@@ -0,0 +1,182 @@
+"""Tests for the bin_parser.compressed module."""
+import bz2
+import gzip
+import lzma
+from io import BytesIO
+
+from bin_parser import BinReader, BinWriter, compressed
+from bin_parser.compressed import (
+    compression_of, detect, input_stream, output_stream)
+from bin_parser.stream import (
+    BinPushReader, BinStreamWriter, merge_unit, read_stream)
+
+from shared import load_example
+
+
+def _outcome(function, *args, **kwargs):
+    """Call a function, for readers the parsed data is returned."""
+    try:
+        result = function(*args, **kwargs)
+    except Exception as error:
+        return type(error)
+    return getattr(result, 'parsed', result)
+
+
+class _Pipe(object):
+    """Non-seekable readable stream."""
+    def __init__(self, data):
+        self._handle = BytesIO(data)
+
+    def read(self, size=-1):
+        return self._handle.read(size)
+
+    def seekable(self):
+        return False
+
+
+class _Named(BytesIO):
+    def __init__(self, name):
+        super(_Named, self).__init__()
+        self.name = name
+
+
+class TestCompressed(object):
+    """Test the bin_parser.compressed module."""
+    def setup(self):
+        self.data = open('examples/prince/prince.hof', 'rb').read()
+        self.compressed = {
+            'gzip': gzip.compress(self.data),
+            'bz2': bz2.compress(self.data),
+            'xz': lzma.compress(self.data)}
+
+    def test_detect(self):
+        for compression, data in self.compressed.items():
+            assert detect(data) == compression
+        assert detect(self.data) is None
+
+    def test_compression_of(self):
+        assert compression_of('a.dat.gz') == 'gzip'
+        assert compression_of('a.bz2') == 'bz2'
+        assert compression_of('a.xz') == 'xz'
+        assert compression_of('a.dat') is None
+
+    def test_input_stream(self):
+        for data in self.compressed.values():
+            assert input_stream(BytesIO(data)).read() == self.data
+
+    def test_input_stream_pipe(self):
+        for data in self.compressed.values():
+            assert input_stream(_Pipe(data), 16).read() == self.data
+
+    def test_input_stream_plain(self):
+        handle = BytesIO(self.data)
+        assert input_stream(handle) is handle
+        assert handle.read() == self.data
+
+    def test_input_stream_plain_pipe(self):
+        assert input_stream(_Pipe(self.data)).read() == self.data
+
+    def test_output_stream(self):
+        for compression in self.compressed:
+            handle = BytesIO()
+            with output_stream(handle, compression) as stream:
+                stream.write(self.data)
+            assert detect(handle.getvalue()) == compression
+            assert input_stream(
+                BytesIO(handle.getvalue())).read() == self.data
+
+    def test_output_stream_name(self):
+        handle = _Named('prince.hof.xz')
+        with output_stream(handle) as stream:
+            stream.write(self.data)
+        assert lzma.decompress(handle.getvalue()) == self.data
+
+    def test_output_stream_plain(self):
+        handle = _Named('prince.hof')
+        with output_stream(handle) as stream:
+            assert stream is handle
+
+    def test_output_stream_unknown(self):
+        try:
+            with output_stream(BytesIO(), 'zip'):
+                pass
+        except ValueError as error:
+            assert str(error) == 'Unknown compression method `zip`.'
+        else:
+            assert False
+
+    def test_unavailable(self, monkeypatch):
+        monkeypatch.setattr(compressed, 'lzma', None)
+
+        assert input_stream(BytesIO(self.compressed['gzip'])).read() == (
+            self.data)
+        for call in (
+                lambda: input_stream(BytesIO(self.compressed['xz'])),
+                lambda: output_stream(BytesIO(), 'xz').__enter__()):
+            try:
+                call()
+            except ValueError as error:
+                assert str(error) == (
+                    'Compression method `xz` is not supported by this '
+                    'Python installation.')
+            else:
+                assert False
+
+
+class TestStreaming(object):
+    """Test the streaming reader and writer."""
+    def setup(self):
+        self.structure = load_example('balance', 'structure.yml')
+        self.types = load_example('balance', 'types.yml')
+        self.data = open('examples/balance/balance.dat', 'rb').read()
+        self.parsed = BinReader(
+            self.data, self.structure, self.types).parsed
+
+    def test_read_stream(self):
+        assert read_stream(
+            input_stream(BytesIO(gzip.compress(self.data))),
+            BinPushReader(self.structure, self.types),
+            block_size=7) == self.parsed
+
+    def test_read_stream_unknown(self):
+        structure = [{'name': 'a', 'type': 'raw', 'size': 2}]
+        parsed = BinReader(b'abcdef', structure, {}).parsed
+        assert read_stream(
+            BytesIO(b'abcdef'), BinPushReader(structure, {})) == parsed
+
+    def test_merge_unit_unknown(self):
+        parsed = {}
+        merge_unit(parsed, ('__raw__', 0, 'cd'))
+        merge_unit(parsed, ('__raw__', 1, 'ef'))
+        assert parsed == {'__raw__': ['cd', 'ef']}
+
+    def test_stream_writer(self):
+        handle = BytesIO()
+        BinStreamWriter(
+            handle, self.structure, self.types, block_size=5).write(
+                self.parsed)
+        assert handle.getvalue() == BinWriter(
+            self.parsed, self.structure, self.types).data
+
+    def test_stream_writer_compressed(self):
+        handle = BytesIO()
+        with output_stream(handle, 'bz2') as stream:
+            BinStreamWriter(stream, self.structure, self.types).write(
+                self.parsed)
+        assert bz2.decompress(handle.getvalue()) == self.data
+
+    def test_truncated(self):
+        for path, input_file, structure_file in (
+                ('macro', 'macro.dat', 'structure.yml'),
+                ('balance', 'balance.dat', 'structure.yml'),
+                ('lists', 'for.dat', 'structure_for.yml'),
+                ('lists', 'while.dat', 'structure_while.yml')):
+            structure = load_example(path, structure_file)
+            types = load_example(path, 'types.yml')
+            data = open('examples/{}/{}'.format(path, input_file), 'rb').read()
+            for size in range(len(data)):
+                assert _outcome(
+                    read_stream, input_stream(
+                        BytesIO(gzip.compress(data[:size]))),
+                    BinPushReader(structure, types), block_size=3) == (
+                        _outcome(BinReader, data[:size], structure, types))
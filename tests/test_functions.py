@@ -1,4 +1,6 @@
 """Tests for the bin_parser.functions module."""
+import pytest
+
 from bin_parser import functions
 
 
@@ -30,6 +32,25 @@ class TestParser(object):
     def test_raw_idem(self):
         self._idem('raw', b'\x00\x01\x02')
 
+    def test_raw_bytes(self):
+        assert self._brf.raw(b'\x00\x01', 'bytes') == b'\x00\x01'
+
+    def test_raw_bytes_idem(self):
+        self._idem('raw', b'\x00\x01\x02', representation='bytes')
+
+    def test_raw_base64(self):
+        assert self._brf.raw(b'\x00\x01\x02', 'base64') == 'AAEC'
+
+    def test_raw_base64_idem(self):
+        self._idem('raw', b'\x00\x01\x02', representation='base64')
+
+    def test_raw_memoryview(self):
+        assert self._bwf.raw(memoryview(b'\x00\x01')) == b'\x00\x01'
+
+    def test_raw_invalid(self):
+        with pytest.raises(ValueError):
+            self._brf.raw(b'\x00', 'invalid')
+
     def test_bit(self):
         assert self._brf.bit(b'\x03') == '00000011'
 
@@ -72,6 +93,47 @@ class TestParser(object):
             'struct', b'\x01\x02', fmt='BB', labels=['a', 'b'],
             annotation={1: 'x'})
 
+    def test_bitfield(self):
+        assert self._brf.bitfield(
+            b'\x12\x34', [{'name': 'a', 'bits': 4}, {'name': 'b', 'bits': 8}]
+        ) == {'a': 0x04, 'b': 0x23}
+
+    def test_bitfield_little(self):
+        assert self._brf.bitfield(
+            b'\x12\x34', [{'name': 'a', 'bits': 4}], 'little') == {'a': 0x02}
+
+    def test_bitfield_start(self):
+        assert self._brf.bitfield(
+            b'\x80', [{'name': 'a', 'start': 7, 'bits': 1}]) == {'a': 1}
+
+    def test_bitfield_encode(self):
+        assert self._bwf.bitfield(
+            {'a': 1}, [{'name': 'a', 'start': 8, 'bits': 1}]) == b'\x01\x00'
+
+    def test_bitfield_idem(self):
+        self._idem(
+            'bitfield', b'\x12\x34',
+            fields=[{'name': 'a', 'bits': 4}, {'name': 'b', 'bits': 12}],
+            order='little', size=2)
+
+    def test_bitfield_layout(self):
+        assert functions.bitfield_layout([
+            {'name': 'a', 'bits': 3}, {'name': 'b', 'start': 4, 'bits': 2}
+        ]) == (('a', 0, 0x07), ('b', 4, 0x03))
+
+    def test_bitfield_overlap(self):
+        with pytest.raises(ValueError):
+            functions.bitfield_layout([
+                {'name': 'a', 'bits': 3}, {'name': 'b', 'start': 2, 'bits': 2}])
+
+    def test_bitfield_size(self):
+        with pytest.raises(ValueError):
+            functions.bitfield_layout([{'name': 'a', 'bits': 9}], 1)
+
+    def test_bitfield_value(self):
+        with pytest.raises(ValueError):
+            self._bwf.bitfield({'a': 4}, [{'name': 'a', 'bits': 2}])
+
     def test_flags(self):
         assert self._brf.flags(b'\x03', {}) == {
             'flag_01': True, 'flag_02': True}
@@ -93,3 +155,27 @@ class TestParser(object):
 
     def test_flags_annotation_idem(self):
         self._idem('flags', b'\x03', annotation={2: 'a'})
+
+
+class TestTables(object):
+    """Test the lookup tables for single bytes."""
+    def setup(self):
+        self._brf = functions.BinReadFunctions()
+
+    def test_table_key(self):
+        assert functions.table_key(1) != functions.table_key(1.0)
+        assert functions.table_key(1) != functions.table_key(True)
+        assert functions.table_key({'a': 1}) != functions.table_key(
+            {'a': True})
+
+    def test_shared(self):
+        assert functions.decode_table(
+            self._brf, 'struct', {'fmt': 'B'}) is functions.decode_table(
+                functions.BinReadFunctions(), 'struct', {'fmt': 'B'})
+
+    def test_bounded(self, monkeypatch):
+        monkeypatch.setattr(functions, '_max_tables', 2)
+        for fmt in ('b', 'B', 'c'):
+            functions.decode_table(self._brf, 'struct', {'fmt': fmt})
+
+        assert len(functions._tables) == 2
@@ -0,0 +1,178 @@
+"""Tests for the bin_parser.incremental module."""
+import random
+
+from bin_parser import BinReader
+from bin_parser.incremental import IncrementalReader
+
+from shared import load_example
+
+
+def _modify(data, changes):
+    data = bytearray(data)
+
+    for offset, value in changes:
+        data[offset:offset + 1] = value
+
+    return bytes(data)
+
+
+def _compare(path, input_file, structure_file, types_file):
+    data = open('examples/{}/{}'.format(path, input_file), 'rb').read()
+    structure = load_example(path, structure_file)
+    types = load_example(path, types_file)
+    generator = random.Random(0)
+
+    for _ in range(200):
+        changes = [
+            (generator.randrange(len(data)), generator.choice(b'\x00\x0109az'))
+            for _ in range(generator.randint(1, 3))]
+        modified = _modify(data, [(o, bytes([v])) for o, v in changes])
+
+        try:
+            expected = IncrementalReader(modified, structure, types)
+        except ValueError:
+            # Not all modifications result in valid data.
+            continue
+        reader = IncrementalReader(data, structure, types)
+        reader.update(modified, [(o, o + 1) for o, _ in changes])
+
+        assert reader.parsed == expected.parsed
+        assert reader.offsets == expected.offsets
+
+
+class TestIncrementalReader(object):
+    def setup(self):
+        self._structure = load_example('lists', 'structure_for.yml')
+        self._types = load_example('lists', 'types.yml')
+        self._data = open('examples/lists/for.dat', 'rb').read()
+
+    def _update(self, changes):
+        reader = IncrementalReader(self._data, self._structure, self._types)
+        data = _modify(self._data, changes)
+        result = reader.update(
+            data, [(offset, offset + 1) for offset, _ in changes])
+
+        expected = BinReader(
+            data, self._structure, self._types, offsets=True)
+        assert reader.parsed == expected.parsed
+        assert reader.offsets == expected.offsets
+
+        return result
+
+    def test_parse(self):
+        reader = IncrementalReader(self._data, self._structure, self._types)
+        expected = BinReader(
+            self._data, self._structure, self._types, offsets=True)
+
+        assert reader.parsed == expected.parsed
+        assert reader.offsets == expected.offsets
+
+    def test_decode(self):
+        assert self._update([(8, b'I')]) == {
+            'fields': [('lines', 1, 'content')], 'reparsed': None}
+
+    def test_unchanged(self):
+        assert self._update([(8, b'i')]) == {'fields': [], 'reparsed': None}
+
+    def test_delimiter(self):
+        result = self._update([(3, b'\x00')])
+        assert result['reparsed'] == (1, 26)
+        assert ('lines', 4, 'content') in result['fields']
+
+    def test_resynchronise(self):
+        result = self._update([(3, b'\x00'), (6, b'X')])
+        assert result['reparsed'] == (1, 13)
+        assert result['fields'] == [
+            ('lines', 0, 'content'), ('lines', 1, 'content')]
+
+    def test_dependency(self):
+        result = self._update([(0, b'\x03')])
+        assert result['reparsed'] == (0, 25)
+
+    def test_resize(self):
+        reader = IncrementalReader(self._data, self._structure, self._types)
+        data = self._data[:7] + b'new line\x00' + self._data[7:]
+        result = reader.update(data, [(7, 16)])
+
+        assert result['reparsed'] == (7, 35)
+        assert reader.parsed == BinReader(
+            data, self._structure, self._types).parsed
+
+    def test_resize_edit(self):
+        structure = load_example('csv', 'structure.yml')
+        types = load_example('csv', 'types.yml')
+        data = open('examples/csv/test.csv', 'rb').read()
+        reader = IncrementalReader(data, structure, types)
+
+        data = data[:1] + data[2:]
+        result = reader.update(data, [(1, 1)])
+        assert result['fields'][:2] == [('header', ), ('body', 0, 'name')]
+
+        data = data[:1] + b'N' + data[2:]
+        assert reader.update(data, [(1, 2)]) == {
+            'fields': [('header', )], 'reparsed': None}
+        expected = BinReader(data, structure, types, offsets=True)
+        assert reader.parsed == expected.parsed
+        assert reader.offsets == expected.offsets
+
+    def test_truncated(self):
+        types = {'types': {
+            'byte': {'function': {'name': 'struct', 'args': {'fmt': 'B'}}}}}
+        element = [
+            {'name': 'a', 'type': 'byte'}, {'name': 'b', 'type': 'byte'}]
+        data = b'\x02\x03\x04\x05\x06'
+
+        for structure in (
+                [{'name': 'a', 'structure': element}],
+                [{'name': 'a', 'do_while': {'operands': [True]},
+                  'structure': element}],
+                [{'name': 'a', 'while': {
+                    'operands': ['a', 0], 'operator': 'ne', 'term': 'b'},
+                  'structure': element}]):
+            for end in range(len(data)):
+                reader = IncrementalReader(data[:end], structure, types)
+                expected = BinReader(
+                    data[:end], structure, types, offsets=True)
+                assert reader.parsed == expected.parsed
+                assert reader.offsets == expected.offsets
+
+    def test_random_for(self):
+        _compare('lists', 'for.dat', 'structure_for.yml', 'types.yml')
+
+    def test_random_while(self):
+        _compare('lists', 'while.dat', 'structure_while.yml', 'types.yml')
+
+    def test_random_do_while(self):
+        _compare(
+            'lists', 'do_while.dat', 'structure_do_while.yml', 'types.yml')
+
+    def test_random_balance(self):
+        _compare('balance', 'balance.dat', 'structure.yml', 'types.yml')
+
+    def test_random_size_string(self):
+        _compare(
+            'size_string', 'size_string.dat', 'structure.yml', 'types.yml')
+
+    def _raw(self, representation):
+        structure = [
+            {'name': 'size', 'type': 'byte'},
+            {'name': 'content', 'type': 'blob'}]
+        types = {'types': {
+            'byte': {'function': {'name': 'struct', 'args': {'fmt': 'B'}}},
+            'blob': {'size': 3, 'function': {
+                'name': 'raw', 'args': {'representation': representation}}}}}
+        reader = IncrementalReader(b'\x01abc', structure, types)
+
+        return reader, reader.update(b'\x01aXc', [(2, 3)])
+
+    def test_memoryview(self):
+        reader, result = self._raw('memoryview')
+
+        assert result == {'fields': [('content', )], 'reparsed': None}
+        assert reader.parsed['content'] == b'aXc'
+
+    def test_reference(self):
+        reader, result = self._raw('reference')
+
+        assert result == {'fields': [('content', )], 'reparsed': None}
+        assert reader.parsed['content'] == (1, 3)
@@ -0,0 +1,98 @@
+"""Tests for the bin_parser_extras.make_skeleton module."""
+import io
+import random
+import struct
+
+import pytest
+import yaml
+
+from bin_parser import BinReader
+from bin_parser_extras import make_skeleton as skeleton
+
+
+def _fixed_data(records=500):
+    generator = random.Random(0)
+    data = b'HDR'
+    for index in range(records):
+        data += struct.pack('<i', index)
+        data += 'name_{:03d}'.format(generator.randrange(1000)).encode(
+            ).ljust(10, b'\x00')
+        data += struct.pack('<B', generator.randrange(0x100))
+
+    return data
+
+
+def _skeleton(data, **kwargs):
+    structure_handle = io.StringIO()
+    types_handle = io.StringIO()
+    skeleton.make_skeleton(
+        io.BytesIO(data), structure_handle, types_handle, block_size=7,
+        log=io.StringIO(), **kwargs)
+
+    return (
+        yaml.safe_load(structure_handle.getvalue()),
+        yaml.safe_load(types_handle.getvalue()))
+
+
+@pytest.fixture(params=[True, False], ids=['numpy', 'python'])
+def numpy(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(skeleton, 'numpy', None)
+    elif skeleton.numpy is None:
+        pytest.skip('NumPy is not installed')
+
+
+class TestMakeSkeleton(object):
+    def test_statistics(self, numpy):
+        data = b'ab\x00\x00c\x00d\r\n\r\ne'
+        whole = skeleton.Statistics([0x0d, 0x0a])
+        whole.update(data)
+        blocks = skeleton.Statistics([0x0d, 0x0a])
+        for index in range(0, len(data), 3):
+            blocks.update(data[index:index + 3])
+
+        assert blocks.counts == whole.counts
+        assert blocks.runs == whole.runs
+        assert blocks.runs[0x00] == 2
+        assert blocks.delimiter_count == whole.delimiter_count == 2
+
+    def test_autocorrelation(self, numpy):
+        assert skeleton.autocorrelation(b'abcabcab', 3) == [
+            1.0, 0.0, 0.0, 1.0]
+
+    def test_fixed(self, numpy):
+        structure, types = _skeleton(_fixed_data())
+
+        assert structure[0] == {'name': 'header', 'type': 'raw', 'size': 3}
+        assert structure[1]['for'] == 500
+        assert structure[1]['structure'] == [
+            {'name': 'field_000', 'type': 'int'},
+            {'name': 'field_004', 'type': 'text', 'size': 10},
+            {'name': 'field_014', 'type': 'byte'}]
+
+        parsed = BinReader(_fixed_data(), structure, types).parsed
+        assert parsed['records'][2]['field_000'] == 2
+
+    def test_delimited(self, numpy):
+        data = open('examples/csv/test.csv', 'rb').read()
+        structure, types = _skeleton(data)
+
+        assert types['types']['text']['delimiter'] == [0x0a]
+        assert types['types']['field']['delimiter'] == [0x09]
+        assert BinReader(data, structure, types).parsed['records'][1] == {
+            'field_000': 'me', 'field_001': 'now'}
+
+    def test_delimiter(self, numpy):
+        structure, types = _skeleton(b'a;b;c', delimiter=[0x3b])
+
+        assert structure[0]['for'] == 3
+        assert types['types']['text'] == {
+            'delimiter': [0x3b], 'function': {'name': 'text'}}
+
+    def test_binary(self, numpy):
+        structure, types = _skeleton(b'\xcf\x07a b\x00\x8a\x0c\x00')
+
+        assert structure[0]['structure'] == [
+            {'name': 'field_000', 'type': 'raw'}]
+        assert types['types']['raw'] == {
+            'delimiter': [0x00], 'function': {'name': 'raw'}}
@@ -0,0 +1,133 @@
+"""Tests for the bin_parser.messages module."""
+import io
+import struct
+
+from bin_parser import BinReader, MessageReader, Schema
+
+
+_structure = [
+    {'name': 'id', 'type': 'short'},
+    {'name': 'name', 'type': 'text'},
+    {'name': 'flags', 'type': 'bits'}]
+
+_types = {'types': {
+    'short': {'size': 2, 'function': {
+        'name': 'struct', 'args': {'fmt': '<H'}}},
+    'text': {'delimiter': [0x00], 'pure': True},
+    'bits': {'function': {'name': 'flags', 'args': {
+        'annotation': {0x01: 'valid', 0x02: 'checked'}}}}}}
+
+
+def _message(index):
+    return struct.pack('<H', index) + 'name_{}'.format(
+        index % 4).encode() + b'\x00' + bytes([index % 4])
+
+
+def _prefixed(messages):
+    return b''.join(
+        struct.pack('>H', len(message)) + message for message in messages)
+
+
+class TestMessageReader(object):
+    def setup(self):
+        self.messages = [_message(index) for index in range(50)]
+        self.expected = [
+            BinReader(message, _structure, _types).parsed
+            for message in self.messages]
+
+    def test_parse(self):
+        reader = MessageReader(_structure, _types, prefix='>H')
+        assert reader.parse(self.messages[3]) == self.expected[3]
+
+    def test_prefix(self):
+        reader = MessageReader(_structure, _types, prefix='>H')
+        assert reader.decode(_prefixed(self.messages)) == self.expected
+
+    def test_delimiter(self):
+        reader = MessageReader(_structure, _types, delimiter=[0x0d, 0x0a])
+        data = b'\r\n'.join(self.messages)
+        assert reader.decode(data) == self.expected
+        assert reader.decode(data + b'\r\n') == self.expected
+
+    def test_iterate(self):
+        reader = MessageReader(_structure, _types, prefix='>H')
+        results = reader.iterate(_prefixed(self.messages))
+        assert next(results) == self.expected[0]
+        assert list(results) == self.expected[1:]
+
+    def test_results_independent(self):
+        reader = MessageReader(_structure, _types, prefix='>H')
+        first = reader.parse(self.messages[1])
+        reader.parse(self.messages[2])
+        assert first == self.expected[1]
+
+    def test_state_reset(self):
+        structure = [
+            {'name': 'a', 'type': 'short', 'if': {
+                'operands': ['b', 1], 'operator': 'eq'}},
+            {'name': 'b', 'type': 'short'}]
+        reader = MessageReader(structure, _types, prefix='B')
+        assert reader.decode(b'\x02\x01\x00\x02\x01\x00') == [
+            {'b': 1}, {'b': 1}]
+
+    def test_stream(self):
+        reader = MessageReader(_structure, _types, prefix='>H')
+        assert list(reader.stream(
+            io.BytesIO(_prefixed(self.messages)),
+            block_size=7)) == self.expected
+
+    def test_stream_delimiter(self):
+        reader = MessageReader(_structure, _types, delimiter=[0xff])
+        assert list(reader.stream(
+            io.BytesIO('\xff'.encode('utf-8').join(self.messages)),
+            block_size=5)) == self.expected
+
+    def test_incomplete(self):
+        reader = MessageReader(_structure, _types, prefix='>H')
+        data = _prefixed(self.messages[:2])
+        try:
+            reader.decode(data[:-1])
+        except ValueError as error:
+            assert str(error) == (
+                'Incomplete message at byte 0x{:06x}.'.format(
+                    len(self.messages[0]) + 2))
+        else:
+            assert False
+
+    def test_stream_incomplete(self):
+        reader = MessageReader(_structure, _types, prefix='>H')
+        results = reader.stream(io.BytesIO(_prefixed(self.messages)[:-1]))
+        try:
+            list(results)
+        except ValueError as error:
+            assert str(error).startswith('Incomplete message')
+        else:
+            assert False
+
+    def test_schema(self):
+        reader = MessageReader(
+            None, None, schema=Schema(_structure, _types), prefix='>H')
+        assert reader.decode(_prefixed(self.messages)) == self.expected
+
+    def test_cache(self):
+        reader = MessageReader(_structure, _types, prefix='>H')
+        reader.decode(_prefixed(self.messages))
+        assert reader.cache_info()['text']['hits'] == 46
+
+    def test_framing(self):
+        for kwargs in ({}, {'prefix': '>H', 'delimiter': [0x00]}):
+            try:
+                MessageReader(_structure, _types, **kwargs)
+            except ValueError as error:
+                assert str(error) == (
+                    'Either a length prefix or a delimiter must be given.')
+            else:
+                assert False
+
+    def test_invalid_prefix(self):
+        try:
+            MessageReader(_structure, _types, prefix='>Q!')
+        except ValueError as error:
+            assert str(error) == 'Invalid length prefix `>Q!`.'
+        else:
+            assert False
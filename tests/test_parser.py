@@ -1,7 +1,14 @@
 """Tests for the bin_parser.bin_parser module."""
+import copy
+import pickle
+import struct
+import sys
+
+import pytest
 import yaml
 
-from bin_parser import BinReader, BinWriter
+from bin_parser import (
+    BinReadFunctions, BinReader, BinWriteFunctions, BinWriter, deprecated)
 
 
 def _bin_reader(path, input_file, structure_file, types_file):
@@ -61,7 +68,9 @@ class TestReader(object):
                 'size_string', 'size_string.dat', 'structure.yml',
                 'types.yml'],
             'var_type': [
-                'var_type', 'var_type.dat', 'structure.yml', 'types.yml']}
+                'var_type', 'var_type.dat', 'structure.yml', 'types.yml'],
+            'bitfield': [
+                'bitfield', 'bitfield.dat', 'structure.yml', 'types.yml']}
 
     def test_idempotence(self):
         for example in self._data:
@@ -199,3 +208,294 @@ class TestReader(object):
     def test_var_type_4(self):
         assert _bin_reader(
             *self._data['var_type'])['value_2']['type_name'] == 'le_s_short'
+
+    def test_bitfield_1(self):
+        assert _bin_reader(*self._data['bitfield'])['header'] == {
+            'version': 2, 'kind': 5, 'length': 42}
+
+    def test_bitfield_2(self):
+        assert _bin_reader(*self._data['bitfield'])['status'] == {
+            'ready': 1, 'error': 0, 'channel': 3, 'counter': 12345}
+
+
+class TestRaw(object):
+    """Test the representations of unknown data."""
+    def setup(self):
+        self._data = b'\x01\x02\x03\x04\x05\x06'
+        self._structure = [
+            {'name': 'a', 'type': 'byte'}, {'size': 3},
+            {'name': 'b', 'type': 'byte'}, {'size': 1}]
+
+    def _types(self, representation):
+        return {'types': {
+            'byte': {'function': {'name': 'struct'}},
+            'raw': {'function': {
+                'args': {'representation': representation}}}}}
+
+    def _parse(self, representation):
+        return BinReader(
+            self._data, self._structure, self._types(representation)).parsed
+
+    def _round_trip(self, representation):
+        types = self._types(representation)
+        parsed = BinReader(self._data, self._structure, types).parsed
+
+        assert BinWriter(parsed, self._structure, types).data == self._data
+
+    def test_hex(self):
+        assert self._parse('hex')['__raw__'] == ['02 03 04', '06']
+
+    def test_bytes(self):
+        assert self._parse('bytes')['__raw__'] == [b'\x02\x03\x04', b'\x06']
+
+    def test_base64(self):
+        assert self._parse('base64')['__raw__'] == ['AgME', 'Bg==']
+
+    def test_memoryview(self):
+        raw = self._parse('memoryview')['__raw__']
+        assert isinstance(raw[0], memoryview)
+        assert raw[0].tobytes() == b'\x02\x03\x04'
+
+    def test_reference(self):
+        assert self._parse('reference')['__raw__'] == [(1, 3), (5, 1)]
+
+    def test_round_trip_bytes(self):
+        self._round_trip('bytes')
+
+    def test_round_trip_base64(self):
+        self._round_trip('base64')
+
+    def test_round_trip_memoryview(self):
+        self._round_trip('memoryview')
+
+    def test_round_trip_reference(self):
+        types = self._types('reference')
+        parsed = BinReader(self._data, self._structure, types).parsed
+
+        assert BinWriter(
+            parsed, self._structure, types, source=self._data).data == (
+                self._data)
+
+    def test_reference_no_source(self):
+        types = self._types('reference')
+        parsed = BinReader(self._data, self._structure, types).parsed
+
+        with pytest.raises(ValueError):
+            BinWriter(parsed, self._structure, types)
+
+
+class TestTables(object):
+    """Test the lookup tables for single byte types."""
+    def setup(self):
+        self._structure = [
+            {'name': 'flags', 'type': 'bitfield'},
+            {'name': 'value', 'type': 'byte'}]
+        self._types = {'types': {
+            'bitfield': {'function': {
+                'name': 'flags', 'args': {'annotation': {0x01: 'one'}}}},
+            'byte': {'function': {
+                'name': 'struct',
+                'args': {'fmt': 'B', 'annotation': {0x02: 'two'}}}}}}
+
+    def _reader(self, data, functions=BinReadFunctions(), frozen=False):
+        return BinReader(
+            data, self._structure, self._types, functions, frozen=frozen)
+
+    def test_tables(self):
+        assert set(self._reader(b'\x00\x00')._tables) == set([
+            'bitfield', 'byte'])
+
+    def test_decode(self):
+        functions = BinReadFunctions()
+
+        for byte in range(0x100):
+            data = bytes(bytearray([byte, byte]))
+            assert self._reader(data).parsed == {
+                'flags': functions.flags(data[:1], {0x01: 'one'}),
+                'value': functions.struct(
+                    data[1:], 'B', annotation={0x02: 'two'})}
+
+    def test_encode(self):
+        # NOTE: The `flags` encoder does not support values above 0x7f.
+        for byte in range(0x80):
+            data = bytes(bytearray([byte, byte]))
+            writer = BinWriter(
+                self._reader(data).parsed, self._structure, self._types)
+            assert writer._tables
+            assert writer.data == data
+
+    def test_copy(self):
+        first = self._reader(b'\x01\x00').parsed['flags']
+        first['one'] = False
+
+        assert self._reader(b'\x01\x00').parsed['flags']['one']
+
+    def test_frozen(self):
+        flags = self._reader(b'\x01\x00', frozen=True).parsed['flags']
+
+        assert flags['one']
+        with pytest.raises(TypeError):
+            flags['one'] = False
+
+    def test_frozen_copy(self):
+        parsed = self._reader(b'\x01\x00', frozen=True).parsed
+
+        assert copy.deepcopy(parsed) == parsed
+        assert pickle.loads(pickle.dumps(parsed)) == parsed
+        assert yaml.safe_load(yaml.safe_dump(parsed)) == parsed
+
+    def test_override(self):
+        class Functions(BinReadFunctions):
+            def flags(self, data, annotation):
+                return ord(data)
+
+        reader = self._reader(b'\x03\x00', Functions())
+        assert 'bitfield' not in reader._tables
+        assert reader.parsed['flags'] == 3
+
+    def test_exact_type(self):
+        parsed = self._reader(b'\x00\x01').parsed
+        parsed['value'] = 1.0
+
+        with pytest.raises(struct.error):
+            BinWriter(parsed, self._structure, self._types)
+
+    def test_lazy(self, monkeypatch, capsys):
+        monkeypatch.setattr(deprecated, 'show_deprecation_warning', True)
+        types = copy.deepcopy(self._types)
+        types['types']['mapped'] = {'function': {
+            'name': 'map', 'args': {'annotation': {0x01: 'one'}}}}
+
+        reader = BinReader(b'\x00\x00', self._structure, types)
+        assert reader._tables['mapped'] is None
+        assert not capsys.readouterr().err
+
+        reader = BinReader(
+            b'\x01', [{'name': 'value', 'type': 'mapped'}], types)
+        assert reader.parsed == {'value': 'one'}
+        assert reader._tables['mapped']
+        assert 'deprecated' in capsys.readouterr().err
+
+
+class TestCache(object):
+    """Test the decoding cache for pure types."""
+    def setup(self):
+        self._structure = [{
+            'name': 'entries', 'for': 4,
+            'structure': [{'name': 'value', 'type': 'counted'}]}]
+        self._data = b'\x01\x00\x02\x00\x01\x00\x01\x00'
+
+    def _types(self, pure, cache_size=1024):
+        return {'types': {'counted': {
+            'size': 2, 'pure': pure, 'cache_size': cache_size}}}
+
+    def _reader(self, pure, cache_size=1024):
+        class Functions(BinReadFunctions):
+            calls = 0
+
+            def counted(self, data):
+                Functions.calls += 1
+                return {'value': ord(data[:1])}
+
+        reader = BinReader(
+            self._data, self._structure, self._types(pure, cache_size),
+            Functions())
+
+        return reader, Functions.calls
+
+    def test_pure(self):
+        reader, calls = self._reader(True)
+        assert calls == 2
+        assert reader.cache_info() == {'counted': {
+            'hits': 2, 'misses': 2, 'length': 2, 'size': 1024}}
+
+    def test_not_pure(self):
+        reader, calls = self._reader(False)
+        assert calls == 4
+        assert reader.cache_info() == {}
+
+    def test_result(self):
+        assert self._reader(True)[0].parsed == self._reader(False)[0].parsed
+
+    def test_copy(self):
+        entries = self._reader(True)[0].parsed['entries']
+        assert entries[0]['value'] is not entries[2]['value']
+
+    def test_evict(self):
+        assert self._reader(True, 1)[1] == 3
+
+    def test_prince(self):
+        class PrinceReadFunctions(BinReadFunctions):
+            def min(self, data):
+                return self.struct(data, '<h') - 1
+
+            def sec(self, data):
+                return self.struct(data, '<h') // 12
+
+        reader = BinReader(
+            open('examples/prince/prince.hof', 'rb').read(),
+            yaml.safe_load(open('examples/prince/structure.yml')),
+            yaml.safe_load(open('examples/prince/types.yml')),
+            PrinceReadFunctions())
+
+        assert reader.parsed == yaml.safe_load(
+            open('examples/prince/prince.yml'))
+        assert reader.cache_info()['min']['hits']
+
+
+class TestNesting(object):
+    """Test structures that are nested deeper than the recursion limit."""
+    def setup(self):
+        self._depth = sys.getrecursionlimit() * 2
+        self._types = {'types': {'byte': {
+            'function': {'name': 'struct', 'args': {'fmt': 'B'}}}}}
+        self._data = bytes(bytearray(
+            x % 0x100 for x in range(self._depth + 1)))
+
+    def _nested(self, data):
+        values = []
+        for _ in range(self._depth):
+            values.append(data['value'])
+            data = data['nested']
+        values.append(data['value'])
+
+        return values
+
+    def _round_trip(self, structure, types):
+        parsed = BinReader(self._data, structure, types).parsed
+        assert self._nested(parsed) == list(bytearray(self._data))
+        assert BinWriter(parsed, structure, types).data == self._data
+
+    def test_structure(self):
+        structure = [{'name': 'value', 'type': 'byte'}]
+        for _ in range(self._depth):
+            structure = [
+                {'name': 'value', 'type': 'byte'},
+                {'name': 'nested', 'structure': structure}]
+
+        self._round_trip(structure, self._types)
+
+    def test_macro(self):
+        types = dict(self._types, macros={
+            'level_{}'.format(index): [
+                {'name': 'value', 'type': 'byte'},
+                {'name': 'nested', 'macro': 'level_{}'.format(index + 1)}]
+            for index in range(self._depth)})
+        types['macros']['level_{}'.format(self._depth)] = [
+            {'name': 'value', 'type': 'byte'}]
+
+        self._round_trip(
+            [{'name': 'value', 'type': 'byte'},
+                {'name': 'nested', 'macro': 'level_1'}], types)
+
+    def test_end_of_input(self):
+        structure = [{'name': 'value', 'type': 'byte'}]
+        for _ in range(3):
+            structure = [{
+                'name': 'nested', 'do_while': {'operands': [True]},
+                'structure': [
+                    {'name': 'value', 'type': 'byte'},
+                    {'name': 'nested', 'structure': structure}]}]
+
+        parsed = BinReader(b'\x01\x02\x03', structure, self._types).parsed
+        assert parsed == {'nested': []}
@@ -0,0 +1,93 @@
+"""Tests for the bin_parser.patch module."""
+import shutil
+
+import pytest
+
+from bin_parser import BinReader
+from bin_parser.patch import FieldLocator, patch, references
+
+from shared import load_example
+
+
+class TestPatch(object):
+    def setup(self):
+        self._structure = load_example('lists', 'structure_for.yml')
+        self._types = load_example('lists', 'types.yml')
+
+    def _copy(self, tmp_path):
+        path = str(tmp_path / 'for.dat')
+        shutil.copy('examples/lists/for.dat', path)
+
+        return path
+
+    def _patch(self, path, field_path, value):
+        with open(path, 'r+b') as handle:
+            return patch(
+                handle, self._structure, self._types, field_path, value)
+
+    def _parse(self, path):
+        return BinReader(
+            open(path, 'rb').read(), self._structure, self._types).parsed
+
+    def test_offsets(self):
+        parser = BinReader(
+            open('examples/lists/for.dat', 'rb').read(), self._structure,
+            self._types, offsets=True)
+
+        assert parser.offsets[('size_of_list', )] == (0, 1)
+        assert parser.offsets[('lines', 0, 'content')] == (1, 7)
+        assert parser.offsets[('lines', 4, 'content')] == (26, 31)
+
+    def test_locator(self):
+        location = FieldLocator(
+            open('examples/lists/for.dat', 'rb').read(), self._structure,
+            self._types, ('lines', 1, 'content')).location
+
+        assert location['start'] == 7
+        assert location['end'] == 13
+        assert location['function'] == 'text'
+
+    def test_same_size(self, tmp_path):
+        path = self._copy(tmp_path)
+
+        assert self._patch(path, ('lines', 1, 'content'), 'LINE2') == []
+        parsed = self._parse(path)
+        assert parsed['lines'][1]['content'] == 'LINE2'
+        assert parsed['lines'][2]['content'] == 'longer line'
+
+    def test_grow(self, tmp_path):
+        path = self._copy(tmp_path)
+
+        self._patch(path, ('lines', 0, 'content'), 'a much longer line')
+        parsed = self._parse(path)
+        assert parsed['lines'][0]['content'] == 'a much longer line'
+        assert parsed['lines'][4]['content'] == 'last'
+
+    def test_shrink(self, tmp_path):
+        path = self._copy(tmp_path)
+
+        self._patch(path, ('lines', 2, 'content'), 'short')
+        parsed = self._parse(path)
+        assert parsed['lines'][2]['content'] == 'short'
+        assert parsed['lines'][4]['content'] == 'last'
+
+    def test_dependency(self, tmp_path):
+        path = self._copy(tmp_path)
+
+        warnings = self._patch(path, ('size_of_list', ), 4)
+        assert len(warnings) == 1
+        assert '`for` of `lines`' in warnings[0]
+        assert len(self._parse(path)['lines']) == 4
+
+    def test_not_found(self, tmp_path):
+        path = self._copy(tmp_path)
+
+        with pytest.raises(ValueError):
+            self._patch(path, ('lines', 7, 'content'), 'x')
+
+    def test_references(self):
+        used = references(
+            load_example('size_string', 'structure.yml'),
+            load_example('size_string', 'types.yml'))
+
+        assert used['size_of_string'] == ['`size` of `string`'] * 2
@@ -0,0 +1,200 @@
+"""Tests for the bin_parser.registry module."""
+import gzip
+import io
+
+import yaml
+
+from bin_parser import BinReadFunctions, BinReader
+from bin_parser.bin_parser import BinParser
+from bin_parser.cli import bin_batch_reader
+from bin_parser.registry import SchemaRegistry, header
+
+from shared import load_example
+
+
+_types = {
+    'types': {
+        'byte': {'function': {'name': 'struct', 'args': {'fmt': 'B'}}},
+        'text': {'delimiter': [0x00]},
+        'signature': {
+            'size': 4, 'function': {'name': 'text'}, 'magic': 'ABCD'}}}
+
+_image = [
+    {'name': 'signature', 'type': 'raw', 'size': 4, 'magic': '89 50 4e 47'},
+    {'name': 'width', 'type': 'byte'},
+    {'name': 'title', 'type': 'text'}]
+
+_image_v2 = [
+    {'name': 'signature', 'type': 'raw', 'size': 4, 'magic': '89 50 4e 47'},
+    {'name': 'version', 'type': 'byte', 'magic': [2, 3]},
+    {'name': 'title', 'type': 'text'}]
+
+_archive = [
+    {'name': 'flags', 'type': 'byte'},
+    {'name': 'header', 'structure': [
+        {'name': 'signature', 'type': 'signature'}]},
+    {'name': 'title', 'type': 'text'}]
+
+_text = [
+    {'name': 'title', 'type': 'text'}]
+
+
+def _header(structure):
+    return header(BinParser(structure, _types, BinReadFunctions()))
+
+
+class TestHeader(object):
+    def test_literal(self):
+        assert _header(_image) == [(0, {b'\x89PNG'})]
+
+    def test_values(self):
+        assert _header(_image_v2) == [
+            (0, {b'\x89PNG'}), (4, {b'\x02', b'\x03'})]
+
+    def test_type(self):
+        assert _header(_archive) == [(1, {b'ABCD'})]
+
+    def test_variable_size(self):
+        assert _header([
+            {'name': 'title', 'type': 'text'},
+            {'name': 'version', 'type': 'byte', 'magic': 1}]) == []
+
+    def test_conditional(self):
+        assert _header([
+            {'name': 'a', 'type': 'byte', 'if': {'operands': [1]}},
+            {'name': 'version', 'type': 'byte', 'magic': 1}]) == []
+
+    def test_too_large(self):
+        try:
+            _header([{'name': 'a', 'type': 'signature', 'magic': 'ABCDE'}])
+        except ValueError as error:
+            assert str(error) == (
+                'Magic value `ABCDE` of `a` does not fit in 4 bytes.')
+        else:
+            assert False
+
+
+class TestSchemaRegistry(object):
+    def setup(self):
+        self.registry = SchemaRegistry()
+        self.registry.add('image', _image, _types)
+        self.registry.add('image_v2', _image_v2, _types)
+        self.registry.add('archive', _archive, _types)
+
+    def test_prefix_size(self):
+        assert self.registry.prefix_size == 5
+
+    def test_match(self):
+        assert self.registry.match(b'\x89PNG\x01') == 'image'
+
+    def test_match_specific(self):
+        assert self.registry.match(b'\x89PNG\x03') == 'image_v2'
+        assert self.registry.candidates(b'\x89PNG\x03') == [
+            'image_v2', 'image']
+
+    def test_match_offset(self):
+        assert self.registry.match(b'\x07ABCD') == 'archive'
+
+    def test_no_match(self):
+        assert self.registry.match(b'\x00\x00\x00\x00\x00') is None
+
+    def test_fallback(self):
+        self.registry.add('text', _text, _types)
+        assert self.registry.match(b'\x00\x00\x00\x00\x00') == 'text'
+        assert self.registry.match(b'\x07ABCD') == 'archive'
+
+    def test_ambiguous(self):
+        self.registry.add('other', _image, _types)
+        try:
+            self.registry.match(b'\x89PNG\x01')
+        except ValueError as error:
+            assert str(error) == 'Schemas `image` and `other` both match.'
+        else:
+            assert False
+
+    def test_duplicate(self):
+        try:
+            self.registry.add('image', _image, _types)
+        except ValueError as error:
+            assert str(error) == 'Schema `image` is already defined.'
+        else:
+            assert False
+
+    def test_route(self):
+        name, handle = self.registry.route(io.BytesIO(b'\x07ABCDtitle\x00'))
+        assert name == 'archive'
+        assert handle.read() == b'\x07ABCDtitle\x00'
+
+    def test_load(self):
+        registry = SchemaRegistry()
+        registry.load('examples/balance/')
+        assert list(registry.schemas) == ['balance']
+
+    def test_schema(self):
+        data = open('examples/balance/balance.dat', 'rb').read()
+        registry = SchemaRegistry()
+        registry.load('examples/balance/')
+
+        assert registry.schemas['balance'].read(data).parsed == BinReader(
+            data, load_example('balance', 'structure.yml'),
+            load_example('balance', 'types.yml')).parsed
+
+
+class TestBatch(object):
+    def _schema(self, path, structure):
+        path.mkdir()
+        (path / 'structure.yml').write_text(yaml.safe_dump(structure))
+        (path / 'types.yml').write_text(yaml.safe_dump(_types))
+        return str(path)
+
+    def test_batch(self, tmp_path, capsys):
+        schemas = [
+            self._schema(tmp_path / 'image', _image),
+            self._schema(tmp_path / 'archive', _archive)]
+        (tmp_path / 'a.bin').write_bytes(b'\x89PNG\x10one\x00')
+        (tmp_path / 'b.bin.gz').write_bytes(
+            gzip.compress(b'\x07ABCDtwo\x00'))
+
+        bin_batch_reader(
+            [str(tmp_path / 'a.bin'), str(tmp_path / 'b.bin.gz')], schemas,
+            str(tmp_path / 'out'))
+
+        assert yaml.safe_load(
+            (tmp_path / 'out' / 'a.bin.yml').read_text()) == {
+                'signature': '89 50 4e 47', 'width': 16, 'title': 'one'}
+        assert yaml.safe_load(
+            (tmp_path / 'out' / 'b.bin.gz.yml').read_text())['title'] == (
+                'two')
+        assert capsys.readouterr().out.split('\n')[:2] == [
+            '{}\timage'.format(tmp_path / 'a.bin'),
+            '{}\tarchive'.format(tmp_path / 'b.bin.gz')]
+
+    def test_unmatched(self, tmp_path, capsys):
+        schemas = [self._schema(tmp_path / 'image', _image)]
+        (tmp_path / 'a.bin').write_bytes(b'GIF89a')
+
+        try:
+            bin_batch_reader(
+                [str(tmp_path / 'a.bin')], schemas, str(tmp_path / 'out'))
+        except SystemExit as error:
+            assert error.code == 1
+        else:
+            assert False
+        assert 'No schema matches.' in capsys.readouterr().err
+
+    def test_same_name(self, tmp_path):
+        schemas = [self._schema(tmp_path / 'image', _image)]
+        for directory in ('x', 'y'):
+            (tmp_path / directory).mkdir()
+            (tmp_path / directory / 'a.bin').write_bytes(
+                b'\x89PNG\x10one\x00')
+
+        try:
+            bin_batch_reader(
+                [str(tmp_path / 'x' / 'a.bin'), str(tmp_path / 'y' / 'a.bin')],
+                schemas, str(tmp_path / 'out'))
+        except ValueError as error:
+            assert str(error).endswith('have the same name.')
+        else:
+            assert False
+        assert not (tmp_path / 'out').exists()
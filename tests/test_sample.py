@@ -0,0 +1,182 @@
+"""Tests for sampling of loop elements."""
+import random
+import struct
+
+from bin_parser import BinReader, BinReadFunctions
+from bin_parser.bin_parser import BinParser, _sample_indices
+from bin_parser.schema import skips
+
+from shared import load_example
+
+
+_types = {'types': {
+    'byte': {'function': {'name': 'struct', 'args': {'fmt': 'B'}}},
+    'short': {'size': 2, 'function': {'name': 'struct', 'args': {
+        'fmt': '<h'}}},
+    'text': {'delimiter': [0x00]}}}
+
+_static = [
+    {'name': 'count', 'type': 'byte'},
+    {'name': 'records', 'for': 'count', 'structure': [
+        {'name': 'a', 'type': 'byte'},
+        {'name': 'b', 'type': 'short'}]},
+    {'name': 'end', 'type': 'byte'}]
+
+_dependent = [
+    {'name': 'count', 'type': 'byte'},
+    {'name': 'records', 'for': 'count', 'structure': [
+        {'name': 'length', 'type': 'byte'},
+        {'name': 'content', 'type': 'raw', 'size': 'length'}]},
+    {'name': 'end', 'type': 'byte'}]
+
+
+_flags_types = {'types': {
+    'byte': {'function': {'name': 'struct', 'args': {'fmt': 'B'}}},
+    'bits': {'function': {'name': 'flags', 'args': {
+        'annotation': {0x01: 'valid'}}}}}}
+
+_flags = [
+    {'name': 'count', 'type': 'byte'},
+    {'name': 'records', 'for': 'count', 'structure': [
+        {'name': 'state', 'type': 'bits'},
+        {'name': 'value', 'type': 'byte'}]},
+    {'name': 'end', 'type': 'byte', 'if': {
+        'operands': ['valid', True], 'operator': 'eq'}}]
+
+
+def _static_data(count):
+    return bytes([count]) + b''.join(
+        struct.pack('<Bh', index, -index) for index in range(count)) + (
+            b'\xff')
+
+
+def _dependent_data(count):
+    return bytes([count]) + b''.join(
+        bytes([1 + index % 3]) + b'x' * (1 + index % 3)
+        for index in range(count)) + b'\xff'
+
+
+class TestSampleIndices(object):
+    def test_stride(self):
+        assert list(_sample_indices(10, 3, 0, None)) == [0, 3, 6, 9]
+
+    def test_fraction(self):
+        indices = list(_sample_indices(
+            10000, 0, 0.1, random.Random(1)))
+        assert indices == sorted(set(indices))
+        assert 800 < len(indices) < 1200
+        assert indices[-1] < 10000
+
+    def test_seed(self):
+        assert list(_sample_indices(
+            100, 0, 0.5, random.Random(3))) == list(_sample_indices(
+                100, 0, 0.5, random.Random(3)))
+
+
+class TestSkips(object):
+    def _skips(self, structure, types):
+        parser = BinParser(structure, types, BinReadFunctions())
+        return list(skips(parser).values())
+
+    def test_static(self):
+        assert self._skips(_static, _types) == [3]
+
+    def test_delimited(self):
+        assert self._skips(
+            load_example('lists', 'structure_for.yml'),
+            load_example('lists', 'types.yml')) == [[(0, [0x00])]]
+
+    def test_dependent(self):
+        assert self._skips(_dependent, _types) == []
+
+    def test_members(self):
+        assert self._skips(_flags, _flags_types) == []
+
+
+class TestSample(object):
+    def setup(self):
+        self.data = _static_data(20)
+        self.parsed = BinReader(self.data, _static, _types).parsed
+
+    def test_stride_static(self):
+        reader = BinReader(self.data, _static, _types, stride=5)
+        assert reader.parsed['records'] == {
+            index: self.parsed['records'][index]
+            for index in (0, 5, 10, 15)}
+        assert reader.parsed['end'] == 255
+
+    def test_fraction_static(self):
+        reader = BinReader(
+            self.data, _static, _types, fraction=0.3, seed=2)
+        assert reader.parsed['records']
+        for index, element in reader.parsed['records'].items():
+            assert element == self.parsed['records'][index]
+        assert reader.parsed['end'] == 255
+
+    def test_seed(self):
+        assert BinReader(
+            self.data, _static, _types, fraction=0.3, seed=7).parsed == (
+                BinReader(
+                    self.data, _static, _types, fraction=0.3,
+                    seed=7).parsed)
+
+    def test_delimited(self):
+        parsed = BinReader(
+            open('examples/lists/for.dat', 'rb').read(),
+            load_example('lists', 'structure_for.yml'),
+            load_example('lists', 'types.yml'),
+            stride=2).parsed
+        assert parsed['lines'] == {
+            0: {'content': 'line1'}, 2: {'content': 'longer line'},
+            4: {'content': 'last'}}
+
+    def test_dependent(self):
+        data = _dependent_data(10)
+        parsed = BinReader(data, _dependent, _types).parsed
+        sampled = BinReader(data, _dependent, _types, stride=4).parsed
+        assert sampled['records'] == {
+            index: parsed['records'][index] for index in (0, 4, 8)}
+        assert sampled['end'] == 255
+
+    def test_offsets(self):
+        reader = BinReader(
+            self.data, _static, _types, stride=5, offsets=True)
+        assert reader.offsets[('records', 5, 'b')] == (17, 19)
+        assert ('records', 1, 'a') not in reader.offsets
+        assert reader.offsets[('end', )] == (61, 62)
+
+    def test_compact(self):
+        reader = BinReader(
+            self.data, _static, _types, stride=10, compact=True)
+        assert dict(reader.parsed['records'][10]) == (
+            self.parsed['records'][10])
+
+    def test_truncated(self):
+        reader = BinReader(self.data[:30], _static, _types, stride=5)
+        assert list(reader.parsed['records']) == [0, 5]
+        assert 'end' not in reader.parsed
+
+    def test_no_sampling(self):
+        assert BinReader(
+            self.data, _static, _types, stride=1).parsed == self.parsed
+        assert BinReader(
+            self.data, _static, _types, fraction=1).parsed == self.parsed
+
+    def test_invalid(self):
+        for kwargs in ({'stride': -1}, {'fraction': 1.5}):
+            try:
+                BinReader(self.data, _static, _types, **kwargs)
+            except ValueError:
+                pass
+            else:
+                assert False
+
+    def test_members(self):
+        # The flag of the last element, which is not sampled, decides
+        # whether `end` is read.
+        data = b'\x02\x01\x0a\x00\x0b\xff'
+        parsed = BinReader(data, _flags, _flags_types).parsed
+        sampled = BinReader(data, _flags, _flags_types, stride=2).parsed
+        assert 'end' not in parsed
+        assert sampled['records'] == {0: parsed['records'][0]}
+        assert 'end' not in sampled
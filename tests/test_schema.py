@@ -0,0 +1,183 @@
+"""Tests for the bin_parser.schema module."""
+import pytest
+
+from bin_parser import BinReadFunctions, BinReader, BinWriter
+from bin_parser.bin_parser import BinParser
+from bin_parser.schema import (
+    SchemaError, analyse, unit_sizes, unused_problems, validate)
+
+from shared import load_example
+
+
+def _parser(path, structure_file='structure.yml', types_file='types.yml'):
+    return BinParser(
+        load_example(path, structure_file), load_example(path, types_file),
+        BinReadFunctions())
+
+
+class TestValidate(object):
+    def setup(self):
+        self._types = {'types': {
+            'byte': {'function': {'name': 'struct', 'args': {'fmt': 'B'}}},
+            'short': {
+                'size': 2,
+                'function': {'name': 'struct', 'args': {'fmt': '<h'}}}}}
+
+    def _errors(self, structure, types=None):
+        with pytest.raises(SchemaError) as error:
+            BinParser(structure, types or self._types, BinReadFunctions())
+
+        return error.value.errors
+
+    def test_valid(self):
+        parser = _parser('lists', 'structure_while.yml')
+        assert validate(parser) == []
+
+    def test_type(self):
+        assert self._errors([{'name': 'a', 'type': 'long'}]) == [
+            'Type `long` of `a` is not defined.']
+
+    def test_variable_type(self):
+        parser = _parser('var_type')
+        assert validate(parser) == []
+
+    def test_macro(self):
+        assert self._errors([{'name': 'a', 'macro': 'person'}]) == [
+            'Macro `person` of `a` is not defined.']
+
+    def test_macro_used(self):
+        assert self._errors(
+            [{'name': 'a', 'macro': 'pair'}],
+            dict(self._types, macros={'pair': [
+                {'name': 'b', 'type': 'long'}]})) == [
+            'Type `long` of `macros.pair.b` is not defined.']
+
+    def test_macro_unused(self):
+        parser = BinParser(
+            [{'name': 'a', 'type': 'byte'}],
+            dict(self._types, macros={'pair': [
+                {'name': 'b', 'type': 'long'}]}),
+            BinReadFunctions())
+        assert validate(parser) == []
+        assert unused_problems(parser) == [
+            'Type `long` of `macros.pair.b` is not defined.']
+
+    def test_macro_variable(self):
+        assert self._errors(
+            [{'name': 'a', 'type': 'byte'}, {'name': 'b', 'macro': 'a'}],
+            dict(self._types, macros={'pair': [
+                {'name': 'c', 'type': 'long'}]})) == [
+            'Type `long` of `macros.pair.c` is not defined.']
+
+    def test_for(self):
+        assert self._errors([{
+            'name': 'a', 'for': 'count',
+            'structure': [{'name': 'b', 'type': 'byte'}]}]) == [
+            'Variable `count` (`for` of `a`) is not defined.']
+
+    def test_size(self):
+        assert self._errors([
+            {'name': 'a', 'type': 'byte'},
+            {'name': 'b', 'type': 'raw', 'size': 'b_size'}]) == [
+            'Variable `b_size` (`size` of `b`) is not defined.']
+
+    def test_size_flags(self):
+        self._types['types']['bits'] = {'function': {
+            'name': 'flags', 'args': {'annotation': {0x01: 'valid'}}}}
+        parser = BinParser(
+            [{'name': 'a', 'type': 'bits'},
+                {'name': 'b', 'type': 'raw', 'size': 'valid'}],
+            self._types, BinReadFunctions())
+        assert validate(parser) == []
+
+    def test_custom_function(self):
+        class Functions(BinReadFunctions):
+            def custom(self, data):
+                return {'size': ord(data)}
+
+        self._types['types']['custom'] = {}
+        parser = BinParser(
+            [{'name': 'a', 'type': 'custom'},
+                {'name': 'b', 'type': 'raw', 'size': 'size'}],
+            self._types, Functions())
+        assert validate(parser) == []
+
+    def test_function(self):
+        assert self._errors(
+            load_example('prince', 'structure.yml'),
+            load_example('prince', 'types.yml')
+        ) == [
+            'Function `min` of type `min` is not defined.',
+            'Function `sec` of type `sec` is not defined.']
+
+    def test_operator(self):
+        assert self._errors([{
+            'name': 'a', 'type': 'byte',
+            'if': {'operator': 'like', 'operands': [1, 1]}}]) == [
+            'Operator `like` (`if` of `a`) is not defined.']
+
+    def test_while_term(self):
+        assert self._errors([{
+            'name': 'a',
+            'while': {'operator': 'ne', 'operands': ['b', 0]},
+            'structure': [{'name': 'b', 'type': 'byte'}]}]) == [
+            '`while` of `a` has no `term`.']
+
+    def test_while_field(self):
+        assert self._errors([{
+            'name': 'a',
+            'while': {'operator': 'ne', 'operands': ['c', 0], 'term': 't'},
+            'structure': [{'name': 'b', 'type': 'byte'}]}]) == [
+            '`while` of `a` does not refer to a field of its structure.']
+
+    def test_reader(self):
+        with pytest.raises(ValueError):
+            BinReader(b'\x00', [{'name': 'a', 'type': 'long'}], self._types)
+
+    def test_writer(self):
+        with pytest.raises(ValueError):
+            BinWriter({'a': 0}, [{'name': 'a', 'type': 'long'}], self._types)
+
+
+class TestAnalyse(object):
+    def test_static_sizes(self):
+        assert analyse(_parser('var_size'))['static_sizes'] == {
+            'field_1_size': 1, 'field_2_size': 1}
+
+    def test_padding(self):
+        assert analyse(_parser('padding'))['static_sizes'] == {
+            'string_1': 6, 'string_2': 6, 'string_3': 6}
+
+    def test_macro(self):
+        parser = BinParser(
+            [{'name': 'a', 'macro': 'pair'},
+                {'name': 'b', 'for': 3, 'structure': [
+                    {'name': 'c', 'macro': 'pair'}]}],
+            {
+                'types': {'short': {'size': 2, 'function': {'name': 'int'}}},
+                'macros': {'pair': [
+                    {'name': 'x', 'type': 'short'},
+                    {'name': 'y', 'type': 'short'}]}},
+            BinReadFunctions())
+        result = analyse(parser)
+
+        assert result['static_sizes']['a'] == 4
+        assert result['static_sizes']['b'] == 12
+        assert result['batchable'] == ['b']
+        assert result['element_sizes'] == {'b': 4}
+
+    def test_not_batchable(self):
+        assert analyse(_parser('lists', 'structure_for.yml'))[
+            'batchable'] == []
+
+    def test_dependencies(self):
+        assert analyse(_parser('lists', 'structure_for.yml'))[
+            'dependencies'] == {'size_of_list': ['`for` of `lines`']}
+
+    def test_dependencies_type(self):
+        assert analyse(_parser('var_type'))['dependencies'] == {
+            'type_name': ['`type` of `content`', '`type` of `content`']}
+
+    def test_unit_sizes(self):
+        assert unit_sizes(_parser('var_size')) == [1, 0, 1, 0]
+        assert unit_sizes(_parser('lists', 'structure_for.yml')) == [1, 0]
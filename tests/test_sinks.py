@@ -0,0 +1,178 @@
+"""Tests for the bin_parser.sinks module."""
+import csv
+import io
+import sqlite3
+
+from bin_parser import BinPushReader, BinReader, Schema
+from bin_parser.sinks import CsvSink, SqliteSink, load
+
+from shared import load_example
+
+
+def _nested():
+    return [
+            {'name': 'count', 'type': 'byte'},
+            {'name': 'header', 'structure': [
+                {'name': 'version', 'type': 'byte'},
+                {'name': 'status', 'type': 'bits'}]},
+            {'name': 'records', 'for': 'count', 'structure': [
+                {'name': 'value', 'type': 'short'},
+                {'name': 'size', 'type': 'byte'},
+                {'name': 'items', 'for': 'size', 'structure': [
+                    {'name': 'label', 'type': 'text'}]}]}], {'types': {
+            'byte': {'function': {'name': 'struct', 'args': {'fmt': 'B'}}},
+            'short': {
+                'size': 2,
+                'function': {'name': 'struct', 'args': {'fmt': '<h'}}},
+            'bits': {'function': {
+                'name': 'flags', 'args': {'annotation': {0x01: 'valid'}}}},
+            'text': {'delimiter': [0x00]}}}
+
+
+_nested_data = b'\x02\x01\x03' b'\x10\x00\x02a\x00bc\x00' b'\xff\xff\x00'
+
+
+class TestSqliteSink(object):
+    def setup(self):
+        self._connection = sqlite3.connect(':memory:')
+        self._structure, self._types = _nested()
+
+    def _store(self, path, input_file, structure_file, types_file):
+        structure = load_example(path, structure_file)
+        types = load_example(path, types_file)
+        load(
+            open('examples/{}/{}'.format(path, input_file), 'rb'),
+            BinPushReader(structure, types, prune=True),
+            SqliteSink(self._connection, structure, types))
+
+    def _select(self, query):
+        return list(self._connection.execute(query))
+
+    def test_for(self):
+        self._store('lists', 'for.dat', 'structure_for.yml', 'types.yml')
+
+        assert self._select('SELECT * FROM root') == [(1, 5)]
+        assert self._select('SELECT * FROM lines') == [
+            (1, 1, 0, 'line1'), (2, 1, 1, 'line2'), (3, 1, 2, 'longer line'),
+            (4, 1, 3, ''), (5, 1, 4, 'last')]
+
+    def test_while(self):
+        self._store('lists', 'while.dat', 'structure_while.yml', 'types.yml')
+        parsed = BinReader(
+            open('examples/lists/while.dat', 'rb').read(),
+            load_example('lists', 'structure_while.yml'),
+            load_example('lists', 'types.yml')).parsed
+
+        assert self._select('SELECT lines_term FROM root') == [
+            (parsed['lines_term'], )]
+        assert self._select('SELECT content FROM lines') == [
+            (line['content'], ) for line in parsed['lines']]
+
+    def test_append(self):
+        self._store('lists', 'for.dat', 'structure_for.yml', 'types.yml')
+        self._store('lists', 'for.dat', 'structure_for.yml', 'types.yml')
+
+        assert self._select('SELECT * FROM root') == [(1, 5), (2, 5)]
+        assert self._select(
+            'SELECT _id, _parent_id FROM lines WHERE _position = 0') == [
+            (1, 1), (6, 2)]
+
+    def test_schema(self):
+        schema = Schema(self._structure, self._types, write_functions=None)
+        load(
+            io.BytesIO(_nested_data),
+            BinPushReader(None, None, prune=True, schema=schema),
+            SqliteSink(self._connection, None, None, schema=schema))
+
+        assert self._select('SELECT label FROM "records.items"') == [
+            ('a', ), ('bc', )]
+
+    def test_types(self):
+        SqliteSink(self._connection, self._structure, self._types)
+
+        assert self._select(
+            'SELECT name, type FROM pragma_table_info("records")') == [
+            ('_id', 'INTEGER'), ('_parent_id', 'INTEGER'),
+            ('_position', 'INTEGER'), ('value', 'INTEGER'),
+            ('size', 'INTEGER')]
+        assert self._select(
+            'SELECT name FROM pragma_table_info("root")') == [
+            ('_id', ), ('count', ), ('header.version', ),
+            ('header.status.valid', )] + [
+            ('header.status.flag_{:02x}'.format(2 ** x), )
+            for x in range(1, 8)]
+
+    def test_flags(self):
+        self._types['types']['bits'] = {'function': {'name': 'flags'}}
+        SqliteSink(self._connection, self._structure, self._types)
+
+        assert self._select(
+            'SELECT name FROM pragma_table_info("root")')[2:] == [
+            ('header.version', )] + [
+            ('header.status.flag_{:02x}'.format(2 ** x), )
+            for x in range(8)]
+
+    def test_nested(self):
+        sink = SqliteSink(
+            self._connection, self._structure, self._types, batch_size=1)
+        load(
+            io.BytesIO(_nested_data),
+            BinPushReader(self._structure, self._types), sink)
+
+        assert self._select(
+            'SELECT count, "header.version", "header.status.valid", '
+            '"header.status.flag_02" FROM root') == [(2, 1, 1, 1)]
+        assert self._select('SELECT * FROM records') == [
+            (1, 1, 0, 16, 2), (2, 1, 1, -1, 0)]
+        assert self._select('SELECT * FROM "records.items"') == [
+            (1, 1, 0, 'a'), (2, 1, 1, 'bc')]
+
+
+class TestCsvSink(object):
+    def setup(self):
+        self._structure, self._types = _nested()
+
+    def _store(self, directory, **kwargs):
+        load(
+            io.BytesIO(_nested_data),
+            BinPushReader(self._structure, self._types),
+            CsvSink(str(directory), self._structure, self._types, **kwargs))
+
+    def _rows(self, path, delimiter=','):
+        with open(str(path)) as handle:
+            return list(csv.reader(handle, delimiter=delimiter))
+
+    def test_root(self, tmpdir):
+        self._store(tmpdir)
+        rows = self._rows(tmpdir.join('root.csv'))
+
+        assert rows[0][:4] == [
+            '_id', 'count', 'header.version', 'header.status.valid']
+        assert rows[1][:5] == ['1', '2', '1', '1', '1']
+        assert len(rows) == 2
+
+    def test_loops(self, tmpdir):
+        self._store(tmpdir, block_size=1)
+
+        assert self._rows(tmpdir.join('records.csv')) == [
+            ['_id', '_parent_id', '_position', 'value', 'size'],
+            ['1', '1', '0', '16', '2'], ['2', '1', '1', '-1', '0']]
+        assert self._rows(tmpdir.join('records.items.csv')) == [
+            ['_id', '_parent_id', '_position', 'label'],
+            ['1', '1', '0', 'a'], ['2', '1', '1', 'bc']]
+
+    def test_tsv(self, tmpdir):
+        self._store(tmpdir.join('output'), delimiter='\t')
+
+        assert self._rows(
+            tmpdir.join('output', 'records.items.tsv'), '\t')[2] == [
+            '2', '1', '1', 'bc']
+
+    def test_raw(self, tmpdir):
+        structure = [{'name': 'data', 'type': 'raw', 'size': 2}]
+        load(
+            io.BytesIO(b'\x01\xff'), BinPushReader(structure, {}),
+            CsvSink(str(tmpdir), structure, {}))
+
+        assert self._rows(tmpdir.join('root.csv')) == [
+            ['_id', 'data'], ['1', '01 ff']]
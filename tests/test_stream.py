@@ -0,0 +1,363 @@
+"""Tests for the bin_parser.stream module."""
+import json
+from io import StringIO
+
+from bin_parser import BinReader, Schema
+from bin_parser.stream import (
+    BinPushReader, checkpointed_read, follow, from_json, to_json)
+
+from shared import load_example
+
+
+# Variables that are bytes and tuples, used in conditions.
+_variables_types = {'types': {
+    'byte': {'function': {'name': 'struct', 'args': {'fmt': 'B'}}},
+    'magic': {'size': 2, 'function': {
+        'name': 'raw', 'args': {'representation': 'bytes'}}},
+    'ref': {'size': 1, 'function': {
+        'name': 'raw', 'args': {'representation': 'reference'}}}}}
+
+_variables_structure = [
+    {'name': 'magic', 'type': 'magic'},
+    {'name': 'ref', 'type': 'ref'},
+    {'name': 'count', 'type': 'byte'},
+    {'name': 'records', 'for': 'count', 'structure': [
+        {'name': 'a', 'type': 'byte', 'if': {
+            'operands': ['magic', b'ab'], 'operator': 'eq'}},
+        {'name': 'b', 'type': 'byte', 'if': {
+            'operands': ['ref', (2, 1)], 'operator': 'eq'}}]}]
+
+_variables_data = b'ab\x00\x64' + bytes(range(200))
+
+
+def _assemble(units):
+    parsed = {}
+
+    for name, index, value in units:
+        if index is None:
+            parsed[name] = value
+        else:
+            parsed.setdefault(name, []).append(value)
+
+    return parsed
+
+
+def _push(path, input_file, structure_file, types_file, chunk_size):
+    data = open('examples/{}/{}'.format(path, input_file), 'rb').read()
+    reader = BinPushReader(
+        load_example(path, structure_file), load_example(path, types_file))
+
+    units = []
+    for start in range(0, len(data), chunk_size):
+        units += reader.feed(data[start:start + chunk_size])
+    units += reader.close()
+
+    return units
+
+
+def _compare(path, input_file, structure_file, types_file):
+    parsed = BinReader(
+        open('examples/{}/{}'.format(path, input_file), 'rb').read(),
+        load_example(path, structure_file),
+        load_example(path, types_file)).parsed
+
+    for chunk_size in (1, 2, 3, 5, 1024):
+        assert _assemble(_push(
+            path, input_file, structure_file, types_file,
+            chunk_size)) == parsed
+
+
+class TestPushReader(object):
+    """Test the bin_parser.stream module."""
+    def test_balance(self):
+        _compare('balance', 'balance.dat', 'structure.yml', 'types.yml')
+
+    def test_for(self):
+        _compare('lists', 'for.dat', 'structure_for.yml', 'types.yml')
+
+    def test_do_while(self):
+        _compare(
+            'lists', 'do_while.dat', 'structure_do_while.yml', 'types.yml')
+
+    def test_while(self):
+        _compare('lists', 'while.dat', 'structure_while.yml', 'types.yml')
+
+    def test_csv(self):
+        _compare('csv', 'test.csv', 'structure.yml', 'types.yml')
+
+    def test_size_string(self):
+        _compare(
+            'size_string', 'size_string.dat', 'structure.yml', 'types.yml')
+
+    def test_var_type(self):
+        _compare('var_type', 'var_type.dat', 'structure.yml', 'types.yml')
+
+    def test_units(self):
+        assert _push(
+            'lists', 'for.dat', 'structure_for.yml', 'types.yml', 4)[:3] == [
+                ('size_of_list', None, 5), ('lines', None, []),
+                ('lines', 0, {'content': 'line1'})]
+
+    def test_while_term(self):
+        assert _push(
+            'lists', 'while.dat', 'structure_while.yml', 'types.yml',
+            4)[-1] == ('lines_term', None, 2)
+
+    def test_incremental(self):
+        reader = BinPushReader(
+            load_example('lists', 'structure_for.yml'),
+            load_example('lists', 'types.yml'))
+        assert reader.feed(b'\x02li') == [
+            ('size_of_list', None, 2), ('lines', None, [])]
+        assert reader.feed(b'ne1') == []
+        assert reader.feed(b'\x00line2\x00') == [
+            ('lines', 0, {'content': 'line1'}),
+            ('lines', 1, {'content': 'line2'})]
+        assert reader.done
+
+    def test_buffer(self):
+        reader = BinPushReader(
+            load_example('lists', 'structure_for.yml'),
+            load_example('lists', 'types.yml'))
+        reader.feed(b'\x02line1\x00li')
+        assert reader.data == b'li'
+        assert reader.offset == 7
+
+    def test_callback(self):
+        units = []
+        reader = BinPushReader(
+            load_example('balance', 'structure.yml'),
+            load_example('balance', 'types.yml'),
+            callback=lambda *unit: units.append(unit))
+        reader.feed(open('examples/balance/balance.dat', 'rb').read())
+        assert units[1] == ('name', None, 'John Doe')
+
+    def test_schema(self):
+        schema = Schema(
+            load_example('lists', 'structure_for.yml'),
+            load_example('lists', 'types.yml'))
+        data = open('examples/lists/for.dat', 'rb').read()
+        reader = BinPushReader(None, None, schema=schema)
+        assert _assemble(reader.feed(data) + reader.close()) == (
+            schema.read(data).parsed)
+
+    def test_large_unit(self):
+        structure = [{'name': 'block', 'structure': [
+            {'name': 'field_{}'.format(index), 'type': 'byte'}
+            for index in range(1000)]}]
+        types = {'types': {'byte': {
+            'function': {'name': 'struct', 'args': {'fmt': 'B'}}}}}
+        data = bytes(index % 256 for index in range(1000))
+
+        reader = _CountingReader(structure, types)
+        units = []
+        for index in range(len(data)):
+            units += reader.feed(data[index:index + 1])
+        units += reader.close()
+
+        assert _assemble(units) == BinReader(data, structure, types).parsed
+        assert reader.steps == 3
+
+    def test_closed(self):
+        reader = BinPushReader(
+            load_example('balance', 'structure.yml'),
+            load_example('balance', 'types.yml'))
+        reader.close()
+        try:
+            reader.feed(b'\x00')
+        except ValueError:
+            pass
+        else:
+            assert False
+
+
+class _CountingReader(BinPushReader):
+    """Push reader that counts the attempts to parse a unit."""
+    steps = 0
+
+    def _step(self, partial=False):
+        self.steps += 1
+        return super(_CountingReader, self)._step(partial)
+
+
+class TestJson(object):
+    def test_round_trip(self):
+        value = {
+            'a': b'\x00\xff', 'b': (1, [2, (3, b'')]), 'c': memoryview(b'x'),
+            'd': [{'e': None}]}
+        assert from_json(json.dumps(to_json(value))) == value
+
+    def test_compact(self):
+        parsed = BinReader(
+            _variables_data, _variables_structure, _variables_types,
+            compact=True).parsed
+        assert from_json(json.dumps(to_json(parsed))) == parsed
+
+
+class TestFollow(object):
+    """Test the follow mode of the bin_parser.stream module."""
+    def setup(self):
+        self._structure = load_example('csv', 'structure.yml')
+        self._types = load_example('csv', 'types.yml')
+
+    def _follow(self, input_path, state_path):
+        output = StringIO()
+        with open(input_path, 'rb') as handle:
+            follow(
+                handle, BinPushReader(self._structure, self._types), output,
+                state_path, timeout=0)
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_follow(self, tmp_path):
+        input_path = str(tmp_path / 'input.csv')
+        state_path = str(tmp_path / 'state.json')
+        lines = open('examples/csv/test.csv', 'rb').readlines()
+
+        with open(input_path, 'wb') as handle:
+            handle.write(b''.join(lines[:2]) + lines[2][:3])
+        units = self._follow(input_path, state_path)
+        assert [unit['name'] for unit in units] == ['header', 'body', 'body']
+
+        with open(input_path, 'ab') as handle:
+            handle.write(lines[2][3:] + b''.join(lines[3:]))
+        units += self._follow(input_path, state_path)
+
+        parsed = BinReader(
+            open('examples/csv/test.csv', 'rb').read(), self._structure,
+            self._types).parsed
+        assert _assemble(
+            (unit['name'], unit['index'], unit['value'])
+            for unit in units) == parsed
+
+    def test_state(self, tmp_path):
+        input_path = str(tmp_path / 'input.csv')
+        state_path = str(tmp_path / 'state.json')
+        with open(input_path, 'wb') as handle:
+            handle.write(open('examples/csv/test.csv', 'rb').read())
+
+        self._follow(input_path, state_path)
+        assert self._follow(input_path, state_path) == []
+
+    def test_resume_variables(self, tmp_path):
+        input_path = str(tmp_path / 'input.dat')
+        state_path = str(tmp_path / 'state.json')
+        units = []
+
+        for end in (9, 51, len(_variables_data)):
+            with open(input_path, 'wb') as handle:
+                handle.write(_variables_data[:end])
+            output = StringIO()
+            with open(input_path, 'rb') as handle:
+                follow(
+                    handle, BinPushReader(
+                        _variables_structure, _variables_types),
+                    output, state_path, timeout=0)
+            units += [
+                from_json(line) for line in output.getvalue().splitlines()]
+
+        assert _assemble(
+            (unit['name'], unit['index'], unit['value'])
+            for unit in units) == BinReader(
+                _variables_data, _variables_structure,
+                _variables_types).parsed
+
+
+class _Crash(Exception):
+    pass
+
+
+class _CrashingHandle(object):
+    """Writable handle that fails after a number of writes."""
+    def __init__(self, handle, writes):
+        self._handle = handle
+        self._writes = writes
+
+    def __getattr__(self, name):
+        return getattr(self._handle, name)
+
+    def write(self, data):
+        if not self._writes:
+            raise _Crash()
+        self._writes -= 1
+        return self._handle.write(data)
+
+
+class TestCheckpoint(object):
+    """Test the checkpoints of the bin_parser.stream module."""
+    def setup(self):
+        self._structure = load_example('csv', 'structure.yml')
+        self._types = load_example('csv', 'types.yml')
+
+    def _read(self, tmp_path, output_handle, resume=False):
+        with open(str(tmp_path / 'input.csv'), 'rb') as input_handle:
+            checkpointed_read(
+                input_handle, BinPushReader(self._structure, self._types),
+                output_handle, str(tmp_path / 'checkpoint.json'), every=3,
+                resume=resume, block_size=16)
+
+    def _prepare(self, tmp_path):
+        lines = open('examples/csv/test.csv', 'rb').readlines()
+        with open(str(tmp_path / 'input.csv'), 'wb') as handle:
+            handle.write(lines[0])
+            for index in range(100):
+                handle.write('name_{}\tdate_{}\n'.format(
+                    index, index).encode('utf-8'))
+
+        with open(str(tmp_path / 'full.jsonl'), 'w') as handle:
+            self._read(tmp_path, handle)
+        return open(str(tmp_path / 'full.jsonl')).read()
+
+    def test_uninterrupted(self, tmp_path):
+        units = [
+            json.loads(line)
+            for line in self._prepare(tmp_path).splitlines()]
+        assert len(units) == 102
+        assert units[-1]['value'] == {'name': 'name_99', 'date': 'date_99'}
+
+    def test_resume(self, tmp_path):
+        expected = self._prepare(tmp_path)
+        output_path = str(tmp_path / 'output.jsonl')
+
+        for writes in (1, 17, 50):
+            with open(output_path, 'w') as handle:
+                try:
+                    self._read(tmp_path, _CrashingHandle(handle, writes))
+                except _Crash:
+                    pass
+            with open(output_path, 'r+') as handle:
+                self._read(tmp_path, handle, resume=True)
+
+            assert open(output_path).read() == expected
+
+    def test_resume_variables(self, tmp_path):
+        input_path = str(tmp_path / 'input.dat')
+        with open(input_path, 'wb') as handle:
+            handle.write(_variables_data)
+
+        def read(output_handle, resume=False):
+            with open(input_path, 'rb') as input_handle:
+                checkpointed_read(
+                    input_handle, BinPushReader(
+                        _variables_structure, _variables_types,
+                        compact=True),
+                    output_handle, str(tmp_path / 'checkpoint.json'),
+                    every=7, resume=resume, block_size=5)
+
+        expected = StringIO()
+        read(expected)
+        output_path = str(tmp_path / 'output.jsonl')
+        with open(output_path, 'w') as handle:
+            try:
+                read(_CrashingHandle(handle, 50))
+            except _Crash:
+                pass
+        with open(output_path, 'r+') as handle:
+            read(handle, resume=True)
+
+        assert open(output_path).read() == expected.getvalue()
+        units = [from_json(line) for line in open(output_path)]
+        assert _assemble(
+            (unit['name'], unit['index'], unit['value'])
+            for unit in units) == BinReader(
+                _variables_data, _variables_structure,
+                _variables_types).parsed
@@ -0,0 +1,108 @@
+"""Concurrency tests for shared schemas."""
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from bin_parser import BinReader, BinWriter, Schema
+
+
+_structure = [
+    {'name': 'number_of_records', 'type': 'int'},
+    {'name': 'records', 'for': 'number_of_records', 'structure': [
+        {'name': 'name', 'type': 'label'},
+        {'name': 'code', 'type': 'level'},
+        {'name': 'flags', 'type': 'bits'},
+        {'name': 'value', 'type': 'short'}]}]
+
+_types = {'types': {
+    'int': {'size': 4, 'function': {'name': 'struct', 'args': {'fmt': '<i'}}},
+    'label': {
+        'size': 8, 'delimiter': [0x00], 'function': {'name': 'text'},
+        'pure': True},
+    'level': {'function': {'name': 'struct', 'args': {
+        'fmt': 'B', 'annotation': {0x00: 'none', 0x01: 'low'}}}},
+    'bits': {'function': {'name': 'flags', 'args': {
+        'annotation': {0x01: 'valid', 0x02: 'checked'}}}},
+    'short': {'size': 2, 'function': {
+        'name': 'struct', 'args': {'fmt': '<h'}}}}}
+
+
+def _data(seed):
+    records = 20 + seed % 7
+    data = [struct.pack('<i', records)]
+
+    for index in range(records):
+        data.append('n{}_{}'.format(seed % 5, index % 3).encode().ljust(
+            8, b'\x00'))
+        data.append(struct.pack(
+            '<BBh', index % 2, (seed + index) % 4, seed * 7 - index))
+
+    return b''.join(data)
+
+
+class TestThreads(object):
+    def setup(self):
+        self.schema = Schema(_structure, _types)
+        self.inputs = [_data(seed) for seed in range(64)]
+        self.expected = [
+            BinReader(data, _structure, _types).parsed
+            for data in self.inputs]
+
+    def _run(self, function, threads=8, repeats=2):
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with ThreadPoolExecutor(threads) as executor:
+                return list(executor.map(
+                    function, self.inputs * repeats))
+        finally:
+            sys.setswitchinterval(interval)
+
+    def test_schema_read(self):
+        assert self.schema.read(self.inputs[0]).parsed == self.expected[0]
+
+    def test_schema_write(self):
+        assert self.schema.write(self.expected[0]).data == self.inputs[0]
+
+    def test_schema_copy(self):
+        structure = [{'name': 'a', 'type': 'int'}]
+        types = {'types': {'int': {
+            'size': 1, 'function': {'name': 'struct', 'args': {'fmt': 'b'}}}}}
+        schema = Schema(structure, types)
+        structure[0]['name'] = 'b'
+        types['types']['int']['size'] = 2
+        assert schema.read(b'\x01').parsed == {'a': 1}
+
+    def test_read_only(self):
+        schema = Schema(_structure, _types, write_functions=None)
+        try:
+            schema.write(self.expected[0])
+        except ValueError as error:
+            assert str(error) == 'Schema has no encoding functions.'
+        else:
+            assert False
+
+    def test_concurrent_read(self):
+        results = self._run(lambda data: self.schema.read(data).parsed)
+        assert results == self.expected * 2
+
+    def test_concurrent_compact_read(self):
+        results = self._run(
+            lambda data: self.schema.read(data, compact=True).parsed)
+        assert results == self.expected * 2
+
+    def test_concurrent_frozen_read(self):
+        results = self._run(
+            lambda data: self.schema.read(data, frozen=True).parsed)
+        assert results == self.expected * 2
+
+    def test_concurrent_write(self):
+        results = self._run(lambda data: self.schema.write(
+            BinReader(data, _structure, _types).parsed).data)
+        assert results == self.inputs * 2
+
+    def test_concurrent_default_functions(self):
+        results = self._run(lambda data: BinWriter(
+            BinReader(data, _structure, _types).parsed, _structure,
+            _types).data)
+        assert results == self.inputs * 2
@@ -0,0 +1,82 @@
+"""Tests for the bin_parser.tracer module."""
+import json
+from io import StringIO
+
+from bin_parser import BinReader, BinWriter, Tracer
+
+from shared import load_example
+
+
+def _trace(path, input_file, structure_file, types_file, every=1):
+    tracer = Tracer(every)
+    BinReader(
+        open('examples/{}/{}'.format(path, input_file), 'rb').read(),
+        load_example(path, structure_file),
+        load_example(path, types_file), tracer=tracer)
+
+    return tracer.events
+
+
+class TestTracer(object):
+    """Test the bin_parser.tracer module."""
+    def test_balanced(self):
+        events = _trace('lists', 'for.dat', 'structure_for.yml', 'types.yml')
+        assert (
+            len([e for e in events if e['ph'] == 'B']) ==
+            len([e for e in events if e['ph'] == 'E']))
+
+    def test_loop(self):
+        events = _trace('lists', 'for.dat', 'structure_for.yml', 'types.yml')
+        assert events[0]['name'] == 'lines'
+        assert events[0]['cat'] == 'loop'
+        assert events[0]['args']['offset'] == 1
+
+    def test_iterations(self):
+        events = _trace('lists', 'for.dat', 'structure_for.yml', 'types.yml')
+        assert [e['name'] for e in events if e['ph'] == 'B'][1:] == [
+            'lines[0]', 'lines[1]', 'lines[2]', 'lines[3]', 'lines[4]']
+
+    def test_iteration_offsets(self):
+        events = _trace('lists', 'for.dat', 'structure_for.yml', 'types.yml')
+        assert events[1]['args']['offset'] == 1
+        assert events[2]['args']['offset'] == 7
+
+    def test_macro(self):
+        events = _trace(
+            'macro', 'macro.dat', 'structure.yml', 'types.yml')
+        assert events[0]['name'] == 'person_1'
+        assert events[0]['cat'] == 'macro'
+
+    def test_every(self):
+        events = _trace(
+            'lists', 'for.dat', 'structure_for.yml', 'types.yml', every=2)
+        assert [e['name'] for e in events if e['ph'] == 'B'][1:] == [
+            'lines[0]', 'lines[2]', 'lines[4]']
+
+    def test_eof(self):
+        events = _trace('csv', 'test.csv', 'structure.yml', 'types.yml')
+        assert events[-1]['ph'] == 'E'
+        assert events[-1]['name'] == 'body'
+
+    def test_writer(self):
+        tracer = Tracer()
+        BinWriter(
+            {'size_of_list': 2, 'lines': [{'content': 'a'}, {'content': 'b'}]},
+            load_example('lists', 'structure_for.yml'),
+            load_example('lists', 'types.yml'),
+            tracer=tracer)
+        assert [e['args']['offset'] for e in tracer.events] == [
+            1, 1, 3, 3, 5, 5]
+
+    def test_dump(self):
+        tracer = Tracer()
+        tracer.begin('a', 'structure', 0)
+        tracer.end(1)
+        handle = StringIO()
+        tracer.dump(handle)
+        assert len(json.loads(handle.getvalue())['traceEvents']) == 2
+
+    def test_clock(self):
+        tracer = Tracer(clock=lambda: 2.0)
+        tracer.begin('a', 'structure', 0)
+        assert tracer.events[0]['ts'] == 2e6
@@ -0,0 +1,80 @@
+"""Tests for the bin_parser.verify module."""
+import io
+
+from bin_parser.verify import verify
+
+from shared import load_example
+
+
+def _verify(path, input_file, structure_file, types_file, **kwargs):
+    return verify(
+        open('examples/{}/{}'.format(path, input_file), 'rb'),
+        load_example(path, structure_file),
+        load_example(path, types_file), **kwargs)
+
+
+class TestVerify(object):
+    def test_balance(self):
+        assert _verify(
+            'balance', 'balance.dat', 'structure.yml', 'types.yml') is None
+
+    def test_for(self):
+        assert _verify(
+            'lists', 'for.dat', 'structure_for.yml', 'types.yml') is None
+
+    def test_while(self):
+        assert _verify(
+            'lists', 'while.dat', 'structure_while.yml', 'types.yml',
+            block_size=3) is None
+
+    def test_do_while(self):
+        assert _verify(
+            'lists', 'do_while.dat', 'structure_do_while.yml',
+            'types.yml', block_size=1) is None
+
+    def test_conditional(self):
+        assert _verify(
+            'conditional', 'a.dat', 'structure.yml', 'types.yml') is None
+
+    def test_mismatch(self):
+        data = b'123\x00ab456789\x00\x00\x00\x00\x00\x00'
+
+        assert verify(
+            io.BytesIO(data), load_example('padding', 'structure.yml'),
+            load_example('padding', 'types.yml')) == (('string_1', ), 4)
+
+    def test_mismatch_loop(self):
+        structure = [
+            {'name': 'count', 'type': 'byte'},
+            {'name': 'items', 'for': 'count', 'structure': [
+                {'name': 'label', 'type': 'text'}]}]
+        types = {'types': {
+            'byte': {'function': {'name': 'struct', 'args': {'fmt': 'B'}}},
+            'text': {'size': 4, 'delimiter': [0x00]}}}
+
+        assert verify(
+            io.BytesIO(b'\x03abc\x00de\x00\x00f\x00x\x00'), structure, types,
+            block_size=4) == (('items', 2, 'label'), 11)
+
+    def test_trailing_data(self):
+        data = open('examples/balance/balance.dat', 'rb').read()
+
+        assert verify(
+            io.BytesIO(data + b'\x00'),
+            load_example('balance', 'structure.yml'),
+            load_example('balance', 'types.yml')) == (None, len(data))
+
+    def test_large_unit(self):
+        # A nested structure is one unit, it is verified when it is complete.
+        structure = [{'name': 'labels', 'structure': [
+            {'name': 'label_{}'.format(index), 'type': 'text'}
+            for index in range(500)]}]
+        types = {'types': {'text': {'size': 4, 'delimiter': [0x00]}}}
+        data = b'ab\x00\x00' * 500
+
+        assert verify(
+            io.BytesIO(data), structure, types, block_size=7) is None
+        assert verify(
+            io.BytesIO(data[:1200] + b'f\x00x\x00' + data[1204:]),
+            structure, types, block_size=7) == (
+                ('labels', 'label_300'), 1202)